@@ -0,0 +1,54 @@
+"""
+This script calibrates phases and amplitudes of all linac RF cavities
+from va_offsets.json with the Virtual Accelerator phase scans.
+
+The cavities are scanned one by one from MEBT to SCL with all downstream
+cavities switched off. The model BPM phase curves for all cavities are
+calculated by the pool of processes in parallel with the VA scans.
+
+>virtual_accelerator --debug --particle_number 1000 --refresh_rate 5
+
+The results are in the cavities_calibration.dat file.
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.phase_scan_pool_lib import ParallelPhaseScanRunner
+from uspas_fastlib.cavity_calibration_lib import getCavityLLRF_Names
+from uspas_fastlib.cavity_calibration_lib import getBPM_Names
+from uspas_fastlib.cavity_calibration_lib import CavityCalibrationPipeline
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+offsets_file_name = os.environ["HOME"] + "/uspas24-CR/EnergyRestoration/va_offsets.json"
+
+#---- the model of the whole linac, the MEBT entrance bunch
+model_params = {}
+model_params["names"] = ["MEBT","DTL1","DTL2","DTL3","DTL4","DTL5","DTL6","CCL1","CCL2","CCL3","CCL4","SCLMed","SCLHigh","HEBT1"]
+model_params["xml_file_name"] = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
+model_params["twiss"] = ((-1.9569, 0.1821, 2.8724*1.0e-6),
+                         ( 1.7703, 0.1624, 2.8826*1.0e-6),
+                         (-0.0216,116.0548, 0.0165*1.0e-6))
+model_params["e_kin_ini"] = 0.0025
+model_params["n_particles"] = 1000
+model_params["peak_current"] = 38.
+model_params["bpm_frequency"] = 402.5e+6
+
+if __name__ == "__main__":
+	llrf_names = getCavityLLRF_Names(offsets_file_name)
+	bpm_names = getBPM_Names(offsets_file_name)
+	print ("Number of cavities =",len(llrf_names)," BPMs =",len(bpm_names))
+
+	n_points = 24
+	phase_arr = [-180. + 360.*ind/n_points for ind in range(n_points)]
+
+	time_start = time.time()
+	with ParallelPhaseScanRunner(model_params) as runner:
+		pipeline = CavityCalibrationPipeline(runner,llrf_names,bpm_names,phase_arr)
+		results = pipeline.run(output_file_name = "cavities_calibration.dat")
+	print ("Calibration of %d cavities time[sec]= %8.1f"%(len(results),time.time() - time_start))
@@ -0,0 +1,66 @@
+"""
+This script is an example of the vectorized longitudinal Twiss reconstruction
+with the "thin RF cavity - drift" model from pyorbit_sns_scl_long_twiss_hint_0.py.
+
+The 360-point phase scan of BPM amplitudes is generated for known correlations
+<z^2>,<z*dE>,<dE^2> with noise, and then the correlations, Twiss parameters,
+and their errors (analytic and bootstrap) are reconstructed.
+"""
+
+import os
+import sys
+import math
+import time
+
+import numpy
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.long_twiss_lsq_lib import getLongitudinalMatrices2x2
+from uspas_fastlib.long_twiss_lsq_lib import getRMS2_Z_FromBPM_Amps
+from uspas_fastlib.long_twiss_lsq_lib import getEnergies
+from uspas_fastlib.long_twiss_lsq_lib import getBetaGamma
+from uspas_fastlib.long_twiss_lsq_lib import reconstructLongTwiss
+from uspas_fastlib.twiss_lsq_lib import getLSQ_Matrices
+from uspas_fastlib.twiss_lsq_lib import getTwissFromCorrelations
+from uspas_fastlib.twiss_lsq_lib import getErrors
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+e_kin_ini = 0.1856 # in [GeV]
+mass = 0.939294    # in [GeV]
+rf_frequency = 805.0e+6
+bpm_frequency = 402.5e+6
+v_light = 2.99792458e+8  # in [m/sec]
+
+qE0TL = 0.010 # in [GeV]
+Ldrift = 6.0  # in [m]
+
+#---- <z^2>,<z*dE>,<dE^2> in (m^2,m*GeV,GeV^2)
+corr_init = numpy.array([(1.5e-3)**2, -1.0e-7, (0.2e-3)**2])
+
+rf_phase_arr = numpy.linspace(-180.,180.,360,endpoint = False)
+eKin_arr = getEnergies(e_kin_ini,qE0TL,rf_phase_arr)
+
+#---- BPM amplitudes for the known correlations with 0.05% noise
+lsq_matrix = getLSQ_Matrices(getLongitudinalMatrices2x2(qE0TL,rf_frequency,eKin_arr,rf_phase_arr,Ldrift,mass))
+(beta_arr,gamma_arr) = getBetaGamma(eKin_arr,mass)
+phase2_coeff = (2*math.pi*bpm_frequency/(beta_arr*v_light))**2
+bpm_amp_arr = numpy.exp(-0.5*lsq_matrix.dot(corr_init)*phase2_coeff)
+bpm_amp_arr *= 1.0 + 0.0005*numpy.random.default_rng(100).standard_normal(len(bpm_amp_arr))
+
+time_start = time.time()
+rms2_arr = getRMS2_Z_FromBPM_Amps(bpm_amp_arr,eKin_arr,bpm_frequency,mass)
+res_dict = reconstructLongTwiss(qE0TL,rf_frequency,eKin_arr,rf_phase_arr,Ldrift,mass,rms2_arr,
+	n_bootstrap = 1000,random_seed = 100)
+print ("Reconstruction with 1000 bootstrap samples time[sec]= %8.3f"%(time.time() - time_start))
+
+(twiss_init,twiss_cov) = getTwissFromCorrelations(corr_init)
+twiss_err = getErrors(res_dict["twiss_cov"])
+print ("------------------------------------------------")
+for ind, name in enumerate(("alphaZ","betaZ[m/GeV]","emittZ[m*GeV]")):
+	st = "%14s  initial = %12.5g  fit = %12.5g "%(name,twiss_init[ind],res_dict["twiss"][ind])
+	st += "+- %10.3g (analytic)  +- %10.3g (bootstrap)"%(twiss_err[ind],res_dict["twiss_boot_std"][ind])
+	print (st)
+print ("------------------------------------------------")
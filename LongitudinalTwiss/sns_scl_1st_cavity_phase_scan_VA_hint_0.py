@@ -21,6 +21,9 @@ from orbit.py_linac.lattice import MarkerLinacNode
 
 from uspas_pylib.harmonic_data_fitting_lib import fitCosineFunc
 
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.epics_group_lib import PV_Group
+
 #-------------------------------------------------------------------
 #              START of the SCRIPT
 #-------------------------------------------------------------------
@@ -66,12 +69,11 @@ def cavNameFromIndex(ind):
 	cav_name = "SCL_LLRF:FCM" + "%02d"%(cryo_mod_ind+1)+letter_arr[letter_ind]
 	return cav_name
 
-for ind,cav in enumerate(cavs[1:]):
-	cav_amp_pv_name = cavNameFromIndex(ind+1)+":CtlAmpSet"
-	cav_amp_pv = pv_channel.PV(cav_amp_pv_name)
-	cav_amp_pv.put(0.)
-	#print ("cav pv name=",cav_amp_pv_name)
-	
+#---- all other cavities are switched off in one batched put
+#---- the calibration of all cavities: EnergyRestoration/sns_linac_cavities_calibration_VA.py
+cav_amp_group = PV_Group([cavNameFromIndex(ind+1)+":CtlAmpSet" for ind in range(len(cavs[1:]))])
+cav_amp_group.put(0.,wait = True)
+
 cav_amp_pv = pv_channel.PV( cavNameFromIndex(0)+":CtlAmpSet")
 cav_phase_pv = pv_channel.PV(cavNameFromIndex(0)+":CtlPhaseSet")
 print ("cav=",cav.getName()," amplitude= %+8.5f"%cav_amp_pv.get())
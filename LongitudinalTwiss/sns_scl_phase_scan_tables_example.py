@@ -0,0 +1,53 @@
+"""
+This script generates the phase scan tables (BPM phases vs. cavity phase,
+amplitude, and input energy) for the SCLMed cavities and fits the phase scan
+of the 1st cavity by the table lookup.
+
+The tables are written into the scl_phase_scan_tables directory and can
+be read later by readPhaseScanTable(file_name).
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+from orbit.core.bunch import Bunch
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.phase_scan_tables_lib import CavityPhaseScanTableGenerator
+from uspas_fastlib.phase_scan_tables_lib import fitPhaseScan
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+names = ["SCLMed",]
+xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
+accLattice = getLinacAccLattice(names,xml_file_name)
+
+bunch_in = Bunch()
+bunch_in.readBunch("bunch_at_scl_entrance.dat")
+
+time_start = time.time()
+table_generator = CavityPhaseScanTableGenerator(accLattice,bunch_in,bpm_frequency = 402.5e+6)
+tables_dict = table_generator.makeTables(table_dir = "scl_phase_scan_tables", n_phases = 72)
+print ("Tables for %d cavities time[sec]= %8.2f"%(len(tables_dict),time.time() - time_start))
+
+#---- the test: the scan generated from the table with known parameters
+table = tables_dict["SCL:Cav01a"]
+cav_phase_arr = numpy.array([-180. + 10.*ind for ind in range(36)])
+(phase_offset,amp,e_kin) = (25.0,table.amp_arr[2]*1.05,table.e_kin_arr[1])
+bpm_phases = table.getBPM_Phases(cav_phase_arr - phase_offset,amp,e_kin)
+bpm_phases += numpy.array([35.,-70.][:len(table.bpm_names)])
+bpm_phases = (bpm_phases + 180.) % 360. - 180.
+
+time_start = time.time()
+((phase_offset_fit,amp_fit,e_kin_fit),rms_residual) = fitPhaseScan(table,cav_phase_arr,bpm_phases)
+print ("Fitting time[sec]= %8.3f"%(time.time() - time_start))
+print ("phase offset [deg] = %+8.2f  fit = %+8.2f"%(phase_offset,phase_offset_fit))
+print ("amplitude          = %8.5f  fit = %8.5f"%(amp,amp_fit))
+print ("input energy [MeV] = %8.3f  fit = %8.3f"%(e_kin*1000.,e_kin_fit*1000.))
+print ("rms residual [deg] = %8.4f"%rms_residual)
@@ -3,8 +3,11 @@
 # Importing epics to use pyepics to talk to Epics
 import epics
 
-# Importing time to allow our script to sleep while we wait for changes to be registered.
-import time
+# Importing BeamUpdateWaiter to wait for new beam pulses after we change something instead of sleeping.
+import os
+import sys
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
 
 # Imports to help with plotting.
 import numpy as np
@@ -18,6 +21,9 @@ BPM_name = "SCL_Diag:BPM32"
 # Here we grab the initial cavity phase. "CtlPhaseSet" is added to the cavity name to specify the phase.
 initial_phase = epics.caget(cavity_name + ":CtlPhaseSet")
 
+# Subscribe to the BPM phase to know when the new beam pulse has arrived.
+bpm_waiter = BeamUpdateWaiter([BPM_name + ":phaseAvg"])
+
 # Setup for the scan to make a plot later.
 num = 11
 cavity_phases = np.linspace(-10 + initial_phase, 10 + initial_phase, num)
@@ -26,12 +32,13 @@ bpm_phases = np.zeros(num)
 print("Cavity Phase [degrees]    BPM Phase [degrees]")
 for i in range(len(cavity_phases)):
     # Set the cavity phase
+    bpm_waiter.mark()
     epics.caput(cavity_name + ":CtlPhaseSet", cavity_phases[i])
 
-    # Sleep long enough for the cavity to change.
-    time.sleep(1.5)
+    # Wait for the beam pulses with the new cavity phase (at most 1.5 seconds).
+    bpm_waiter.wait(timeout=1.5)
 
-    # Read the arrival phase of the BPM after sleeping long enough for it to update.
+    # Read the arrival phase of the BPM after it has been updated.
     bpm_phases[i] = epics.caget(BPM_name + ":phaseAvg")
 
     print(cavity_phases[i], bpm_phases[i])
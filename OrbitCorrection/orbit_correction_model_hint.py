@@ -3,10 +3,15 @@ This script is to help you with the orbit correction project. It sets up the PyO
 You will need the results from the virtual accelerator part for this to work.
 """
 import os
+import sys
 
 from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
 
-from orbit.core.bunch import Bunch, BunchTwissAnalysis
+# The lattice is built from the compiled and cached XML image, so XML is parsed only once.
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+
+from orbit.core.bunch import BunchTwissAnalysis
 
 from orbit.lattice import AccActionsContainer
 
@@ -20,7 +25,7 @@ xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
 
 # create the factory instance and create the SNS Linac lattice.
 sns_linac_factory = SNS_LinacLatticeFactory()
-accLattice = sns_linac_factory.getLinacAccLattice(names, xml_file_name)
+accLattice = getLinacAccLattice(names, xml_file_name, linac_factory=sns_linac_factory)
 
 print("Linac lattice is ready. L=", accLattice.getLength())
 
@@ -46,17 +51,18 @@ for quad in quads:
             CCL_correctors[name] = child_node
 
 # Load bunch from file. This bunch is designed to enter the MEBT.
+# The text file is parsed only once, after that the binary memory-mapped copy is used.
+from uspas_fastlib.bunch_file_lib import readBunch
 bunch_file = os.environ["HOME"] + "/uspas24-CR/lattice/MEBT_in.dat"
-bunch_in = Bunch()
-bunch_in.readBunch(bunch_file)
+bunch_bin_file = os.environ["HOME"] + "/uspas24-CR/lattice/lattice_cache/MEBT_in.bin"
+bunch_in = readBunch(bunch_file, bin_file_name=bunch_bin_file)
 
 # Decrease the number of particles in the bunch (to speed up simulation and match the virtual accelerator.)
+# Only the first num_part particles are copied to the new bunch, the macro-size is not changed.
+# See also getRandomParticlesBunch, getStratifiedParticlesBunch, getMomentsMatchedBunch.
+from uspas_fastlib.bunch_reduction_lib import getFirstParticlesBunch
 num_part = 1000 # The number of particles you are tracking.
-bunch_orig_num = bunch_in.getSizeGlobal()
-for n in range(bunch_orig_num):
-    if n + 1 > num_part:
-        bunch_in.deleteParticleFast(n)
-bunch_in.compress()
+bunch_in = getFirstParticlesBunch(bunch_in, num_part, keep_total_charge=False)
 
 print("Bunch Generation completed.")
 
@@ -73,6 +79,8 @@ my_params = {}
 
 
 # Here is the action function for you to fill in with your calculations.
+# Hint: getBunchMoments(bunch, twiss_analysis) from uspas_fastlib.bunch_arrays_lib returns the centroid
+# and 6x6 correlations as numpy arrays, getBunchCoordinates(bunch) copies all coordinates into an (N,6) array.
 def action_entrance(paramsDict):
     node = paramsDict["node"]
     bunch = paramsDict["bunch"]
@@ -92,3 +100,6 @@ actionContainer.addAction(action_exit, AccActionsContainer.EXIT)
 # Track your bunch, passing your actions and parameters.
 accLattice.trackBunch(bunch_in, paramsDict=my_params, actionContainer=actionContainer)
 print("Done tracking!")
+
+# Hint: OrbitResponseMatrix from uspas_fastlib.orbit_response_lib calculates the response matrix
+# of the BPMs to the correctors and solves for the correctors field changes with SVD.
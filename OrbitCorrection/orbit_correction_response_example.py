@@ -0,0 +1,76 @@
+"""
+This script is an example of the response matrix orbit correction for
+the MEBT-CCL4 lattice from orbit_correction_model_hint.py with the same
+DTL correctors kicks.
+
+The response matrix of the CCL BPMs to the CCL correctors is calculated
+once (one partial tracking per corrector) and cached in the orbit_response_cache
+directory for these quads and cavities settings. The correction itself
+is the SVD solution without tracking.
+"""
+
+import os
+import sys
+
+import numpy
+
+from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
+
+from orbit.py_linac.lattice_modifications import Add_quad_apertures_to_lattice
+from orbit.py_linac.lattice_modifications import Add_rfgap_apertures_to_lattice
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.bunch_file_lib import readBunch
+from uspas_fastlib.bunch_reduction_lib import getFirstParticlesBunch
+from uspas_fastlib.orbit_response_lib import OrbitResponseMatrix
+from uspas_fastlib.orbit_response_lib import getBPM_Nodes
+from uspas_fastlib.orbit_response_lib import getCorrectorNodes
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+names = ["MEBT", "DTL1", "DTL2", "DTL3", "DTL4", "DTL5", "DTL6", "CCL1", "CCL2", "CCL3", "CCL4"]
+xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
+
+sns_linac_factory = SNS_LinacLatticeFactory()
+accLattice = getLinacAccLattice(names,xml_file_name,linac_factory = sns_linac_factory)
+
+aprtNodes = Add_quad_apertures_to_lattice(accLattice)
+aprtNodes = Add_rfgap_apertures_to_lattice(accLattice,aprtNodes)
+
+#---- the kicks from the problem statement
+DTL_correctors = {"DTL_Mag:DCH618":0.005, "DTL_Mag:DCV621":-0.004}
+for name, field in DTL_correctors.items():
+	accLattice.getNodeForName(name).setField(field)
+
+bunch_file = os.environ["HOME"] + "/uspas24-CR/lattice/MEBT_in.dat"
+bunch_bin_file = os.environ["HOME"] + "/uspas24-CR/lattice/lattice_cache/MEBT_in.bin"
+bunch_in = getFirstParticlesBunch(readBunch(bunch_file,bin_file_name = bunch_bin_file),1000,keep_total_charge = False)
+
+accLattice.trackDesignBunch(bunch_in)
+print ("Design tracking completed.")
+
+bpm_nodes = getBPM_Nodes(accLattice,"CCL")
+corr_nodes = getCorrectorNodes(accLattice,"CCL")
+response = OrbitResponseMatrix(accLattice,bunch_in,corr_nodes,bpm_nodes,delta_field = 1.0e-3,cache_dir = "orbit_response_cache")
+singular_values = response.getSingularValues()
+print ("Singular values =",singular_values)
+
+#---- the Tikhonov parameter suppresses the SVD modes with singular values
+#---- below about 10% of the largest one, they need strong correctors fields
+tikhonov_rel = 0.1
+
+#---- the orbit can be also measured in the virtual accelerator: CCL BPMs xAvg, yAvg in mm
+orbit = response.getOrbit()
+delta_fields = response.solveCorrection(orbit,tikhonov = tikhonov_rel*singular_values[0])
+orbit_corrected = response.predictOrbit(orbit,delta_fields)
+print ("Orbit rms before correction [mm] = %8.4f"%numpy.sqrt(numpy.nanmean(orbit**2)))
+print ("Orbit rms after correction, predicted [mm] = %8.4f"%numpy.sqrt(numpy.nanmean(orbit_corrected**2)))
+for name, delta_field in zip(response.getCorrectorNames(),delta_fields):
+	print ("corrector = %20s  field change [T] = %+10.6f"%(name,delta_field))
+
+response.applyCorrection(delta_fields)
+orbit = response.getOrbit()
+print ("Orbit rms after correction, tracking [mm] = %8.4f"%numpy.sqrt(numpy.nanmean(orbit**2)))
@@ -0,0 +1,51 @@
+"""
+This script is an example of the tolerance study for the MEBT-CCL4 lattice
+from orbit_correction_model_hint.py. The lattice with random errors of quads
+gradients, RF cavities phases and amplitudes, and correctors fields is tracked
+for many seeds in a pool of processes. Each process builds the lattice once.
+
+The results are in the orbit_errors_ensemble.npz file.
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.error_ensemble_lib import ErrorEnsembleRunner
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+model_params = {}
+model_params["names"] = ["MEBT", "DTL1", "DTL2", "DTL3", "DTL4", "DTL5", "DTL6", "CCL1", "CCL2", "CCL3", "CCL4"]
+model_params["xml_file_name"] = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
+model_params["bunch_file"] = os.environ["HOME"] + "/uspas24-CR/lattice/MEBT_in.dat"
+model_params["bin_file_name"] = os.environ["HOME"] + "/uspas24-CR/lattice/lattice_cache/MEBT_in.bin"
+model_params["n_particles"] = 1000
+model_params["bpm_name_substring"] = "CCL"
+
+#---- rms of errors: relative for quads and RF amplitudes, deg for RF phases, T for correctors
+error_spec = {"quad_rel":0.005, "cav_phase_deg":1.0, "cav_amp_rel":0.01, "corr_field":0.0005}
+
+n_seeds = 100
+
+if __name__ == "__main__":
+	time_start = time.time()
+	with ErrorEnsembleRunner(model_params) as runner:
+		bpm_names = runner.getElementNames()["bpms"]
+		res_dict = runner.run(error_spec,n_seeds)
+	print ("Ensemble of %d seeds time[sec]= %8.1f"%(n_seeds,time.time() - time_start))
+
+	n_bpms = len(bpm_names)
+	orbits = res_dict["orbits"]
+	x_rms = numpy.nanstd(orbits[:,:n_bpms],axis = 0)
+	y_rms = numpy.nanstd(orbits[:,n_bpms:],axis = 0)
+	for ind, bpm_name in enumerate(bpm_names):
+		print ("BPM= %20s  rms x,y [mm] = %6.3f %6.3f "%(bpm_name,x_rms[ind],y_rms[ind]))
+	n_parts = res_dict["n_parts"]
+	print ("Number of particles at the exit min,avg = %d %8.1f "%(n_parts.min(),n_parts.mean()))
+	numpy.savez("orbit_errors_ensemble.npz",**res_dict)
@@ -0,0 +1,87 @@
+"""
+This script analyzes the WS04a RMS X,Y sizes as functions of the MEBT:QH03
+gradient with the transport matrices from the PyORBIT model instead of
+the simplified quad-drift matrices.
+
+The QH03 -> WS04a matrices are calculated by bunch tracking with
+LinacTrMatricesContrioller on the gradient grid once and are kept in
+the quad_scan_matrices_cache directory. For the measured gradients
+the matrices are interpolated, so the analysis is as fast as with
+the simplified matrices.
+
+The lattice settings are the same as in sns_linac_mebt_ws_scans_VA_hint_0.py:
+MEBT:FCM1 (MEBT1) cavity is off, QV04 gradient is zero.
+
+The input is the quad_scan_ws_data.dat file with lines: G[T/m] sigmaX[mm] sigmaY[mm]
+where G is the model QH03 gradient.
+"""
+
+import os
+import sys
+import math
+import time
+
+import numpy
+
+from orbit.core.bunch import Bunch
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.quad_matrix_cache_lib import QuadScanMatrixTable
+from uspas_fastlib.twiss_lsq_lib import solveCorrelationsLSQ
+from uspas_fastlib.twiss_lsq_lib import getTwissFromCorrelations
+from uspas_fastlib.twiss_lsq_lib import getRelativeErrorWeights
+from uspas_fastlib.twiss_lsq_lib import getErrors
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
+accLattice = getLinacAccLattice(["MEBT",],xml_file_name)
+
+bunch_in = Bunch()
+bunch_in.readBunch("bunch_mebt_entrance_v0.dat")
+
+bunch = Bunch()
+bunch_in.copyBunchTo(bunch)
+accLattice.trackDesignBunch(bunch)
+
+accLattice.getRF_Cavity("MEBT1").setAmp(0.)
+accLattice.getNodeForName("MEBT_Mag:QV04").setParam("dB/dr",0.)
+
+#---- the grid has the sign of the design gradient
+quad_name = "MEBT_Mag:QH03"
+quad_sign = math.copysign(1.0,accLattice.getNodeForName(quad_name).getParam("dB/dr"))
+gradient_grid = quad_sign*numpy.arange(2.0,42.01,1.0)
+
+time_start = time.time()
+matrix_table = QuadScanMatrixTable(accLattice,bunch_in,quad_name,"MEBT_Diag:WS04a",cache_dir = "quad_scan_matrices_cache")
+matrix_table.makeTable(gradient_grid)
+print ("Matrices table for %d gradients time[sec]= %8.2f"%(len(gradient_grid),time.time() - time_start))
+
+data_arr = []
+file_in = open("quad_scan_ws_data.dat","r")
+for ln in file_in.readlines():
+	res_arr = ln.split()
+	if(len(res_arr) != 3): continue
+	data_arr.append([float(val) for val in res_arr])
+file_in.close()
+data_arr = numpy.array(data_arr)
+
+(G_arr,sigmaX_arr,sigmaY_arr) = (data_arr[:,0],data_arr[:,1],data_arr[:,2])
+
+#---- (2,K,3) LSQ matrices and (2,K) RMS^2 for X and Y planes
+lsq_matrices = matrix_table.getLSQ_Matrices(G_arr)
+rms2_arr = numpy.stack((sigmaX_arr,sigmaY_arr))**2
+(corr,corr_cov) = solveCorrelationsLSQ(lsq_matrices,rms2_arr,getRelativeErrorWeights(rms2_arr,0.05))
+(twiss,twiss_cov) = getTwissFromCorrelations(corr,corr_cov)
+twiss_err = getErrors(twiss_cov)
+
+print ("------------------------------------------------")
+for plane, plane_name in enumerate(("X","Y")):
+	(alpha,beta,emitt) = twiss[plane]
+	(alpha_err,beta_err,emitt_err) = twiss_err[plane]
+	print ("%s (alpha,beta,emitt) = ( %+7.4f +- %6.4f , %7.4f +- %6.4f , %7.4f +- %6.4f )"%(plane_name,
+		alpha,alpha_err,beta,beta_err,emitt,emitt_err))
+print ("------------------------------------------------")
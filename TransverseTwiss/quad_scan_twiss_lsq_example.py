@@ -0,0 +1,60 @@
+"""
+This script analyzes the WS RMS X,Y sizes as functions of quad gradient
+to get transverse Twiss parameters at the entrance of the quad.
+It is the same analysis as in pyorbit_sns_linac_mebt_trMtrx_simpl_hint_0.py,
+but the LSQ matrices for all gradients, X and Y planes are built and solved
+by vectorized NumPy functions, and the Twiss errors are calculated with
+analytic Jacobians.
+
+The input is the quad_scan_ws_data.dat file with lines: G[T/m] sigmaX[mm] sigmaY[mm]
+"""
+
+import os
+import sys
+import math
+
+import numpy
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.twiss_lsq_lib import reconstructTwissXY
+from uspas_fastlib.twiss_lsq_lib import getErrors
+
+#---- H- particles mass and energy in MeV
+charge = -1.0
+mass = 939.9
+Ekin = 2.5
+momentum = math.sqrt((mass+Ekin)**2 - mass**2)/1000.
+
+#---- positions of quad and WS along MEBT in meters
+ws_pos = 0.723
+quad_pos = 0.418
+Lquad = 0.061
+#---- this is the distance from the end of the quad to WS
+Ldrift = ws_pos - (quad_pos + Lquad/2.0)
+
+#---- relative error of RMS sizes for LSQ weights
+relative_error = 0.05
+
+data_arr = []
+file_in = open("quad_scan_ws_data.dat","r")
+for ln in file_in.readlines():
+	res_arr = ln.split()
+	if(len(res_arr) != 3): continue
+	data_arr.append([float(val) for val in res_arr])
+file_in.close()
+data_arr = numpy.array(data_arr)
+
+(G_arr,sigmaX_arr,sigmaY_arr) = (data_arr[:,0],data_arr[:,1],data_arr[:,2])
+
+for thin in (False,True):
+	(corr,corr_cov,twiss,twiss_cov) = reconstructTwissXY(G_arr,sigmaX_arr,sigmaY_arr,momentum,Lquad,Ldrift,
+		charge,relative_error = relative_error,thin = thin)
+	twiss_err = getErrors(twiss_cov)
+	print ("------------------------------------------------")
+	print ("Thin quad =",thin)
+	for plane, plane_name in enumerate(("X","Y")):
+		(alpha,beta,emitt) = twiss[plane]
+		(alpha_err,beta_err,emitt_err) = twiss_err[plane]
+		print ("%s (alpha,beta,emitt) = ( %+7.4f +- %6.4f , %7.4f +- %6.4f , %7.4f +- %6.4f )"%(plane_name,
+			alpha,alpha_err,beta,beta_err,emitt,emitt_err))
+print ("------------------------------------------------")
@@ -10,12 +10,17 @@ Start of Virtual Accelerator:
 
 """
 
+import os
 import sys
 import math
 import time
 
 from epics import pv as pv_channel
-from epics import caget, caput
+
+#---- to wait for the new beam pulse instead of sleeping
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
+from uspas_fastlib.ws_streaming_lib import StreamingWireScanner
 
 def calculateRMS(x_arr,y_arr):
 	"""
@@ -41,13 +46,15 @@ def wireScan(pos_start,pos_end,ws_speed,sleep_time = 1.0, ws_name = "04a"):
 	Returns the sigma for horizontal and vertical WS distribution curves.
 	pos_start,pos_end - positions in mm (like from -25. to 30.)
 	ws_speed - defines the postition step 0.2, 0.3 or 0.5 mm
-	sleep_time - time for VA respond - by default should be 1.0 sec.
+	sleep_time - max time for VA respond - by default should be 1.0 sec.
+	The loop waits for the new WS signals, so it runs with the VA refresh rate.
 	"""
 	pos_set_pv = pv_channel.PV("MEBT_Diag:WS"+ws_name+":Position_Set")
 	pos_pv = pv_channel.PV("MEBT_Diag:WS"+ws_name+":Position")
 	speed_pv = pv_channel.PV("MEBT_Diag:WS"+ws_name+":Speed_Set")
 	hor_signal_pv = pv_channel.PV("MEBT_Diag:WS"+ws_name+":Hor_Cont")
 	ver_signal_pv = pv_channel.PV("MEBT_Diag:WS"+ws_name+":Ver_Cont")
+	ws_waiter = BeamUpdateWaiter([pos_pv.pvname,hor_signal_pv.pvname,ver_signal_pv.pvname])
 	#----- Geometry of fork coeff
 	coeff_fork = math.sqrt(2.0)/2
 	#---- Retract fork -------------------
@@ -65,10 +72,11 @@ def wireScan(pos_start,pos_end,ws_speed,sleep_time = 1.0, ws_name = "04a"):
 	pos = pos_pv.get()
 	delta_pos = 0.01
 	while(pos < pos_end - delta_pos):
+		ws_waiter.mark()
+		ws_waiter.wait(n_updates = 1, timeout = sleep_time)
 		pos = pos_pv.get()
 		hor_signal = hor_signal_pv.get()
 		ver_signal = ver_signal_pv.get()
-		time.sleep(sleep_time)
 		print ("wire pos = %+6.3f"%pos," H,V signals = %12.5g %12.5g "%(hor_signal,ver_signal))
 		pos_arr.append(pos)
 		hor_signal_arr.append(hor_signal)
@@ -77,6 +85,7 @@ def wireScan(pos_start,pos_end,ws_speed,sleep_time = 1.0, ws_name = "04a"):
 	speed_pv.put(100.)
 	pos_set_pv.put(pos_start)
 	time.sleep(2.0)
+	ws_waiter.disconnect()
 	#-------------------------------------
 	(x_avg,x_sigma) = calculateRMS(pos_arr,hor_signal_arr)
 	(y_avg,y_sigma) = calculateRMS(pos_arr,ver_signal_arr)
@@ -117,9 +126,22 @@ pos_end = 30.0
 
 #---- ws_speed defines step
 ws_speed = 1.0
-ws_sleep_time = 0.1
-
-(hor_sigma,ver_sigma) = wireScan(pos_start,pos_end,ws_speed,ws_sleep_time)
+#---- max time to wait for the new WS signals, the loop runs with the VA refresh rate
+ws_sleep_time = 1.0
+
+#---- the streaming acquisition accumulates the moments for each beam pulse,
+#---- and the sigmas are ready when the wire reaches pos_end
+use_streaming_scan = False
+
+if(use_streaming_scan):
+	ws_scanner = StreamingWireScanner("MEBT_Diag:WS04a")
+	ws_sigmas = ws_scanner.scan(pos_start,pos_end,ws_speed)
+	if(ws_sigmas == None):
+		print ("WS04a scan timeout. Stop.")
+		sys.exit(1)
+	(hor_sigma,ver_sigma) = ws_sigmas
+else:
+	(hor_sigma,ver_sigma) = wireScan(pos_start,pos_end,ws_speed,ws_sleep_time)
 print ("(hor_sigma,ver_sigma) =",(hor_sigma,ver_sigma))
 
 #---- Let's define quad field scan
@@ -179,6 +179,27 @@ from uspas_pylib.harmonic_data_fitting_lib import fitCosineFunc
 ((amp,phase_offset,avg_val),scorer) = fitCosineFunc(x_arr,y_arr,show_progress = False)
 print ("(phase_offset,amp,avg_val) = ",(phase_offset,amp,avg_val))
 
+#------------------------------------------------
+#---- Closed form cos-like fitting (linear least squares)
+#---- y = a*cos(x) + b*sin(x) + c is linear in (a,b,c)
+#------------------------------------------------
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+import numpy
+from uspas_fastlib.cos_fitting_lib import fitCosineFuncLSQ, fitCosineArrays, getCosineFitErrors
+
+((amp,phase_offset,avg_val),cov) = fitCosineFuncLSQ(x_arr,y_arr)
+print ("LSQ (phase_offset,amp,avg_val) = ",(phase_offset,amp,avg_val))
+
+#---- many noisy curves (like all BPMs of all cavities phase scans) at once
+n_curves = 10000
+y_noisy_arr = numpy.array(y_arr) + numpy.random.normal(0.,0.5,(n_curves,len(x_arr)))
+time_start = time.time()
+(params,covs) = fitCosineArrays(x_arr,y_noisy_arr)
+print ("LSQ fitting time for %d curves = %8.4f sec"%(n_curves,time.time() - time_start))
+print ("(amp,phase_offset,avg_val) avg.   = ",params.mean(axis = 0))
+print ("(amp,phase_offset,avg_val) spread = ",params.std(axis = 0))
+print ("(amp,phase_offset,avg_val) errors = ",getCosineFitErrors(covs).mean(axis = 0))
+
 print ("=======Stop.==========")
 sys.exit(0)
 
@@ -1,5 +1,8 @@
 # This script runs through how to build a lattice, build a bunch, and how to track it.
 
+import os
+import sys
+
 import numpy as np
 from matplotlib import pyplot as plt
 
@@ -15,6 +18,10 @@ from orbit.py_linac.lattice.LinacAccNodes import Quad, Drift
 # Import AccActionsContainer, a method to add functionality throughout the accelerator.
 from orbit.lattice import AccActionsContainer
 
+# Import getBunchCoordinate to copy a coordinate of all particles into a numpy array at once.
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinate
+
 # Field strength and length of the quadrupoles
 field_str = 1.8
 quad_len = 0.2
@@ -123,13 +130,8 @@ def action_entrance(paramsDict):
     paramsDict["old_pos"] = pos
     pos_array.append(pos)
 
-    # Loop through the particles and add their x positions to a list, then add that list to our x_array.
-    nParts = bunch.getSizeGlobal()
-    x_temp = []
-    for n in range(nParts):
-        x = bunch.x(n) * 1000  # [mm]
-        x_temp.append(x)
-    x_array.append(x_temp)
+    # Copy the x positions of all particles into a numpy array in one call, then add it to our x_array.
+    x_array.append(getBunchCoordinate(bunch, 0) * 1000)  # [mm]
 
 
 # Use the same function for an action that will take place at the exit of each node.
@@ -26,6 +26,10 @@ random.seed(100)
 
 from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
 
+#---- lattice from the compiled and cached XML image, XML is parsed only once
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+
 #---- Names of sequences
 names = ["MEBT","DTL1",]
 
@@ -35,8 +39,8 @@ sns_linac_factory = SNS_LinacLatticeFactory()
 #---- the XML file name with the structure
 xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
 
-#---- make lattice from XML file 
-accLattice = sns_linac_factory.getLinacAccLattice(names,xml_file_name)
+#---- make lattice from XML file (or from its cached image)
+accLattice = getLinacAccLattice(names,xml_file_name,linac_factory = sns_linac_factory)
 
 print ("Linac lattice =",accLattice.getName()," is ready. Length[m] = ",accLattice.getLength())
 
@@ -227,22 +231,21 @@ print ("----------------------------------------------")
 # How to see bunch parameters along the tracking
 #-------------------------------------------------------------
 from orbit.lattice import AccActionsContainer
+from uspas_fastlib.sampling_actions_lib import SamplingActionsContainer
 
 # track through the lattice
 paramsDict = {"old_pos": -1.0, "count": 0, "pos_step": 0.1}
-actionContainer = AccActionsContainer("Bunch Tracking")
+#---- actions will be called only at the nodes nearest to the 0.1 m grid points
+actionContainer = SamplingActionsContainer(accLattice,"Bunch Tracking")
+actionContainer.addPositionStep(paramsDict["pos_step"])
 
 pos_start = 0.0
 
-file_out = open("pyorbit_twiss_sizes_ekin.dat", "w")
+#---- records are buffered in NumPy arrays and written by chunks to the .npy columns
+#---- the text file pyorbit_twiss_sizes_ekin.dat is exported after the tracking
+from uspas_fastlib.diagnostics_writer_lib import DiagnosticsWriter, DiagnosticsData
+diagnostics_writer = DiagnosticsWriter("pyorbit_twiss_sizes_ekin_npy")
 
-s = " Node   position "
-s += "   alphaX betaX emittX  normEmittX"
-s += "   alphaY betaY emittY  normEmittY"
-s += "   alphaZ betaZ emittZ  emittZphiMeV"
-s += "   sizeX sizeY sizeZ_deg"
-s += "   eKin Nparts "
-file_out.write(s + "\n")
 print(" N node   position   sizeX  sizeY  sizeZdeg  eKin Nparts ")
 
 
@@ -252,8 +255,6 @@ def action_entrance(paramsDict):
     pos = paramsDict["path_length"]
     if paramsDict["old_pos"] == pos:
         return
-    if paramsDict["old_pos"] + paramsDict["pos_step"] > pos:
-        return
     paramsDict["old_pos"] = pos
     paramsDict["count"] += 1
     gamma = bunch.getSyncParticle().gamma()
@@ -273,14 +274,11 @@ def action_entrance(paramsDict):
     # ---- phi_de_emittZ will be in [pi*deg*MeV]
     phi_de_emittZ = z_to_phase_coeff * emittZ
     eKin = bunch.getSyncParticle().kinEnergy() * 1.0e3
-    s = " %35s  %4.5f " % (node.getName(), pos + pos_start)
-    s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % (alphaX, betaX, emittX, norm_emittX)
-    s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % (alphaY, betaY, emittY, norm_emittY)
-    s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % (alphaZ, betaZ, emittZ, phi_de_emittZ)
-    s += "   %5.3f  %5.3f  %5.3f " % (x_rms, y_rms, z_rms_deg)
-    s += "  %10.6f   %8d " % (eKin, nParts)
-    file_out.write(s + "\n")
-    file_out.flush()
+    values = [alphaX, betaX, emittX, norm_emittX]
+    values += [alphaY, betaY, emittY, norm_emittY]
+    values += [alphaZ, betaZ, emittZ, phi_de_emittZ]
+    values += [x_rms, y_rms, z_rms_deg, eKin, nParts]
+    diagnostics_writer.addRecord(node.getName(), pos + pos_start, values)
     s_prt = " %5d  %35s  %4.5f " % (paramsDict["count"], node.getName(), pos + pos_start)
     s_prt += "  %5.3f  %5.3f   %5.3f " % (x_rms, y_rms, z_rms_deg)
     s_prt += "  %10.6f   %8d " % (eKin, nParts)
@@ -291,20 +289,49 @@ def action_exit(paramsDict):
     action_entrance(paramsDict)
 
 
-actionContainer.addAction(action_entrance, AccActionsContainer.ENTRANCE)
-actionContainer.addAction(action_exit, AccActionsContainer.EXIT)
+actionContainer.addSampledAction(action_entrance, AccActionsContainer.ENTRANCE)
+actionContainer.addSampledAction(action_exit, AccActionsContainer.EXIT)
+
+#---- the profiler calls our actions and measures the time of each node and node class
+from uspas_fastlib.tracking_profiler_lib import ProfilingActionsContainer
+profiler = ProfilingActionsContainer(actionContainer)
 
 time_start = time.process_time()
 
 bunch = Bunch()
 bunch_in.copyBunchTo(bunch)
-accLattice.trackBunch(bunch, paramsDict = paramsDict, actionContainer = actionContainer)
+accLattice.trackBunch(bunch, paramsDict = paramsDict, actionContainer = profiler)
 
 time_exec = time.process_time() - time_start
 print("time[sec]=", time_exec)
 
-file_out.close()
+diagnostics_writer.close()
+
+#---- columns are memory-mapped, nothing is parsed
+diagnostics_data = DiagnosticsData("pyorbit_twiss_sizes_ekin_npy")
+print("max sizeX [mm] =", diagnostics_data.getColumn("sizeX").max())
+diagnostics_data.writeText("pyorbit_twiss_sizes_ekin.dat")
+
+profiler.printTable(n_lines = 20)
+profiler.printTable(by_class = True)
+profiler.writeJSON("pyorbit_tracking_profile.json")
+
+#-------------------------------------------------------------
+# The rms envelope tracking - fast alternative to the particles
+# tracking for the Twiss, sizes, and energy along the lattice
+#-------------------------------------------------------------
+from uspas_fastlib.envelope_tracker_lib import EnvelopeTracker
+
+envelope_tracker = EnvelopeTracker(accLattice, peak_current = peak_current, bunch_frequency = 402.5e+6)
+
+time_start = time.process_time()
+
+envelope_tracker.trackBunch(bunch_in, twiss_analysis)
+
+time_exec = time.process_time() - time_start
+print("Envelope tracking time[sec]=", time_exec)
 
+envelope_tracker.writeTwissSizesEkin("envelope_twiss_sizes_ekin.dat", pos_step = paramsDict["pos_step"], n_parts = n_particles)
 
 print ("Stop.")
 
@@ -13,12 +13,16 @@ Finally, it will check the results with VA.
 import os
 import sys
 import math
-import time
 
 
-from epics import pv as pv_channel
-
 from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
+
+#---- lattice from the compiled and cached XML image, XML is parsed only once
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.epics_group_lib import PV_Group, getMagnetPV_Names
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
+
 from orbit.core.bunch import Bunch
 from orbit.core.bunch import BunchTwissAnalysis
 from orbit.bunch_generators import TwissContainer
@@ -56,8 +60,8 @@ sns_linac_factory = SNS_LinacLatticeFactory()
 #---- the XML file name with the structure
 xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
 
-#---- make lattice from XML file 
-accLattice = sns_linac_factory.getLinacAccLattice(names,xml_file_name)
+#---- make lattice from XML file (or from its cached image)
+accLattice = getLinacAccLattice(names,xml_file_name,linac_factory = sns_linac_factory)
 
 #---- dictionary with the start and end positions of 1st level nodes
 node_position_dict = accLattice.getNodePositionsDict()
@@ -99,25 +103,22 @@ quad_nodes = accLattice.getQuads()
 #----------------------------------------------------------------------
 #---- Now let's synchronize PyORBIT model with Virtual Accelerator 
 #----------------------------------------------------------------------
+#---- all PVs of the group are read or written in one batched CA operation
 print ("====================================")
-for quad_node in quad_nodes:
-	pv = pv_channel.PV(quad_node.getName().replace(":",":PS_")+":B_Set")
-	field_grad = pv.get()
+quad_pv_group = PV_Group(getMagnetPV_Names(quad_nodes))
+for quad_node, field_grad in zip(quad_nodes,quad_pv_group.get()):
 	quad_node.setField(field_grad)
 	print ("debug quad=",quad_node.getName()," G[T/m] =",field_grad)
 print ("====================================")
-dcv_field_pv_arr = []
-for dcv_node in dcv_nodes:
-	pv = pv_channel.PV(dcv_node.getName().replace(":",":PS_")+":B_Set")
-	dcv_field_pv_arr.append(pv)
-	pv.put(0.)
+dcv_pv_group = PV_Group(getMagnetPV_Names(dcv_nodes))
+dcv_pv_group.put(0.)
+dcv_field_pv_arr = dcv_pv_group.getPVs()
+for dcv_node, pv in zip(dcv_nodes,dcv_field_pv_arr):
 	print ("debug dcv=",dcv_node.getName()," pv=",pv.pvname)
 print ("====================================")
-bpm_ver_pos_pv_arr = []
-for bpm_model_node in bpm_model_nodes:
-	pv = pv_channel.PV(bpm_model_node.getName().replace("-model","")+":yAvg")
-	bpm_ver_pos_pv_arr.append(pv)
-	yAvg = pv.get()
+bpm_pv_group = PV_Group([bpm_model_node.getName().replace("-model","")+":yAvg" for bpm_model_node in bpm_model_nodes])
+bpm_ver_pos_pv_arr = bpm_pv_group.getPVs()
+for pv, yAvg in zip(bpm_ver_pos_pv_arr,bpm_pv_group.get()):
 	print ("debug bpm pv =",pv.pvname," yAvg[mm]= %+6.4f"%yAvg)
 print ("====================================")
 
@@ -209,11 +210,29 @@ length_5 = dcv_nodes[2].getParam("effLength")
 #---- Now we change the DCV01 field to 0.01 T and see the BPMs
 #---------------------------------------------------------------
 dc01_field = 0.05
-dcv_field_pv_arr[0].put(dc01_field)
-
-time.sleep(2.1)
+bpm_waiter = BeamUpdateWaiter(bpm_pv_group.getNames())
+bpm_waiter.putAndWait(dcv_field_pv_arr[0],dc01_field,timeout = 2.1)
 
-for pv in bpm_ver_pos_pv_arr:
-	yAvg = pv.get()
+for pv, yAvg in zip(bpm_ver_pos_pv_arr,bpm_pv_group.get()):
 	print ("debug bpm pv =",pv.pvname," yAvg[mm]= %+6.4f"%(yAvg))
 print ("====================================")
+
+#---------------------------------------------------------------
+#---- The same DCV01 kick in the transport matrices surrogate model.
+#---- The matrices at all nodes are extracted from one tracking,
+#---- and the fields changes need only matrix products.
+#---------------------------------------------------------------
+from uspas_fastlib.transfer_map_surrogate_lib import TransferMapSurrogate
+
+surrogate = TransferMapSurrogate(accLattice,bunch_in)
+surrogate.setCorrectorField(dcv_nodes[0],dc01_field)
+centroids = surrogate.propagateCentroid([0.,0.,0.,0.,0.,0.])
+index_dict = surrogate.index_dict
+for bpm_model_node in bpm_model_nodes:
+	y_model = centroids[index_dict[bpm_model_node.getBPM()]][2]*1000.
+	print ("surrogate bpm =",bpm_model_node.getName()," y[mm]= %+6.4f"%y_model)
+print ("====================================")
+
+#---- matrices between correctors for the bump closing (7x7 with the kick column)
+trMtrx_1_to_4_arr = surrogate.getTransportMatrix(dcv_nodes[0],dcv_nodes[1])
+trMtrx_1_to_5_arr = surrogate.getTransportMatrix(dcv_nodes[0],dcv_nodes[2])
@@ -10,11 +10,14 @@ the Virtual Accelerator.
 
 """
 
+import os
 import sys
 import math
-import time
 
-from epics import pv as pv_channel
+#---- batched CA operations for groups of PVs
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.epics_group_lib import PV_Group
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
 
 #-------------------------------------------------------------------
 #              START of the SCRIPT
@@ -22,31 +25,30 @@ from epics import pv as pv_channel
 
 #---- DCV01, DCV04, DCV05, DCV10, DCV11, DCV14  
 dcv_ind_arr = [1,4,5,10,11,14]
-dcv_field_pv_arr = []
-for ind in dcv_ind_arr:
-	dcv_field_pv_arr.append(pv_channel.PV("MEBT_Mag:PS_DCV"+"%02d"%ind+":B_Set"))
+dcv_pv_group = PV_Group(["MEBT_Mag:PS_DCV"+"%02d"%ind+":B_Set" for ind in dcv_ind_arr])
+dcv_field_pv_arr = dcv_pv_group.getPVs()
 
-#---- put 0. [T] field in all DCV
-for pv in dcv_field_pv_arr:
-	pv.put(0.)
+#---- put 0. [T] field in all DCV in one batched operation
+dcv_pv_group.put(0.)
+
+#---- BPM01, BPM04, BPM05, BPM10, and BPM11
+bpm_ind_arr = [1,4,5,10,11,14]
+bpm_pv_names = ["MEBT_Diag:BPM"+"%02d"%ind+":yAvg" for ind in bpm_ind_arr]
+bpm_pv_group = PV_Group(bpm_pv_names)
+bpm_ver_pos_pv_arr = bpm_pv_group.getPVs()
+#---- it knows when the new beam pulse is measured by BPMs
+bpm_waiter = BeamUpdateWaiter(bpm_pv_names)
 
 #---- set DCV01 t0 field 0.05 [T]
 dcv01_field = 0.05
-dcv_field_pv_arr[0].put(dcv01_field)
 
-#---- give the accelerator time to put beam through MEBT
-time.sleep(2.0)	
-
-#---- BPM01, BPM04, BPM05, BPM10, and BPM11
-bpm_ind_arr = [1,4,5,10,11,14]
-bpm_ver_pos_pv_arr = []
-for ind in bpm_ind_arr:
-	bpm_ver_pos_pv_arr.append(pv_channel.PV("MEBT_Diag:BPM"+"%02d"%ind+":yAvg"))
+#---- give the accelerator time to put beam through MEBT (at most 2 sec)
+bpm_waiter.putAndWait(dcv_field_pv_arr[0],dcv01_field,timeout = 2.0)
 
 #-------------------------------------------------
 #---- Let's print BPM signals before bump closing
 #-------------------------------------------------
 print ("======= BPMs before Closing =====")
-for bpm_pv in bpm_ver_pos_pv_arr:
-	print ("BPM PV=",bpm_pv.pvname," y_avg[mm] = %+12.5g "%bpm_pv.get())
+for bpm_pv, y_avg in zip(bpm_ver_pos_pv_arr,bpm_pv_group.get()):
+	print ("BPM PV=",bpm_pv.pvname," y_avg[mm] = %+12.5g "%y_avg)
 print ("=================================")
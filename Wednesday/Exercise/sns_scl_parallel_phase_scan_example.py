@@ -0,0 +1,52 @@
+"""
+This script performs the 360 points phase scan of one SCL cavity
+with the SCLMed+SCLHigh+HEBT1 PyORBIT model.
+
+The scan points are distributed over the pool of processes, and
+each process builds the lattice and the bunch only once.
+The tracking is the same as in sns_scl_pyorbit_model_hint_0.py
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.phase_scan_pool_lib import ParallelPhaseScanRunner
+from uspas_fastlib.phase_scan_pool_lib import makePhaseScanSettings
+
+#-------------------------------------------------------------------
+#              START of the SCRIPT
+#-------------------------------------------------------------------
+
+#---- the model parameters are the same as in sns_scl_pyorbit_model_hint_0.py
+model_params = {}
+model_params["names"] = ["SCLMed","SCLHigh","HEBT1"]
+model_params["xml_file_name"] = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
+model_params["twiss"] = ((-1.3264, 2.0412, 1.0379*1.0e-6),
+                         ( 1.8856, 9.9807, 0.3921*1.0e-6),
+                         ( 0.1040,13.0192, 0.3812*1.0e-6))
+model_params["e_kin_ini"] = 0.1856
+model_params["n_particles"] = 1000
+model_params["peak_current"] = 38.
+model_params["bpm_frequency"] = 402.5e+6
+
+if __name__ == "__main__":
+	cav_name = "SCL:Cav01a"
+	n_points = 360
+	phase_arr = [-180. + 360.*ind/n_points for ind in range(n_points)]
+	settings = makePhaseScanSettings(cav_name,phase_arr,1.0)
+
+	time_start = time.time()
+	with ParallelPhaseScanRunner(model_params) as runner:
+		(bpm_phases,bpm_amps) = runner.run(settings)
+	print ("Scan of %d points by %d processes time[sec]= %6.1f"%(n_points,runner.n_workers,time.time() - time_start))
+
+	import matplotlib.pyplot as plt
+
+	#---- BPM phases for the 1st BPM after the cavity
+	plt.plot(phase_arr,bpm_phases[:,0])
+	plt.xlabel("Cavity Phase [deg]")
+	plt.ylabel("BPM Phase [deg]")
+	plt.show()
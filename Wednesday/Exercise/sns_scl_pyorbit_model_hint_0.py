@@ -14,6 +14,11 @@ import time
 
 from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
 
+#---- lattice from the compiled and cached XML image, XML is parsed only once
+sys.path.append(os.environ["HOME"] + "/uspas24-CR/")
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.checkpoint_tracking_lib import CheckpointTracker
+
 from orbit.bunch_generators import TwissContainer
 from orbit.bunch_generators import WaterBagDist3D, GaussDist3D, KVDist3D
 
@@ -64,8 +69,8 @@ sns_linac_factory = SNS_LinacLatticeFactory()
 #---- the XML file name with the structure
 xml_file_name = os.environ["HOME"] + "/uspas24-CR/lattice/sns_linac.xml"
 
-#---- make lattice from XML file 
-accLattice = sns_linac_factory.getLinacAccLattice(names,xml_file_name)
+#---- make lattice from XML file (or from its cached image)
+accLattice = getLinacAccLattice(names,xml_file_name,linac_factory = sns_linac_factory)
 
 #---- dictionary with the start and end positions of 1st level nodes
 node_position_dict = accLattice.getNodePositionsDict()
@@ -139,9 +144,12 @@ accLattice.trackDesignBunch(bunch)
 print ("Design tracking has been completed.")
 
 
-bunch = Bunch()
-bunch_in.copyBunchTo(bunch)
-accLattice.trackBunch(bunch)
+#---- the tracker keeps the bunch copies at the entrance of every 10th node,
+#---- after the changes the tracking is resumed from the last copy
+#---- upstream of the 1st changed RF cavity
+checkpoint_tracker = CheckpointTracker(accLattice)
+checkpoint_tracker.setCheckpointStep(10)
+bunch = checkpoint_tracker.trackBunch(bunch_in)
 
 print ("Tracking the bunch through the design lattice has been completed.")
 
@@ -174,7 +182,7 @@ bunch = Bunch()
 bunch_in.copyBunchTo(bunch)
 accLattice.trackDesignBunch(bunch)
 
-accLattice.trackBunch(bunch)
+bunch = checkpoint_tracker.trackAfterChange(rf_cavs)
 
 bpm_phases_delta_arr = []
 bpm_pos_arr = []
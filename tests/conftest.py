@@ -0,0 +1,58 @@
+#--------------------------------------------------------
+# The tests import uspas_fastlib from the repository
+# directory in the same way as the course scripts
+#--------------------------------------------------------
+
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def linac_lattice():
+	"""
+	Returns small linac lattice: drifts, two quads, two dipole correctors,
+	and two BPM markers. The tests using it are skipped without PyORBIT.
+	"""
+	lattice_module = pytest.importorskip("orbit.py_linac.lattice")
+	accLattice = lattice_module.LinacAccLattice("test_lattice")
+	nodes = []
+	nodes.append(lattice_module.Drift("DR01"))
+	nodes.append(lattice_module.Quad("QH01"))
+	nodes.append(lattice_module.DCorrectorH("DCH01"))
+	nodes.append(lattice_module.Drift("DR02"))
+	nodes.append(lattice_module.Quad("QV02"))
+	nodes.append(lattice_module.MarkerLinacNode("BPM01"))
+	nodes.append(lattice_module.Drift("DR03"))
+	nodes.append(lattice_module.DCorrectorV("DCV02"))
+	nodes.append(lattice_module.Drift("DR04"))
+	nodes.append(lattice_module.MarkerLinacNode("BPM02"))
+	for node in nodes:
+		if(isinstance(node,lattice_module.Drift)):
+			node.setLength(0.2)
+		accLattice.addNode(node)
+	for (quad,gradient) in zip(accLattice.getQuads(),(5.,-5.)):
+		quad.setLength(0.1)
+		quad.setParam("dB/dr",gradient)
+	accLattice.initialize()
+	return accLattice
+
+@pytest.fixture
+def linac_bunch():
+	"""
+	Returns 2.5 MeV H- bunch with 200 Gaussian macro-particles.
+	"""
+	bunch_module = pytest.importorskip("orbit.core.bunch")
+	bunch = bunch_module.Bunch()
+	bunch.mass(0.939294)
+	bunch.charge(-1.0)
+	bunch.macroSize(1.0e+6)
+	bunch.getSyncParticle().kinEnergy(0.0025)
+	rng = numpy.random.default_rng(7)
+	coords = rng.normal(size = (200,6))*numpy.array([1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-5])
+	for (x,xp,y,yp,z,dE) in coords.tolist():
+		bunch.addParticle(x,xp,y,yp,z,dE)
+	return bunch
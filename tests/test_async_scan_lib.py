@@ -0,0 +1,49 @@
+#--------------------------------------------------------
+# Tests for async_scan_lib with the pcaspy stand-in server
+# that posts a new "beam pulse" every 50 ms
+#--------------------------------------------------------
+
+import os
+import time
+import threading
+
+import numpy
+import pytest
+
+pytest.importorskip("pcaspy")
+
+os.environ.setdefault("EPICS_CA_ADDR_LIST","127.0.0.1")
+os.environ.setdefault("EPICS_CA_AUTO_ADDR_LIST","NO")
+os.environ.setdefault("EPICS_CAS_INTF_ADDR_LIST","127.0.0.1")
+
+pytest.importorskip("epics")
+
+from uspas_fastlib.pcaspy_stand_in_lib import makePV_Database
+from uspas_fastlib.pcaspy_stand_in_lib import StandInServer
+from uspas_fastlib.async_scan_lib import AsyncScanEngine, ScanAxis
+
+def test_scan_reads_new_pulses_and_restores_setpoints():
+	prefix = "SCAN%d:"%os.getpid()
+	server = StandInServer(makePV_Database(["Set","Readback","Pulse"],value = 1.),prefix)
+	stop_event = threading.Event()
+	def makePulses():
+		count = 0
+		while(not stop_event.is_set()):
+			count += 1
+			server.driver.setParam("Readback",2*server.driver.getParam("Set"))
+			server.driver.setParam("Pulse",count)
+			server.driver.updatePVs()
+			time.sleep(0.05)
+	with server:
+		pulse_thread = threading.Thread(target = makePulses)
+		pulse_thread.start()
+		try:
+			scan = AsyncScanEngine([ScanAxis(prefix + "Set",[2.,3.,4.])],[prefix + "Readback",],
+				settle_pv_names = [prefix + "Pulse",])
+			(set_values,read_values) = scan.runScan()
+		finally:
+			stop_event.set()
+			pulse_thread.join()
+		assert scan.getSettledFlags() == [True,True,True]
+		assert numpy.allclose(read_values[:,0],2*set_values[:,0])
+		assert server.getValue("Set") == pytest.approx(1.)
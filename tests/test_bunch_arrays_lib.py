@@ -0,0 +1,54 @@
+#--------------------------------------------------------
+# Tests for bunch_arrays_lib: round trip between the bunch
+# and NumPy arrays
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.core.bunch")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinate
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.bunch_arrays_lib import getBunchMoments
+
+def makeCoords(n_parts):
+	return numpy.random.default_rng(1).normal(size = (n_parts,6))
+
+def test_round_trip():
+	coords = makeCoords(1000)
+	bunch = Bunch()
+	setBunchCoordinates(bunch,coords)
+	assert bunch.getSize() == 1000
+	assert numpy.array_equal(getBunchCoordinates(bunch),coords)
+	#---- the same size: particles are updated in place
+	setBunchCoordinates(bunch,2*coords)
+	assert numpy.array_equal(getBunchCoordinates(bunch),2*coords)
+	(avg,corr) = getBunchMoments(bunch)
+	assert numpy.allclose(avg,2*coords.mean(axis = 0))
+	assert numpy.allclose(corr,numpy.cov(2*coords.T,bias = True))
+
+def test_first_particles():
+	coords = makeCoords(100)
+	bunch = Bunch()
+	setBunchCoordinates(bunch,coords)
+	assert numpy.array_equal(getBunchCoordinates(bunch,n_parts = 10),coords[:10])
+	assert numpy.array_equal(getBunchCoordinate(bunch,4,n_parts = 10),coords[:10,4])
+	#---- n_parts bigger than the bunch size gives all particles
+	assert numpy.array_equal(getBunchCoordinate(bunch,5,n_parts = 1000),coords[:,5])
+	#---- the array with the right shape is filled in place, others are replaced
+	arr = numpy.zeros((10,6))
+	assert getBunchCoordinates(bunch,arr,n_parts = 10) is arr
+	assert numpy.array_equal(arr,coords[:10])
+	arr_wrong = numpy.zeros((5,6))
+	assert getBunchCoordinates(bunch,arr_wrong,n_parts = 10) is not arr_wrong
+
+def test_empty_bunch():
+	bunch = Bunch()
+	assert getBunchCoordinates(bunch).shape == (0,6)
+	setBunchCoordinates(bunch,makeCoords(5))
+	setBunchCoordinates(bunch,numpy.zeros((0,6)))
+	assert bunch.getSize() == 0
@@ -0,0 +1,92 @@
+#--------------------------------------------------------
+# Tests for bunch_file_lib: the binary bunch file round
+# trip, the random subsamples, and the binary copy cache
+#--------------------------------------------------------
+
+import os
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.core.bunch")
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.bunch_file_lib import isBunchFile
+from uspas_fastlib.bunch_file_lib import writeBunchArrays
+from uspas_fastlib.bunch_file_lib import writeBunchFile
+from uspas_fastlib.bunch_file_lib import getRandomIndexes
+from uspas_fastlib.bunch_file_lib import makeBunchFromArrays
+from uspas_fastlib.bunch_file_lib import BunchFile
+from uspas_fastlib.bunch_file_lib import BUNCH_FILE_ALIGNMENT
+from uspas_fastlib.bunch_file_lib import readBunch
+
+HEADER = {"e_kin":0.0025,"time":1.0e-9,"mass":0.939294,"charge":-1.0,"macro_size":2.0e+5,"attr_double":{},"attr_int":{}}
+
+def test_arrays_round_trip(tmp_path):
+	file_name = str(tmp_path/"bunch.bin")
+	coords = numpy.random.default_rng(1).normal(size = (50,6))
+	writeBunchArrays(file_name,coords,HEADER)
+	assert isBunchFile(file_name)
+	bunch_file = BunchFile(file_name)
+	assert bunch_file.getSize() == 50
+	assert bunch_file.getHeader() == dict(HEADER,n_parts = 50)
+	assert isinstance(bunch_file.getCoordinates(),numpy.memmap)
+	assert bunch_file.getCoordinates().offset % BUNCH_FILE_ALIGNMENT == 0
+	assert numpy.array_equal(bunch_file.getCoordinates(),coords)
+	assert numpy.array_equal(bunch_file.getSubsample(10,random_seed = 3),coords[getRandomIndexes(50,10,3)])
+	#---- the empty bunch and not a bunch file
+	writeBunchArrays(file_name,numpy.zeros((0,6)),HEADER)
+	assert BunchFile(file_name).getCoordinates().shape == (0,6)
+	text_file_name = str(tmp_path/"bunch.txt")
+	fl_out = open(text_file_name,"w")
+	fl_out.write("% PyORBIT text bunch\n")
+	fl_out.close()
+	assert not isBunchFile(text_file_name)
+	with pytest.raises(ValueError):
+		BunchFile(text_file_name)
+
+def test_random_indexes():
+	indexes = getRandomIndexes(100,20,random_seed = 5)
+	assert len(indexes) == 20
+	assert len(set(indexes)) == 20
+	assert numpy.all(numpy.diff(indexes) > 0)
+	assert numpy.array_equal(indexes,getRandomIndexes(100,20,random_seed = 5))
+	assert not numpy.array_equal(indexes,getRandomIndexes(100,20,random_seed = 6))
+	assert numpy.array_equal(getRandomIndexes(10,20),numpy.arange(10))
+
+def test_bunch_round_trip_and_macro_size(tmp_path):
+	coords = numpy.random.default_rng(2).normal(size = (40,6))
+	bunch = makeBunchFromArrays(coords,HEADER)
+	bunch.bunchAttrDouble("beam_current",38.0)
+	file_name = str(tmp_path/"bunch.bin")
+	writeBunchFile(bunch,file_name)
+	bunch_in = BunchFile(file_name).makeBunch()
+	assert numpy.array_equal(getBunchCoordinates(bunch_in),coords)
+	sync_part = bunch_in.getSyncParticle()
+	assert (sync_part.kinEnergy(),sync_part.time()) == (HEADER["e_kin"],HEADER["time"])
+	assert (bunch_in.mass(),bunch_in.charge(),bunch_in.macroSize()) == (HEADER["mass"],HEADER["charge"],HEADER["macro_size"])
+	assert bunch_in.bunchAttrDouble("beam_current") == 38.0
+	#---- the subsample keeps the total charge
+	bunch_sub = BunchFile(file_name).makeBunch(n_parts = 10,random_seed = 1)
+	assert bunch_sub.getSize() == 10
+	assert bunch_sub.macroSize() == pytest.approx(4*HEADER["macro_size"])
+	assert numpy.array_equal(getBunchCoordinates(bunch_sub),coords[getRandomIndexes(40,10,1)])
+
+def test_read_bunch_binary_copy_cache(tmp_path):
+	text_file_name = str(tmp_path/"bunch.txt")
+	bin_file_name = str(tmp_path/"cache"/"bunch.bin")
+	coords = numpy.random.default_rng(3).normal(size = (30,6))
+	makeBunchFromArrays(coords,HEADER).dumpBunch(text_file_name)
+	bunch = readBunch(text_file_name,bin_file_name = bin_file_name)
+	assert isBunchFile(bin_file_name)
+	assert numpy.allclose(getBunchCoordinates(bunch),coords)
+	#---- the binary copy is newer than the text file, so it is used
+	writeBunchArrays(bin_file_name,coords[:5],HEADER)
+	mtime = os.path.getmtime(text_file_name)
+	os.utime(bin_file_name,(mtime + 10.,mtime + 10.))
+	assert readBunch(text_file_name,bin_file_name = bin_file_name).getSize() == 5
+	#---- the text file is changed after the binary copy, the copy is written again
+	os.utime(text_file_name,(mtime + 20.,mtime + 20.))
+	bunch = readBunch(text_file_name,n_parts = 10,random_seed = 1,bin_file_name = bin_file_name)
+	assert bunch.getSize() == 10
+	assert BunchFile(bin_file_name).getSize() == 30
@@ -0,0 +1,45 @@
+#--------------------------------------------------------
+# Tests for bunch_reduction_lib
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.core.bunch")
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.bunch_arrays_lib import getBunchMoments
+from uspas_fastlib.bunch_reduction_lib import getFirstParticlesBunch
+from uspas_fastlib.bunch_reduction_lib import matchMoments
+from uspas_fastlib.bunch_reduction_lib import getMomentsMatchedBunch
+
+def test_first_particles_bunch(linac_bunch):
+	coords = getBunchCoordinates(linac_bunch)
+	bunch = getFirstParticlesBunch(linac_bunch,50)
+	assert numpy.array_equal(getBunchCoordinates(bunch),coords[:50])
+	assert bunch.macroSize() == pytest.approx(linac_bunch.macroSize()*linac_bunch.getSize()/50)
+	assert bunch.getSyncParticle().kinEnergy() == linac_bunch.getSyncParticle().kinEnergy()
+	#---- more particles than in the bunch
+	bunch = getFirstParticlesBunch(linac_bunch,10*linac_bunch.getSize(),keep_total_charge = False)
+	assert numpy.array_equal(getBunchCoordinates(bunch),coords)
+	assert bunch.macroSize() == linac_bunch.macroSize()
+
+def test_match_moments():
+	rng = numpy.random.default_rng(3)
+	mixing = numpy.eye(6) + 0.3*rng.standard_normal((6,6))
+	coords_ref = rng.standard_normal((5000,6)).dot(mixing.T)*1.0e-3 + 2.0e-4
+	avg = coords_ref.mean(axis = 0)
+	corr = numpy.cov(coords_ref,rowvar = False,bias = True)
+	coords = matchMoments(rng.standard_normal((100,6)),avg,corr)
+	assert coords.shape == (100,6)
+	assert numpy.allclose(coords.mean(axis = 0),avg)
+	assert numpy.allclose(numpy.cov(coords,rowvar = False,bias = True),corr,rtol = 1.0e-8,atol = 1.0e-20)
+
+def test_moments_matched_bunch(linac_bunch):
+	bunch = getMomentsMatchedBunch(linac_bunch,50,random_seed = 1)
+	assert bunch.getSize() == 50
+	assert bunch.macroSize() == pytest.approx(linac_bunch.macroSize()*linac_bunch.getSize()/50)
+	(avg_ref,corr_ref) = getBunchMoments(linac_bunch)
+	(avg,corr) = getBunchMoments(bunch)
+	assert numpy.allclose(avg,avg_ref,atol = 1.0e-12)
+	assert numpy.allclose(corr,corr_ref,rtol = 1.0e-8,atol = 1.0e-20)
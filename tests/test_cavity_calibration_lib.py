@@ -0,0 +1,56 @@
+#--------------------------------------------------------
+# Tests for cavity_calibration_lib: the VA to model names
+# mapping and the analysis of the synthetic phase scans
+#--------------------------------------------------------
+
+import json
+
+import numpy
+import pytest
+
+pytest.importorskip("epics")
+
+from uspas_fastlib.cos_fitting_lib import getCosineFitValues
+from uspas_fastlib.cavity_calibration_lib import getCavityLLRF_Names
+from uspas_fastlib.cavity_calibration_lib import getBPM_Names
+from uspas_fastlib.cavity_calibration_lib import getModelCavityName
+from uspas_fastlib.cavity_calibration_lib import CavityCalibrationPipeline
+
+def test_names_mapping(tmp_path):
+	assert getModelCavityName("MEBT_LLRF:FCM1") == "MEBT1"
+	assert getModelCavityName("DTL_LLRF:FCM3") == "DTL3"
+	assert getModelCavityName("CCL_LLRF:FCM2") == "CCL2"
+	assert getModelCavityName("SCL_LLRF:FCM01a") == "SCL:Cav01a"
+	offsets_dict = {"MEBT_Diag:BPM01":10.,"MEBT_LLRF:FCM1":20.,"SCL_LLRF:FCM01a":-30.,"SCL_Diag:BPM01":40.}
+	file_name = str(tmp_path/"va_offsets.json")
+	fl_out = open(file_name,"w")
+	json.dump(offsets_dict,fl_out)
+	fl_out.close()
+	assert getCavityLLRF_Names(file_name) == ["MEBT_LLRF:FCM1","SCL_LLRF:FCM01a"]
+	assert getBPM_Names(file_name) == ["MEBT_Diag:BPM01","SCL_Diag:BPM01"]
+
+def test_offset_and_amplitude_from_synthetic_scan():
+	bpm_names = ["SCL_Diag:BPM00","SCL_Diag:BPM01","SCL_Diag:BPM02","SCL_Diag:BPM03"]
+	phase_arr = numpy.linspace(-180.,170.,36)
+	pipeline = CavityCalibrationPipeline(None,["SCL_LLRF:FCM01a",],bpm_names,phase_arr,design_settings = {},n_bpms = 2)
+	#---- the model sees BPM01,BPM02,BPM03 after the cavity, BPM03 is not used
+	model_bpm_names = bpm_names[1:]
+	model_params = numpy.array([[20.,40.,-100.],[35.,-150.,60.],[50.,10.,170.]])
+	model_bpm_phases = getCosineFitValues(phase_arr,model_params).T
+	#---- VA(phase) = Model(phase - phase_offset), the VA swing is smaller
+	(phase_offset,amp_ratio,va_amp) = (25.,1.25,0.8)
+	va_params = model_params.copy()
+	va_params[:,0] /= amp_ratio
+	va_params[:,1] -= phase_offset
+	va_bpm_phases = numpy.zeros((len(phase_arr),len(bpm_names)))
+	va_bpm_phases[:,1:] = getCosineFitValues(phase_arr,va_params).T
+	model_result = (model_bpm_names,model_bpm_phases,numpy.ones(model_bpm_phases.shape))
+	result = pipeline.analyzeCavity("SCL_LLRF:FCM01a",va_amp,va_bpm_phases,model_result)
+	assert result.cav_name == "SCL:Cav01a"
+	assert result.bpm_names == ["SCL_Diag:BPM01","SCL_Diag:BPM02"]
+	assert result.phase_offset == pytest.approx(phase_offset)
+	assert result.amp_scale == pytest.approx(va_amp*amp_ratio)
+	#---- without common BPMs the results are NaN
+	result = pipeline.analyzeCavity("SCL_LLRF:FCM01a",va_amp,va_bpm_phases,(["SCL_Diag:BPM99",],model_bpm_phases[:,:1],None))
+	assert numpy.isnan(result.phase_offset)
+	assert numpy.isnan(result.amp_scale)
@@ -0,0 +1,90 @@
+#--------------------------------------------------------
+# Tests for checkpoint_tracking_lib: the resumed tracking
+# gives the same bunch as the full trackBunch
+#--------------------------------------------------------
+
+import os
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccActionsContainer
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.checkpoint_tracking_lib import CheckpointTracker
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def trackFull(accLattice, bunch_in):
+	bunch = Bunch()
+	bunch_in.copyBunchTo(bunch)
+	accLattice.trackBunch(bunch)
+	return bunch
+
+def makePathLengthContainer(path_length_dict):
+	"""
+	Returns actions container recording the path length at the nodes entrances.
+	"""
+	actionContainer = AccActionsContainer("Path Length Recorder")
+	def recordPathLength(paramsDict):
+		path_length_dict[paramsDict["node"].getName()] = paramsDict["path_length"]
+	actionContainer.addAction(recordPathLength,AccActionsContainer.ENTRANCE)
+	return actionContainer
+
+def test_resumed_tracking_equals_full_tracking(linac_lattice, linac_bunch):
+	tracker = CheckpointTracker(linac_lattice)
+	tracker.setCheckpointStep(2)
+	bunch = tracker.trackBunch(linac_bunch)
+	coords_full = getBunchCoordinates(trackFull(linac_lattice,linac_bunch))
+	assert abs(coords_full - getBunchCoordinates(linac_bunch)).max() > 1.0e-4
+	assert numpy.array_equal(getBunchCoordinates(bunch),coords_full)
+	assert len(tracker.snapshots) == (len(linac_lattice.getNodes()) + 1)//2
+	#---- change the 2nd quad, the tracking starts from the snapshot upstream of it
+	quad = linac_lattice.getQuads()[1]
+	quad.setParam("dB/dr",-7.)
+	bunch = tracker.trackAfterChange([quad,])
+	coords_full = getBunchCoordinates(trackFull(linac_lattice,linac_bunch))
+	assert numpy.array_equal(getBunchCoordinates(bunch),coords_full)
+	assert bunch.getSyncParticle().time() == trackFull(linac_lattice,linac_bunch).getSyncParticle().time()
+
+def test_resumed_path_length(linac_lattice, linac_bunch):
+	tracker = CheckpointTracker(linac_lattice)
+	tracker.setCheckpointStep(2)
+	path_length_full = {}
+	tracker.trackBunch(linac_bunch,actionContainer = makePathLengthContainer(path_length_full))
+	#---- the resumed tracking starts from the snapshot at the 2nd quad entrance
+	quad = linac_lattice.getQuads()[1]
+	path_length_resumed = {}
+	tracker.trackAfterChange([quad,],actionContainer = makePathLengthContainer(path_length_resumed))
+	assert "DR01" not in path_length_resumed
+	assert path_length_resumed["QV02"] == pytest.approx(linac_lattice.getNodePositionsDict()[quad][0])
+	for name in path_length_resumed.keys():
+		assert path_length_resumed[name] == pytest.approx(path_length_full[name])
+
+def test_rf_cavity_change():
+	linac_parsers = pytest.importorskip("orbit.py_linac.linac_parsers")
+	accLattice = linac_parsers.SNS_LinacLatticeFactory().getLinacAccLattice(["MEBT",],XML_FILE_NAME)
+	bunch_in = Bunch()
+	bunch_in.mass(0.939294)
+	bunch_in.charge(-1.0)
+	bunch_in.getSyncParticle().kinEnergy(0.0025)
+	rng = numpy.random.default_rng(3)
+	for (x,xp,y,yp,z,dE) in rng.normal(size = (100,6))*numpy.array([1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-5]):
+		bunch_in.addParticle(x,xp,y,yp,z,dE)
+	design_bunch = Bunch()
+	bunch_in.copyEmptyBunchTo(design_bunch)
+	accLattice.trackDesignBunch(design_bunch)
+	tracker = CheckpointTracker(accLattice)
+	tracker.setCheckpointStep(5)
+	tracker.trackBunch(bunch_in)
+	#---- the cavity is mapped to its 1st gap, the snapshots downstream of it are recorded again
+	rf_cav = accLattice.getRF_Cavities()[2]
+	gap_index = accLattice.getNodeIndex(rf_cav.getRF_GapNodes()[0])
+	rf_cav.setPhase(rf_cav.getPhase() + 0.2)
+	bunch = tracker.trackAfterChange([rf_cav,])
+	assert max(tracker.snapshots.keys()) > gap_index
+	coords_full = getBunchCoordinates(trackFull(accLattice,bunch_in))
+	assert numpy.array_equal(getBunchCoordinates(bunch),coords_full)
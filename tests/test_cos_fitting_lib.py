@@ -0,0 +1,43 @@
+#--------------------------------------------------------
+# Tests for cos_fitting_lib: the closed form fit of many
+# phase scan curves at once
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+from uspas_fastlib.cos_fitting_lib import fitCosineArrays
+from uspas_fastlib.cos_fitting_lib import fitCosineFuncLSQ
+from uspas_fastlib.cos_fitting_lib import getCosineFitErrors
+from uspas_fastlib.cos_fitting_lib import getCosineFitValues
+
+def test_exact_curves():
+	x_arr = numpy.linspace(-180.,170.,36)
+	params_in = numpy.array([[2.0,30.,0.5],[0.7,-120.,-3.0],[5.0,175.,10.]])
+	y_arr = getCosineFitValues(x_arr,params_in)
+	assert y_arr.shape == (3,36)
+	(params,covs) = fitCosineArrays(x_arr,y_arr)
+	assert numpy.allclose(params,params_in)
+	assert numpy.allclose(covs,0.,atol = 1.0e-12)
+
+def test_noisy_curve_with_nan_points():
+	rng = numpy.random.default_rng(11)
+	x_arr = numpy.linspace(-180.,170.,36)
+	y_arr = getCosineFitValues(x_arr,[3.0,-45.,1.0]) + 0.01*rng.standard_normal(36)
+	y_arr[[3,17]] = numpy.nan
+	((amp,phase_offset,avg_val),cov) = fitCosineFuncLSQ(x_arr,y_arr)
+	(amp_err,phase_err,avg_err) = getCosineFitErrors(cov)
+	assert amp == pytest.approx(3.0,abs = 5*amp_err)
+	assert phase_offset == pytest.approx(-45.,abs = 5*phase_err)
+	assert avg_val == pytest.approx(1.0,abs = 5*avg_err)
+	#---- errors from residuals with the noise sigma 0.01 and 34 points
+	assert avg_err == pytest.approx(0.01/numpy.sqrt(34),rel = 0.5)
+
+def test_degenerate_curves():
+	x_arr = numpy.array([[0.,90.,180.,270.,45.],[10.,20.,numpy.nan,numpy.nan,numpy.nan]])
+	y_arr = numpy.array([[1.,2.,3.,2.,1.5],[1.,2.,3.,4.,5.]])
+	(params,covs) = fitCosineArrays(x_arr,y_arr)
+	assert numpy.all(numpy.isfinite(params[0]))
+	assert numpy.all(numpy.isfinite(covs[0]))
+	#---- two valid points are not enough for the errors estimation
+	assert numpy.all(numpy.isnan(covs[1]))
@@ -0,0 +1,41 @@
+#--------------------------------------------------------
+# Tests for diagnostics_writer_lib: the records are written
+# by chunks and read back from the memory-mapped files
+#--------------------------------------------------------
+
+import numpy
+
+from uspas_fastlib.diagnostics_writer_lib import COLUMN_NAMES
+from uspas_fastlib.diagnostics_writer_lib import DiagnosticsWriter
+from uspas_fastlib.diagnostics_writer_lib import DiagnosticsData
+
+def makeValues(ind):
+	return [0.1*ind + val for val in range(len(COLUMN_NAMES) - 2)] + [1000 - ind]
+
+def test_write_and_read(tmp_path):
+	dir_name = str(tmp_path/"diagnostics")
+	writer = DiagnosticsWriter(dir_name,chunk_size = 4)
+	node_names = ["DR%02d"%(ind % 3) for ind in range(10)]
+	for ind, node_name in enumerate(node_names):
+		writer.addRecord(node_name,0.5*ind,makeValues(ind))
+	assert writer.getNumberOfRecords() == 10
+	#---- two full chunks are already in the files
+	data = DiagnosticsData(dir_name)
+	assert data.getNumberOfRecords() == 8
+	assert data.getNodeNames() == node_names[:8]
+	writer.close()
+	data = DiagnosticsData(dir_name,mmap_mode = None)
+	assert data.getNumberOfRecords() == 10
+	assert data.getNodeNames() == node_names
+	assert numpy.allclose(data.getColumn("position"),0.5*numpy.arange(10))
+	assert numpy.allclose(data.getColumn("betaX"),[makeValues(ind)[1] for ind in range(10)])
+	assert data.getColumn("Nparts").dtype == numpy.int64
+	assert list(data.getColumn("Nparts")) == [1000 - ind for ind in range(10)]
+	file_name = str(tmp_path/"twiss.dat")
+	data.writeText(file_name,index_start = 2)
+	lines = open(file_name).readlines()
+	assert len(lines) == 1 + 8
+	res_arr = lines[1].split()
+	assert res_arr[0] == node_names[2]
+	assert float(res_arr[1]) == 1.0
+	assert int(res_arr[-1]) == 998
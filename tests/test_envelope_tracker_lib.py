@@ -0,0 +1,75 @@
+#--------------------------------------------------------
+# Tests for envelope_tracker_lib: the transverse linear map
+# of one SCL cavity is compared with the PyORBIT transport
+# matrix from LinacTrMatricesContrioller
+#--------------------------------------------------------
+
+import os
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.py_linac.linac_parsers")
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccNode
+from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
+from orbit.py_linac.lattice import LinacTrMatricesContrioller
+
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.transfer_map_surrogate_lib import getNumpyMatrix
+from uspas_fastlib.envelope_tracker_lib import EnvelopeTracker
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def getEnvelopeMatrix(tracker, bunch, node_from, node_to):
+	"""
+	Returns 6x6 map between the exits of two nodes made from the tracked centroids.
+	"""
+	sync_part = bunch.getSyncParticle()
+	columns = []
+	for ind in range(6):
+		centroid_in = numpy.zeros(6)
+		centroid_in[ind] = 1.0e-6
+		tracker.track(numpy.zeros((6,6)),sync_part.kinEnergy(),sync_part.time(),bunch.mass(),bunch.charge(),centroid_in)
+		columns.append(tracker.getCentroids()/1.0e-6)
+	columns = numpy.array(columns)
+	node_names = tracker.getNodeNames()
+	matr_from = columns[:,node_names.index(node_from.getName()),:].T
+	matr_to = columns[:,node_names.index(node_to.getName()),:].T
+	return matr_to.dot(numpy.linalg.inv(matr_from))
+
+def test_scl_cavity_transverse_map():
+	accLattice = SNS_LinacLatticeFactory().getLinacAccLattice(["SCLMed",],XML_FILE_NAME)
+	bunch_in = Bunch()
+	bunch_in.mass(0.939294)
+	bunch_in.charge(-1.0)
+	bunch_in.getSyncParticle().kinEnergy(0.1856)
+	design_bunch = Bunch()
+	bunch_in.copyEmptyBunchTo(design_bunch)
+	accLattice.trackDesignBunch(design_bunch)
+	rf_cav = accLattice.getRF_Cavities()[0]
+	gaps = rf_cav.getRF_GapNodes()
+	nodes = accLattice.getNodes()
+	node_before = nodes[accLattice.getNodeIndex(gaps[0]) - 1]
+	index_stop = accLattice.getNodeIndex(gaps[-1])
+	#---- small bunch, so the gaps are linear
+	rng = numpy.random.default_rng(3)
+	sizes = numpy.array([1.0e-3,1.0e-4,1.0e-3,1.0e-4,1.0e-4,1.0e-5])
+	setBunchCoordinates(bunch_in,rng.normal(size = (2000,6))*sizes)
+	controller = LinacTrMatricesContrioller()
+	tr_nodes = controller.addTrMatrxGenNodes(accLattice,[node_before,],AccNode.EXIT)
+	tr_nodes += controller.addTrMatrxGenNodes(accLattice,[gaps[-1],],AccNode.EXIT)
+	for tr_node in tr_nodes:
+		tr_node.setTwissWeightUse(False,False,False)
+	bunch = Bunch()
+	bunch_in.copyBunchTo(bunch)
+	accLattice.trackBunch(bunch,index_stop = index_stop)
+	(matr_from,matr_to) = [getNumpyMatrix(tr_node.getTransportMatrix())[:6,:6] for tr_node in tr_nodes]
+	matr_orbit = matr_to.dot(numpy.linalg.inv(matr_from))
+	matr_env = getEnvelopeMatrix(EnvelopeTracker(accLattice),bunch_in,node_before,gaps[-1])
+	for (i,j) in ((0,0),(1,1),(2,2),(3,3)):
+		assert matr_env[i,j] == pytest.approx(matr_orbit[i,j],rel = 1.0e-2)
+	#---- the RF defocusing kicks x' and y'
+	for (i,j) in ((1,0),(3,2)):
+		assert matr_env[i,j] == pytest.approx(matr_orbit[i,j],rel = 3.0e-2)
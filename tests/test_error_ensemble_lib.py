@@ -0,0 +1,47 @@
+#--------------------------------------------------------
+# Tests for error_ensemble_lib: the error-seeded tracking
+# of the MEBT lattice from the repository XML file
+#--------------------------------------------------------
+
+import os
+import shutil
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.py_linac.linac_parsers")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.bunch_file_lib import writeBunchFile
+from uspas_fastlib.error_ensemble_lib import ErrorEnsembleModel
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def test_seed_tracking(tmp_path):
+	#---- the lattice cache is created near the copy of the XML file
+	xml_file_name = str(tmp_path/"sns_linac.xml")
+	shutil.copyfile(XML_FILE_NAME,xml_file_name)
+	bunch = Bunch()
+	bunch.mass(0.939294)
+	bunch.charge(-1.0)
+	bunch.macroSize(1.0e+5)
+	bunch.getSyncParticle().kinEnergy(0.0025)
+	rng = numpy.random.default_rng(5)
+	sizes = numpy.array([1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-5])
+	setBunchCoordinates(bunch,rng.normal(size = (500,6))*sizes)
+	bunch_file = str(tmp_path/"MEBT_in.dat")
+	writeBunchFile(bunch,bunch_file)
+	model = ErrorEnsembleModel(["MEBT",],xml_file_name,bunch_file,add_apertures = False)
+	n_bpms = len(model.getBPM_Names())
+	assert n_bpms > 0
+	(orbit,twiss,n_parts) = model.runSeed(1,{})
+	assert orbit.shape == (2*n_bpms,)
+	assert n_parts == 500
+	assert numpy.all(numpy.isfinite(twiss))
+	#---- the correctors errors move the orbit, the nominal settings are restored after the seed
+	(orbit_err,twiss_err,n_parts_err) = model.runSeed(1,{"corr_field":1.0e-3})
+	assert abs(orbit_err - orbit).max() > 0.1
+	(orbit_again,twiss_again,n_parts_again) = model.runSeed(2,{})
+	assert numpy.allclose(orbit_again,orbit)
@@ -0,0 +1,27 @@
+#--------------------------------------------------------
+# Tests for lattice_cache_lib: stale images cleanup
+#--------------------------------------------------------
+
+import os
+
+import pytest
+
+pytest.importorskip("orbit.utils.xml")
+
+from uspas_fastlib.lattice_cache_lib import getLatticeImageFileName
+from uspas_fastlib.lattice_cache_lib import removeStaleLatticeImages
+
+def test_stale_images_of_other_sequences_are_kept(tmp_path):
+	xml_file_name = str(tmp_path/"sns_linac.xml")
+	with open(xml_file_name,"w") as fl_out:
+		fl_out.write("<sns/>")
+	cache_dir = str(tmp_path/"cache")
+	os.makedirs(cache_dir)
+	image_file_name = getLatticeImageFileName(["MEBT",],xml_file_name,cache_dir)
+	names = ["sns_linac_MEBT_0123456789abcdef.pkl","sns_linac_MEBT_DTL1_0123456789abcdef.pkl",
+		"sns_linac_MEBT_notes.pkl",os.path.basename(image_file_name),os.path.basename(image_file_name) + ".tmp12"]
+	for name in names:
+		open(os.path.join(cache_dir,name),"w").close()
+	removeStaleLatticeImages(image_file_name)
+	#---- only the old image of the same sequences list is removed
+	assert sorted(os.listdir(cache_dir)) == sorted(names[1:])
@@ -0,0 +1,65 @@
+#--------------------------------------------------------
+# Tests for linear_tracker_lib: the centroids from the
+# affine maps are compared with the PyORBIT tracking
+#--------------------------------------------------------
+
+import os
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.linear_tracker_lib import LinearLatticeTracker
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def test_compare_with_track_bunch(linac_lattice, linac_bunch):
+	tracker = LinearLatticeTracker(linac_lattice)
+	assert tracker.getUnsupportedNodes() == []
+	corr_node = linac_lattice.getNodeForName("DCH01")
+	corr_node.setField(1.0e-3)
+	try:
+		tracker.update(linac_bunch)
+		coords_in = getBunchCoordinates(linac_bunch)
+		diff = tracker.compareWithTrackBunch(linac_bunch)
+		coords_out = tracker.track(coords_in,linac_bunch)
+	finally:
+		corr_node.setField(0.)
+	#---- the bunch is not changed, the comparison tracking is done with the copy
+	assert numpy.array_equal(getBunchCoordinates(linac_bunch),coords_in)
+	centroids = tracker.getCentroids()
+	assert abs(centroids[-1,0] - centroids[0,0]) > 1.0e-5
+	#---- the transverse centroids, the maps do not have the chromatic effects of quads
+	scale = abs(centroids[:,0:4]).max(axis = 0)
+	assert numpy.all(abs(diff[:,0:4]) <= 5.0e-2*scale)
+	assert numpy.allclose(coords_out.mean(axis = 0),centroids[-1])
+
+def test_rf_gaps_longitudinal_centroids():
+	linac_parsers = pytest.importorskip("orbit.py_linac.linac_parsers")
+	accLattice = linac_parsers.SNS_LinacLatticeFactory().getLinacAccLattice(["MEBT",],XML_FILE_NAME)
+	bunch = Bunch()
+	bunch.mass(0.939294)
+	bunch.charge(-1.0)
+	bunch.getSyncParticle().kinEnergy(0.0025)
+	design_bunch = Bunch()
+	bunch.copyEmptyBunchTo(design_bunch)
+	accLattice.trackDesignBunch(design_bunch)
+	#---- the centroid is shifted in all planes, so the bunchers change (z,dE) of the centroid
+	rng = numpy.random.default_rng(5)
+	sizes = numpy.array([1.0e-4,1.0e-4,1.0e-4,1.0e-4,1.0e-4,1.0e-6])
+	offsets = numpy.array([1.0e-3,0.,1.0e-3,0.,1.0e-3,1.0e-5])
+	setBunchCoordinates(bunch,rng.normal(size = (1000,6))*sizes + offsets)
+	tracker = LinearLatticeTracker(accLattice)
+	assert tracker.getUnsupportedNodes() == []
+	diff = tracker.compareWithTrackBunch(bunch)
+	centroids = tracker.getCentroids()
+	gap_indexes = [accLattice.getNodeIndex(rf_cav.getRF_GapNodes()[0]) for rf_cav in accLattice.getRF_Cavities()]
+	#---- the energy kick of the 1st buncher to the centroid
+	assert abs(centroids[gap_indexes[0],5] - centroids[gap_indexes[0] - 1,5]) > 1.0e-6
+	scale = abs(centroids).max(axis = 0)
+	assert numpy.all(abs(diff) <= 5.0e-2*scale)
@@ -0,0 +1,65 @@
+#--------------------------------------------------------
+# Tests for long_twiss_lsq_lib: the longitudinal Twiss
+# reconstruction from the synthetic BPM amplitudes
+#--------------------------------------------------------
+
+import math
+
+import numpy
+
+from uspas_fastlib.long_twiss_lsq_lib import getBetaGamma
+from uspas_fastlib.long_twiss_lsq_lib import getLongitudinalMatrices2x2
+from uspas_fastlib.long_twiss_lsq_lib import getRMS2_Z_FromBPM_Amps
+from uspas_fastlib.long_twiss_lsq_lib import getEnergies
+from uspas_fastlib.long_twiss_lsq_lib import bootstrapCorrelations
+from uspas_fastlib.long_twiss_lsq_lib import reconstructLongTwiss
+from uspas_fastlib.twiss_lsq_lib import getLSQ_Matrices
+
+C_LIGHT = 2.99792458e+8
+
+MASS = 0.939294
+EKIN_IN = 0.1856
+QE0TL = 0.008
+RF_FREQUENCY = 805.0e+6
+BPM_FREQUENCY = 402.5e+6
+L_DRIFT = 20.0
+#---- (<z^2>,<z*dE>,<dE^2>) in (m^2,m*GeV,GeV^2)
+CORR = numpy.array([1.0e-6,-2.0e-10,1.0e-13])
+
+def getScanData():
+	rf_phase_arr = numpy.linspace(-180.,170.,36)
+	eKin_arr = getEnergies(EKIN_IN,QE0TL,rf_phase_arr)
+	matrs = getLongitudinalMatrices2x2(QE0TL,RF_FREQUENCY,eKin_arr,rf_phase_arr,L_DRIFT,MASS)
+	rms2_arr = getLSQ_Matrices(matrs).dot(CORR)
+	return (rf_phase_arr,eKin_arr,rms2_arr)
+
+def test_bpm_amplitudes():
+	(beta,gamma) = getBetaGamma(EKIN_IN,MASS)
+	rms2_arr = numpy.array([1.0e-6,4.0e-6])
+	phase_rms = 2*math.pi*BPM_FREQUENCY*numpy.sqrt(rms2_arr)/(beta*C_LIGHT)
+	bpm_amp_arr = numpy.append(numpy.exp(-phase_rms**2/2),[0.,1.2])
+	res_arr = getRMS2_Z_FromBPM_Amps(bpm_amp_arr,EKIN_IN,BPM_FREQUENCY,MASS)
+	assert numpy.allclose(res_arr[:2],rms2_arr)
+	assert numpy.all(numpy.isnan(res_arr[2:]))
+
+def test_reconstruction():
+	(rf_phase_arr,eKin_arr,rms2_arr) = getScanData()
+	rms2_arr[5] = numpy.nan
+	res_dict = reconstructLongTwiss(QE0TL,RF_FREQUENCY,eKin_arr,rf_phase_arr,L_DRIFT,MASS,rms2_arr)
+	assert numpy.allclose(res_dict["corr"],CORR,rtol = 1.0e-6)
+	emitt = math.sqrt(CORR[0]*CORR[2] - CORR[1]**2)
+	assert numpy.allclose(res_dict["twiss"],[-CORR[1]/emitt,CORR[0]/emitt,emitt],rtol = 1.0e-6)
+	assert "corr_boot_std" not in res_dict
+
+def test_bootstrap_does_not_depend_on_workers():
+	(rf_phase_arr,eKin_arr,rms2_arr) = getScanData()
+	rms2_arr = rms2_arr*(1.0 + 0.02*numpy.random.default_rng(2).standard_normal(len(rms2_arr)))
+	lsq_matrix = getLSQ_Matrices(getLongitudinalMatrices2x2(QE0TL,RF_FREQUENCY,eKin_arr,rf_phase_arr,L_DRIFT,MASS))
+	(corr_samples,twiss_samples) = bootstrapCorrelations(lsq_matrix,rms2_arr,n_bootstrap = 101,random_seed = 4,n_workers = 1)
+	assert corr_samples.shape == (101,3)
+	assert twiss_samples.shape == (101,3)
+	(corr_samples_4,twiss_samples_4) = bootstrapCorrelations(lsq_matrix,rms2_arr,n_bootstrap = 101,random_seed = 4,n_workers = 4)
+	assert numpy.array_equal(corr_samples,corr_samples_4)
+	res_dict = reconstructLongTwiss(QE0TL,RF_FREQUENCY,eKin_arr,rf_phase_arr,L_DRIFT,MASS,rms2_arr,
+		n_bootstrap = 200,random_seed = 4)
+	assert numpy.all(res_dict["corr_boot_std"] > 0.)
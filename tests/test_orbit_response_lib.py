@@ -0,0 +1,51 @@
+#--------------------------------------------------------
+# Tests for orbit_response_lib: the response matrix with
+# the resumed tracking equals the full tracking differences
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.orbit_response_lib import getBPM_Nodes
+from uspas_fastlib.orbit_response_lib import getCorrectorNodes
+from uspas_fastlib.orbit_response_lib import OrbitResponseMatrix
+from uspas_fastlib.orbit_response_lib import BPM_OrbitRecorder
+
+def test_matrix_equals_full_tracking(linac_lattice, linac_bunch):
+	corr_nodes = getCorrectorNodes(linac_lattice)
+	bpm_nodes = getBPM_Nodes(linac_lattice)
+	assert len(corr_nodes) == 2 and len(bpm_nodes) == 2
+	response = OrbitResponseMatrix(linac_lattice,linac_bunch,corr_nodes,bpm_nodes)
+	matrix = response.getMatrix()
+	orbit_base = response.getOrbit()
+	matrix_full = numpy.zeros(matrix.shape)
+	for ind, corr_node in enumerate(corr_nodes):
+		field = corr_node.getField()
+		corr_node.setField(field + response.delta_field)
+		matrix_full[:,ind] = (response.getOrbit() - orbit_base)/response.delta_field
+		corr_node.setField(field)
+	#---- the horizontal corrector moves x at both BPMs, the vertical one only y at BPM02
+	assert abs(matrix_full[0:2,0]).min() > 1.0e-3
+	assert numpy.allclose(matrix,matrix_full,rtol = 1.0e-9,atol = 1.0e-12)
+	assert matrix[0,1] == 0. and matrix[1,1] == 0.
+
+def test_recorder_tracks_the_bunch(linac_lattice, linac_bunch):
+	bpm_nodes = getBPM_Nodes(linac_lattice)
+	recorder = BPM_OrbitRecorder(bpm_nodes)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	corr_node = linac_lattice.getNodeForName("DCH01")
+	corr_node.setField(1.0e-3)
+	linac_lattice.trackBunch(bunch,actionContainer = recorder)
+	corr_node.setField(0.)
+	coords = getBunchCoordinates(bunch)
+	assert abs(coords - getBunchCoordinates(linac_bunch)).max() > 1.0e-4
+	#---- the orbit at the 2nd BPM is the bunch centroid at the lattice exit
+	assert recorder.orbit[1] == pytest.approx(1000.*coords[:,0].mean())
+	assert recorder.orbit[3] == pytest.approx(1000.*coords[:,2].mean())
+	assert abs(recorder.orbit[1]) > 0.01
@@ -0,0 +1,58 @@
+#--------------------------------------------------------
+# Smoke test for pcaspy_stand_in_lib: the server is started
+# and PVs are written and read by pyepics over CA
+#--------------------------------------------------------
+
+import os
+import threading
+
+import numpy
+import pytest
+
+pytest.importorskip("pcaspy")
+
+#---- CA search only on the local host
+os.environ.setdefault("EPICS_CA_ADDR_LIST","127.0.0.1")
+os.environ.setdefault("EPICS_CA_AUTO_ADDR_LIST","NO")
+os.environ.setdefault("EPICS_CAS_INTF_ADDR_LIST","127.0.0.1")
+
+epics = pytest.importorskip("epics")
+
+from uspas_fastlib.epics_group_lib import PV_Group
+from uspas_fastlib.pcaspy_stand_in_lib import makePV_Database
+from uspas_fastlib.pcaspy_stand_in_lib import StandInServer
+
+def test_put_and_readback():
+	prefix = "TEST%d:"%os.getpid()
+	pvdb = makePV_Database(["Quad:B_Set","Quad:B"],value = 1.5)
+	def update_func(driver, reason, value):
+		if(reason == "Quad:B_Set"):
+			driver.setParam("Quad:B",2*value)
+	with StandInServer(pvdb,prefix,update_func) as server:
+		assert epics.caget(prefix + "Quad:B",timeout = 5.) == pytest.approx(1.5)
+		assert epics.caput(prefix + "Quad:B_Set",3.25,wait = True,timeout = 5.) == 1
+		assert server.getValue("Quad:B_Set") == pytest.approx(3.25)
+		assert epics.caget(prefix + "Quad:B",timeout = 5.,use_monitor = False) == pytest.approx(6.5)
+		server.setValue("Quad:B",-1.)
+		assert epics.caget(prefix + "Quad:B",timeout = 5.,use_monitor = False) == pytest.approx(-1.)
+
+def test_group_from_worker_thread():
+	prefix = "TEST%d:"%os.getpid()
+	pv_names = ["QH01:B_Set","QH02:B_Set"]
+	with StandInServer(makePV_Database(pv_names,value = 1.5),prefix) as server:
+		#---- the group is created in one thread and used in another (like asyncio executor)
+		results = []
+		def makeGroup():
+			results.append(PV_Group([prefix + pv_name for pv_name in pv_names]))
+		def useGroup():
+			results.append(results[0].get())
+			results[0].put([2.,3.],wait = True)
+			results.append(results[0].get())
+		for func in (makeGroup,useGroup):
+			thread = threading.Thread(target = func)
+			thread.start()
+			thread.join()
+		assert results[0].getNotConnectedNames() == []
+		assert numpy.allclose(results[1],[1.5,1.5])
+		assert numpy.allclose(results[2],[2.,3.])
+		assert server.getValue("QH02:B_Set") == pytest.approx(3.)
@@ -0,0 +1,62 @@
+#--------------------------------------------------------
+# Tests for phase_scan_pool_lib: the settings lists and
+# the order of the results from the pool of processes
+#--------------------------------------------------------
+
+import os
+import shutil
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.bunch_generators")
+pytest.importorskip("uspas_pylib")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.phase_scan_pool_lib import CavityScanModel
+from uspas_fastlib.phase_scan_pool_lib import ParallelPhaseScanRunner
+from uspas_fastlib.phase_scan_pool_lib import makePhaseScanSettings
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def test_phase_scan_settings():
+	settings = makePhaseScanSettings("SCL:Cav01a",[-10.,0.,10.],0.5,{"SCL:Cav01b":(20.,0.)})
+	assert settings == [{"SCL:Cav01a":(-10.,0.5),"SCL:Cav01b":(20.,0.)},
+		{"SCL:Cav01a":(0.,0.5),"SCL:Cav01b":(20.,0.)},
+		{"SCL:Cav01a":(10.,0.5),"SCL:Cav01b":(20.,0.)}]
+	#---- the settings are independent dictionaries
+	settings[0]["SCL:Cav01b"] = (0.,1.)
+	assert settings[1]["SCL:Cav01b"] == (20.,0.)
+	assert makePhaseScanSettings("SCL:Cav01a",[],1.0) == []
+
+def test_parallel_run_order(tmp_path):
+	xml_file_name = str(tmp_path/"sns_linac.xml")
+	shutil.copyfile(XML_FILE_NAME,xml_file_name)
+	bunch = Bunch()
+	bunch.mass(0.939294)
+	bunch.charge(-1.0)
+	bunch.macroSize(1.0e+5)
+	bunch.getSyncParticle().kinEnergy(0.0025)
+	rng = numpy.random.default_rng(9)
+	sizes = numpy.array([1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-5])
+	setBunchCoordinates(bunch,rng.normal(size = (200,6))*sizes)
+	bunch_file = str(tmp_path/"MEBT_in.dat")
+	bunch.dumpBunch(bunch_file)
+	model_params = {"names":["MEBT",],"xml_file_name":xml_file_name,"bunch_file":bunch_file}
+	model = CavityScanModel(**model_params)
+	n_bpms = len(model.getBPM_Names())
+	assert n_bpms > 0
+	settings = makePhaseScanSettings("MEBT1",[-90.,0.,90.,180.,-45.],1.0,{"MEBT2":(0.,0.)})
+	results = [model.runSetting(setting) for setting in settings]
+	with ParallelPhaseScanRunner(model_params,n_workers = 2) as runner:
+		(bpm_phases,bpm_amps) = runner.run(settings)
+		assert runner.getDesignSettings() == dict([(cav_name,model.getDesignSetting(cav_name)) for cav_name in model.getCavityNames()])
+		(empty_phases,empty_amps) = runner.run([])
+	assert bpm_phases.shape == (len(settings),n_bpms)
+	assert bpm_amps.shape == (len(settings),n_bpms)
+	#---- the results are in the order of the settings
+	assert numpy.allclose(bpm_phases,[res[0] for res in results])
+	assert numpy.allclose(bpm_amps,[res[1] for res in results])
+	assert empty_phases.shape == (0,0)
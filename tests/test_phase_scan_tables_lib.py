@@ -0,0 +1,99 @@
+#--------------------------------------------------------
+# Tests for phase_scan_tables_lib: the synchronous particle
+# recorder, the tables against the full lattice tracking,
+# and the fitting of the measured scans with the tables
+#--------------------------------------------------------
+
+import os
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.phase_scan_tables_lib import _SyncParticleRecorder
+from uspas_fastlib.phase_scan_tables_lib import CavityPhaseScanTable
+from uspas_fastlib.phase_scan_tables_lib import CavityPhaseScanTableGenerator
+from uspas_fastlib.phase_scan_tables_lib import fitPhaseScan
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def test_sync_particle_arrival_times(linac_lattice, linac_bunch):
+	bpm_nodes = [linac_lattice.getNodeForName("BPM01"),linac_lattice.getNodeForName("BPM02")]
+	recorder = _SyncParticleRecorder(bpm_nodes)
+	bunch = Bunch()
+	linac_bunch.copyEmptyBunchTo(bunch)
+	linac_lattice.trackDesignBunch(bunch,{},recorder)
+	sync_part = bunch.getSyncParticle()
+	node_pos_dict = linac_lattice.getNodePositionsDict()
+	for ind, bpm_node in enumerate(bpm_nodes):
+		time_expected = node_pos_dict[bpm_node][0]/(sync_part.beta()*2.99792458e+8)
+		assert recorder.times[ind] == pytest.approx(time_expected,rel = 1.0e-6)
+		assert recorder.e_kins[ind] == pytest.approx(sync_part.kinEnergy())
+
+def test_table_equals_full_tracking():
+	linac_parsers = pytest.importorskip("orbit.py_linac.linac_parsers")
+	accLattice = linac_parsers.SNS_LinacLatticeFactory().getLinacAccLattice(["MEBT",],XML_FILE_NAME)
+	bunch_in = Bunch()
+	bunch_in.mass(0.939294)
+	bunch_in.charge(-1.0)
+	bunch_in.getSyncParticle().kinEnergy(0.0025)
+	generator = CavityPhaseScanTableGenerator(accLattice,bunch_in)
+	rf_cavs = accLattice.getRF_Cavities()
+	design_times = [rf_cav.getDesignArrivalTime() for rf_cav in rf_cavs]
+	design_settings = [(rf_cav.getPhase(),rf_cav.getAmp()) for rf_cav in rf_cavs]
+	table = generator.makeTable("MEBT1",n_phases = 12,amp_rel_arr = [1.0,],e_kin_rel_arr = [1.0,])
+	#---- the scan does not change the design of the lattice
+	assert [rf_cav.getDesignArrivalTime() for rf_cav in rf_cavs] == design_times
+	assert [(rf_cav.getPhase(),rf_cav.getAmp()) for rf_cav in rf_cavs] == design_settings
+	assert table.bpm_names == ["MEBT_Diag:BPM04","MEBT_Diag:BPM05"]
+	#---- the full lattice tracking with MEBT2 switched off as in the table
+	rf_cav = accLattice.getRF_Cavity("MEBT1")
+	bpm_nodes = [accLattice.getNodeForName(bpm_name) for bpm_name in table.bpm_names]
+	recorder = _SyncParticleRecorder([rf_cav.getRF_GapNodes()[0],] + bpm_nodes)
+	for other_cav in rf_cavs[1:]:
+		other_cav.setAmp(0.)
+	for ip, phase in enumerate(table.phase_arr):
+		rf_cav.setPhase(numpy.radians(phase))
+		bunch = Bunch()
+		bunch_in.copyEmptyBunchTo(bunch)
+		accLattice.trackBunch(bunch,{},recorder)
+		bpm_phases = 360.*generator.bpm_frequency*(recorder.times[1:] - recorder.times[0])
+		assert numpy.allclose(table.bpm_phases[0,0,ip],bpm_phases,atol = 1.0e-6)
+		assert table.e_kin_out[0,0,ip] == pytest.approx(recorder.e_kins[1])
+	assert numpy.ptp(table.e_kin_out) > 1.0e-5
+
+def makeSyntheticTable():
+	"""
+	Returns the table where the BPM phases have the 1st harmonic proportional
+	to the amplitude and the 2nd harmonic proportional to the input energy.
+	"""
+	phase_arr = numpy.array([-180. + 360.*ind/72 for ind in range(72)])
+	amp_arr = numpy.array([0.8,0.9,1.0,1.1,1.2])
+	e_kin_arr = 0.0025*numpy.array([0.99,1.0,1.01])
+	lengths = numpy.array([1.0,2.5])
+	def getPhases(phase, amp, e_kin):
+		curve = 30.*amp*numpy.cos(numpy.radians(phase + 40.)) + 10.*(e_kin/0.0025)*numpy.cos(numpy.radians(2*phase + 10.))
+		return lengths*curve
+	bpm_phases = numpy.zeros((len(e_kin_arr),len(amp_arr),len(phase_arr),len(lengths)))
+	for ie, e_kin in enumerate(e_kin_arr):
+		for ia, amp in enumerate(amp_arr):
+			for ip, phase in enumerate(phase_arr):
+				bpm_phases[ie,ia,ip] = getPhases(phase,amp,e_kin)
+	e_kin_out = numpy.zeros(bpm_phases.shape[:3])
+	return CavityPhaseScanTable("MEBT1",["BPM04","BPM05"],phase_arr,amp_arr,e_kin_arr,bpm_phases,e_kin_out)
+
+def test_fit_phase_scan():
+	table = makeSyntheticTable()
+	(phase_offset,amp,e_kin) = (33.,1.07,0.0025*1.004)
+	phase_arr = numpy.linspace(-180.,165.,24)
+	#---- the measured BPM phases have unknown offsets and are wrapped
+	meas_bpm_phases = table.getBPM_Phases(phase_arr - phase_offset,amp,e_kin) + numpy.array([50.,-120.])
+	meas_bpm_phases = (meas_bpm_phases + 180.) % 360. - 180.
+	((phase_offset_fit,amp_fit,e_kin_fit),rms_residual) = fitPhaseScan(table,phase_arr,meas_bpm_phases)
+	assert phase_offset_fit == pytest.approx(phase_offset,abs = 0.05)
+	assert amp_fit == pytest.approx(amp,rel = 1.0e-3)
+	assert e_kin_fit == pytest.approx(e_kin,rel = 1.0e-3)
+	assert rms_residual < 1.0e-3
@@ -0,0 +1,34 @@
+#--------------------------------------------------------
+# Tests for quad_matrix_cache_lib: the cache key depends
+# on the input bunch
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.py_linac.lattice")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.quad_matrix_cache_lib import QuadScanMatrixTable
+
+def getKey(linac_lattice, bunch, gradient_arr):
+	table = QuadScanMatrixTable(linac_lattice,bunch,"QH01","BPM02")
+	return table.getSettingsKey(gradient_arr)
+
+def test_settings_key(linac_lattice, linac_bunch):
+	gradient_arr = numpy.linspace(1.,5.,5)
+	key = getKey(linac_lattice,linac_bunch,gradient_arr)
+	assert key == getKey(linac_lattice,linac_bunch,gradient_arr)
+	assert key != getKey(linac_lattice,linac_bunch,gradient_arr[:-1])
+	#---- the same number of particles and energy, but different sizes
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	setBunchCoordinates(bunch,1.1*getBunchCoordinates(linac_bunch))
+	assert key != getKey(linac_lattice,bunch,gradient_arr)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	bunch.macroSize(2*linac_bunch.macroSize())
+	assert key != getKey(linac_lattice,bunch,gradient_arr)
@@ -0,0 +1,48 @@
+#--------------------------------------------------------
+# Tests for sampling_actions_lib: the bunch is tracked at
+# all nodes, the sampled actions are called at the selected
+#--------------------------------------------------------
+
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccActionsContainer
+from orbit.py_linac.lattice import Quad
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.sampling_actions_lib import SamplingActionsContainer
+
+def trackCopy(accLattice, bunch_in, actionContainer = None):
+	bunch = Bunch()
+	bunch_in.copyBunchTo(bunch)
+	accLattice.trackBunch(bunch,actionContainer = actionContainer)
+	return bunch
+
+def test_particles_are_tracked_at_all_nodes(linac_lattice, linac_bunch):
+	actionContainer = SamplingActionsContainer(linac_lattice)
+	quads = actionContainer.addNodeClasses([Quad,])
+	node_names = []
+	def action(paramsDict):
+		node_names.append(paramsDict["node"].getName())
+	actionContainer.addSampledAction(action,AccActionsContainer.ENTRANCE)
+	bunch = trackCopy(linac_lattice,linac_bunch,actionContainer)
+	bunch_ref = trackCopy(linac_lattice,linac_bunch)
+	coords_in = getBunchCoordinates(linac_bunch)
+	coords = getBunchCoordinates(bunch)
+	assert abs(coords - coords_in).max() > 1.0e-4
+	assert abs(coords - getBunchCoordinates(bunch_ref)).max() == 0.
+	assert node_names == [quad.getName() for quad in quads]
+
+def test_position_grid(linac_lattice, linac_bunch):
+	actionContainer = SamplingActionsContainer(linac_lattice)
+	actionContainer.addPositionStep(0.25)
+	positions = []
+	node_pos_dict = linac_lattice.getNodePositionsDict()
+	def action(paramsDict):
+		positions.append(node_pos_dict[paramsDict["node"]][0])
+	actionContainer.addSampledAction(action,AccActionsContainer.ENTRANCE)
+	trackCopy(linac_lattice,linac_bunch,actionContainer)
+	assert len(positions) > 0
+	assert len(positions) == len(actionContainer.getSelectedNodes(AccActionsContainer.ENTRANCE))
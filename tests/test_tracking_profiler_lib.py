@@ -0,0 +1,44 @@
+#--------------------------------------------------------
+# Tests for tracking_profiler_lib: the profiled tracking
+# moves particles and the node times exclude other actions
+#--------------------------------------------------------
+
+import time
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccActionsContainer
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.tracking_profiler_lib import ProfilingActionsContainer
+
+def test_profiled_tracking(linac_lattice, linac_bunch):
+	actionContainer = AccActionsContainer("Slow Actions")
+	def slowAction(paramsDict):
+		time.sleep(0.01)
+	actionContainer.addAction(slowAction,AccActionsContainer.ENTRANCE)
+	profiler = ProfilingActionsContainer(actionContainer)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	linac_lattice.trackBunch(bunch,actionContainer = profiler)
+	bunch_ref = Bunch()
+	linac_bunch.copyBunchTo(bunch_ref)
+	linac_lattice.trackBunch(bunch_ref)
+	coords = getBunchCoordinates(bunch)
+	assert abs(coords - getBunchCoordinates(linac_bunch)).max() > 1.0e-4
+	assert numpy.array_equal(coords,getBunchCoordinates(bunch_ref))
+	node_profiles = profiler.getNodeProfiles(None)
+	assert [profile.name for profile in node_profiles] == [node.getName() for node in linac_lattice.getNodes()]
+	n_nodes = len(node_profiles)
+	assert profiler.getActionsTime() >= 0.01*n_nodes
+	#---- sleeping actions are not in the nodes time
+	assert profiler.getTrackingTime() < 0.005*n_nodes
+	assert sum([profile.self_time for profile in node_profiles]) == pytest.approx(profiler.getTrackingTime())
+	#---- no losses in the quad without apertures
+	quad_profile = profiler.node_profile_dict[linac_lattice.getQuads()[0]]
+	assert quad_profile.n_calls == 1 and quad_profile.self_time > 0.
+	assert quad_profile.n_parts_in == quad_profile.n_parts_out == bunch.getSize()
@@ -0,0 +1,98 @@
+#--------------------------------------------------------
+# Tests for transfer_map_surrogate_lib: the matrices from
+# LinacTrMatricesContrioller, the fields changes against
+# the bunch tracking, and the downstream-only invalidation
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.lattice")
+
+from orbit.core.bunch import Bunch
+from orbit.py_linac.lattice import LinacTrMatricesContrioller
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates
+from uspas_fastlib.transfer_map_surrogate_lib import _SyncParticleParamsRecorder
+from uspas_fastlib.transfer_map_surrogate_lib import TransferMapSurrogate
+from uspas_fastlib.transfer_map_surrogate_lib import getNumpyMatrix
+
+def test_recorder_keeps_tracking(linac_lattice, linac_bunch):
+	nodes = linac_lattice.getNodes()
+	recorder = _SyncParticleParamsRecorder(nodes)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	linac_lattice.trackBunch(bunch,actionContainer = recorder)
+	bunch_ref = Bunch()
+	linac_bunch.copyBunchTo(bunch_ref)
+	linac_lattice.trackBunch(bunch_ref)
+	coords = getBunchCoordinates(bunch)
+	assert abs(coords - getBunchCoordinates(linac_bunch)).max() > 1.0e-4
+	assert numpy.array_equal(coords,getBunchCoordinates(bunch_ref))
+	sync_part = bunch.getSyncParticle()
+	params = numpy.array([sync_part.momentum(),sync_part.beta(),sync_part.gamma()])
+	assert numpy.allclose(recorder.params,params[numpy.newaxis,:])
+
+def getCentroid(bunch):
+	return getBunchCoordinates(bunch).mean(axis = 0)
+
+def test_segment_matrix_equals_controller_matrix(linac_lattice, linac_bunch):
+	surrogate = TransferMapSurrogate(linac_lattice,linac_bunch)
+	#---- the matrices from the 2nd quad entrance to the next nodes entrances directly
+	nodes = linac_lattice.getNodes()
+	controller = LinacTrMatricesContrioller()
+	tr_nodes = controller.addTrMatrxGenNodesAtEntrance(linac_lattice,nodes[4:7])
+	for tr_node in tr_nodes:
+		tr_node.setTwissWeightUse(True,True,True)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	linac_lattice.trackBunch(bunch)
+	matrices = [getNumpyMatrix(tr_node.getTransportMatrix()) for tr_node in tr_nodes]
+	assert numpy.allclose(surrogate.segment_matrices[4],matrices[1],rtol = 1.0e-3,atol = 1.0e-5)
+	assert numpy.allclose(surrogate.getTransportMatrix(nodes[4],nodes[6]),matrices[2],rtol = 1.0e-3,atol = 1.0e-5)
+
+def test_field_changes_equal_tracking(linac_lattice, linac_bunch):
+	surrogate = TransferMapSurrogate(linac_lattice,linac_bunch)
+	centroid_in = getCentroid(linac_bunch)
+	centroids_init = surrogate.propagateCentroid(centroid_in)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	linac_lattice.trackBunch(bunch)
+	assert numpy.allclose(centroids_init[-1],getCentroid(bunch),atol = 1.0e-7)
+	#---- the fields are changed in the lattice too
+	dch = linac_lattice.getNodeForName("DCH01")
+	quad = linac_lattice.getQuads()[1]
+	surrogate.setCorrectorField(dch,0.01)
+	surrogate.setQuadField(quad,-6.)
+	assert dch.getField() == 0.01
+	assert quad.getParam("dB/dr") == -6.
+	centroids = surrogate.propagateCentroid(centroid_in)
+	bunch = Bunch()
+	linac_bunch.copyBunchTo(bunch)
+	linac_lattice.trackBunch(bunch)
+	diff_tracking = getCentroid(bunch) - centroids_init[-1]
+	assert abs(diff_tracking[:4]).max() > 1.0e-4
+	assert numpy.allclose(centroids[-1] - centroids_init[-1],diff_tracking,atol = 0.02*abs(diff_tracking).max())
+
+def test_invalidation_is_downstream_only(linac_lattice, linac_bunch):
+	surrogate = TransferMapSurrogate(linac_lattice,linac_bunch)
+	matrices_init = surrogate.getCumulativeMatrices().copy()
+	#---- the segment matrices calculated after the corrector change
+	indexes = []
+	get_segment_matrix = surrogate._getSegmentMatrix
+	def getSegmentMatrix(index):
+		indexes.append(index)
+		return get_segment_matrix(index)
+	surrogate._getSegmentMatrix = getSegmentMatrix
+	dcv = linac_lattice.getNodeForName("DCV02")
+	dcv_index = linac_lattice.getNodes().index(dcv)
+	surrogate.setCorrectorField(dcv,0.01)
+	matrices = surrogate.getCumulativeMatrices()
+	n_nodes = len(linac_lattice.getNodes())
+	assert indexes == list(range(dcv_index,n_nodes))
+	assert numpy.array_equal(matrices[:dcv_index + 1],matrices_init[:dcv_index + 1])
+	assert not numpy.allclose(matrices[dcv_index + 1:],matrices_init[dcv_index + 1:])
+	#---- no changes - no calculations
+	indexes[:] = []
+	surrogate.getCumulativeMatrices()
+	assert indexes == []
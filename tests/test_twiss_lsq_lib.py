@@ -0,0 +1,57 @@
+#--------------------------------------------------------
+# Tests for twiss_lsq_lib: the reconstruction of Twiss
+# parameters from the synthetic quad scan data
+#--------------------------------------------------------
+
+import numpy
+import pytest
+
+from uspas_fastlib.twiss_lsq_lib import getQuadMatrices2x2
+from uspas_fastlib.twiss_lsq_lib import getQuadDriftMatrices2x2
+from uspas_fastlib.twiss_lsq_lib import reconstructTwissXY
+
+MOMENTUM = 0.0686
+LENGTH_QUAD = 0.061
+TWISS_X = (-1.5,0.4,3.0)
+TWISS_Y = (2.0,0.6,2.5)
+
+def getSigmaMatrix(alpha, beta, emitt):
+	gamma = (1.0 + alpha**2)/beta
+	return emitt*numpy.array([[beta,-alpha],[-alpha,gamma]])
+
+def getRMS_Sizes(gradient_arr, length_drift, twiss):
+	matrs = getQuadDriftMatrices2x2(gradient_arr,MOMENTUM,LENGTH_QUAD,length_drift)
+	sigma = getSigmaMatrix(*twiss)
+	sigma_out = numpy.einsum("...ij,jk,...lk->...il",matrs,sigma,matrs)
+	return numpy.sqrt(sigma_out[...,0,0])
+
+def test_quad_drift_matrices():
+	gradient_arr = numpy.linspace(-10.,10.,5)
+	matrs = getQuadDriftMatrices2x2(gradient_arr,MOMENTUM,LENGTH_QUAD,0.25)
+	drift = numpy.array([[1.0,0.25],[0.,1.0]])
+	quads = getQuadMatrices2x2(gradient_arr,MOMENTUM,LENGTH_QUAD)
+	assert numpy.allclose(matrs,drift @ quads)
+	assert numpy.allclose(numpy.linalg.det(matrs),1.0)
+
+@pytest.mark.parametrize("relative_error",[None,0.05])
+def test_many_wire_scanners(relative_error):
+	gradient_arr = numpy.linspace(-12.,12.,9)
+	length_drift = numpy.array([0.2,0.3,0.5])[:,numpy.newaxis]
+	rms_x_arr = getRMS_Sizes(gradient_arr,length_drift,TWISS_X)
+	rms_y_arr = getRMS_Sizes(-gradient_arr,length_drift,TWISS_Y)
+	assert rms_x_arr.shape == (3,9)
+	(corr,corr_cov,twiss,twiss_cov) = reconstructTwissXY(gradient_arr,rms_x_arr,rms_y_arr,
+		MOMENTUM,LENGTH_QUAD,length_drift,relative_error = relative_error)
+	assert twiss.shape == (2,3,3)
+	assert twiss_cov.shape == (2,3,3,3)
+	assert numpy.allclose(twiss[0],TWISS_X)
+	assert numpy.allclose(twiss[1],TWISS_Y)
+	#---- each WS gives the same result as the separate reconstruction
+	for ws_ind in range(3):
+		(corr_ws,corr_cov_ws,twiss_ws,twiss_cov_ws) = reconstructTwissXY(gradient_arr,
+			rms_x_arr[ws_ind],rms_y_arr[ws_ind],MOMENTUM,LENGTH_QUAD,length_drift[ws_ind,0],
+			relative_error = relative_error)
+		assert numpy.allclose(corr[:,ws_ind],corr_ws)
+		assert numpy.allclose(twiss[:,ws_ind],twiss_ws)
+		if(relative_error != None):
+			assert numpy.allclose(twiss_cov[:,ws_ind],twiss_cov_ws)
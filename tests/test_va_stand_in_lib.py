@@ -0,0 +1,90 @@
+#--------------------------------------------------------
+# Smoke test for va_stand_in_lib: the MEBT stand-in server
+# is started, the quad setpoint is written over CA, and the
+# WS and BPM readbacks follow the envelope model
+#--------------------------------------------------------
+
+import os
+import shutil
+import time
+
+import numpy
+import pytest
+
+pytest.importorskip("orbit.py_linac.linac_parsers")
+pytest.importorskip("pcaspy")
+
+#---- CA search only on the local host
+os.environ.setdefault("EPICS_CA_ADDR_LIST","127.0.0.1")
+os.environ.setdefault("EPICS_CA_AUTO_ADDR_LIST","NO")
+os.environ.setdefault("EPICS_CAS_INTF_ADDR_LIST","127.0.0.1")
+
+epics = pytest.importorskip("epics")
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import setBunchCoordinates
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.va_stand_in_lib import FastLinacModel
+from uspas_fastlib.va_stand_in_lib import FastVirtualAccelerator
+
+XML_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"lattice","sns_linac.xml")
+
+def makeBunch():
+	bunch = Bunch()
+	bunch.mass(0.939294)
+	bunch.charge(-1.0)
+	bunch.macroSize(1.0e+5)
+	bunch.getSyncParticle().kinEnergy(0.0025)
+	rng = numpy.random.default_rng(3)
+	sizes = numpy.array([1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-3,1.0e-5])
+	setBunchCoordinates(bunch,rng.normal(size = (1000,6))*sizes)
+	return bunch
+
+def waitFor(condition, timeout = 10.):
+	time_end = time.time() + timeout
+	while(time.time() < time_end):
+		if(condition()):
+			return True
+		time.sleep(0.05)
+	return False
+
+def caget(pv_name):
+	return epics.caget(pv_name,timeout = 5.,use_monitor = False)
+
+def test_quad_put_and_readbacks(tmp_path):
+	xml_file_name = str(tmp_path/"sns_linac.xml")
+	shutil.copyfile(XML_FILE_NAME,xml_file_name)
+	accLattice = getLinacAccLattice(["MEBT",],xml_file_name)
+	model = FastLinacModel(accLattice,makeBunch(),space_charge = False)
+	prefix = "TESTVA%d:"%os.getpid()
+	quad_pv_name = prefix + "MEBT_Mag:PS_QH03:B_Set"
+	ws_name = prefix + "MEBT_Diag:WS04a"
+	bpm_name = prefix + "MEBT_Diag:BPM14"
+	ws_index = [ws.getName() for ws in model.ws_nodes].index("MEBT_Diag:WS04a")
+	bpm_index = [bpm.getName() for bpm in model.bpm_nodes].index("MEBT_Diag:BPM14")
+	quad = accLattice.getNodeForName("MEBT_Mag:QH03")
+	gradient_init = quad.getParam("dB/dr")
+	with FastVirtualAccelerator(model,refresh_rate = 20.,prefix = prefix,random_seed = 1) as va:
+		assert caget(quad_pv_name) == pytest.approx(abs(gradient_init))
+		#---- the wire is moved to one RMS size where the signal depends on the size
+		res_dict = model.calculate()
+		(ws_x,sigma_x) = (res_dict["ws_x"][ws_index],res_dict["ws_sigma_x"][ws_index])
+		pos_set = (ws_x + sigma_x)/va.ws_fork_coeff
+		assert epics.caput(ws_name + ":Speed_Set",1000.,wait = True,timeout = 5.) == 1
+		assert epics.caput(ws_name + ":Position_Set",pos_set,wait = True,timeout = 5.) == 1
+		assert waitFor(lambda: abs(caget(ws_name + ":Position") - pos_set) < 1.0e-6)
+		hor_init = caget(ws_name + ":Hor_Cont")
+		assert hor_init == pytest.approx(numpy.exp(-0.5),abs = 1.0e-3)
+		assert caget(bpm_name + ":phaseAvg") == pytest.approx(res_dict["bpm_phase"][bpm_index],abs = 1.0e-3)
+		#---- the new gradient changes the model and the WS signal
+		assert epics.caput(quad_pv_name,1.2*abs(gradient_init),wait = True,timeout = 5.) == 1
+		assert waitFor(lambda: quad.getParam("dB/dr") == pytest.approx(1.2*gradient_init))
+		n_cycles = va.getCyclesCount()
+		assert waitFor(lambda: va.getCyclesCount() > n_cycles + 2)
+		res_dict = model.calculate()
+		(ws_x,sigma_x) = (res_dict["ws_x"][ws_index],res_dict["ws_sigma_x"][ws_index])
+		hor = caget(ws_name + ":Hor_Cont")
+		assert hor == pytest.approx(numpy.exp(-(va.ws_fork_coeff*pos_set - ws_x)**2/(2*sigma_x**2)),abs = 1.0e-3)
+		assert abs(hor - hor_init) > 1.0e-2
+		assert caget(bpm_name + ":xAvg") == pytest.approx(res_dict["bpm_x"][bpm_index],abs = 1.0e-3)
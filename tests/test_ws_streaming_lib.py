@@ -0,0 +1,108 @@
+#--------------------------------------------------------
+# Tests for ws_streaming_lib: the moments accumulator and
+# the streaming scan with the pcaspy stand-in Wire Scanner
+#--------------------------------------------------------
+
+import os
+import time
+import threading
+
+import numpy
+import pytest
+
+pytest.importorskip("pcaspy")
+
+os.environ.setdefault("EPICS_CA_ADDR_LIST","127.0.0.1")
+os.environ.setdefault("EPICS_CA_AUTO_ADDR_LIST","NO")
+os.environ.setdefault("EPICS_CAS_INTF_ADDR_LIST","127.0.0.1")
+
+pytest.importorskip("epics")
+
+from uspas_fastlib.pcaspy_stand_in_lib import makePV_Database
+from uspas_fastlib.pcaspy_stand_in_lib import StandInServer
+from uspas_fastlib.ws_streaming_lib import WeightedMomentsAccumulator
+from uspas_fastlib.ws_streaming_lib import StreamingWireScanner
+from uspas_fastlib.ws_streaming_lib import scanWireScanners
+
+def test_accumulator_equals_two_pass_rms():
+	x_arr = numpy.linspace(-5.,5.,41)
+	y_arr = numpy.exp(-(x_arr - 0.7)**2/2.)
+	accumulator = WeightedMomentsAccumulator()
+	for (x,y) in zip(x_arr,y_arr):
+		accumulator.add(x,y)
+	avg = numpy.sum(x_arr*y_arr)/numpy.sum(y_arr)
+	assert accumulator.getMean() == pytest.approx(avg)
+	rms = numpy.sqrt(numpy.sum((x_arr - avg)**2*y_arr)/numpy.sum(y_arr))
+	assert accumulator.getSigma() == pytest.approx(rms)
+
+class WireScannerStandIn:
+	"""
+	The Wire Scanner PVs with the flat-top H and V profiles. The wire moves
+	by Speed_Set mm each pulse, so the scan positions are on the grid.
+	The pulse period is longer than 0.1 sec process cycle of the pcaspy
+	server thread, so the monitors of different pulses are not merged.
+	"""
+	def __init__(self, ws_name, center = 1.0, half_width = 2.0, pulse_period = 0.25):
+		self.ws_name = ws_name
+		self.center = center
+		self.half_width = half_width
+		self.pulse_period = pulse_period
+		pv_names = [ws_name + suffix for suffix in (":Position_Set",":Speed_Set",":Position",":Hor_Cont",":Ver_Cont")]
+		self.server = StandInServer(makePV_Database(pv_names,value = 0.))
+		self.stop_event = threading.Event()
+		self.thread = threading.Thread(target = self._makePulses)
+
+	def _makePulses(self):
+		driver = self.server.driver
+		while(not self.stop_event.is_set()):
+			pos = driver.getParam(self.ws_name + ":Position")
+			pos_set = driver.getParam(self.ws_name + ":Position_Set")
+			step = abs(driver.getParam(self.ws_name + ":Speed_Set"))
+			pos += max(min(pos_set - pos,step),-step)
+			signal = 0.
+			if(abs(pos - self.center) <= self.half_width + 1.0e-9):
+				signal = 1.
+			driver.setParam(self.ws_name + ":Position",pos)
+			driver.setParam(self.ws_name + ":Hor_Cont",signal)
+			driver.setParam(self.ws_name + ":Ver_Cont",2*signal)
+			driver.updatePVs()
+			time.sleep(self.pulse_period)
+
+	def __enter__(self):
+		self.server.start()
+		self.thread.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop_event.set()
+		self.thread.join()
+		self.server.stop()
+
+@pytest.mark.parametrize("pos_start,pos_end",[(-4.,4.),(4.,-4.)])
+def test_flat_top_scan_in_both_directions(pos_start, pos_end):
+	#---- the new PV names for each server, pyepics keeps the old channels
+	ws_name = "WS%d:WS%02d"%(os.getpid(),int(pos_start))
+	step = 1.0
+	with WireScannerStandIn(ws_name):
+		ws_scanner = StreamingWireScanner(ws_name)
+		ws_scanner.start(pos_start,pos_end,step)
+		assert ws_scanner.wait(timeout = 30.)
+		(hor_sigma,ver_sigma) = ws_scanner.getSigmas()
+		(hor_avg,ver_avg) = ws_scanner.getAverages()
+		count = ws_scanner.hor_accumulator.count
+	#---- all points on the flat top have the same signal, none of them is lost
+	x_arr = numpy.arange(-1.,3. + step/2,step)
+	assert count == len(x_arr)
+	rms = numpy.std(x_arr)*ws_scanner.coeff_fork
+	assert hor_sigma == pytest.approx(rms)
+	assert ver_sigma == pytest.approx(rms)
+	assert hor_avg == pytest.approx(1.)
+	assert ver_avg == pytest.approx(1.)
+
+def test_scan_timeout():
+	ws_name = "WS%d:WS_TIMEOUT"%os.getpid()
+	with WireScannerStandIn(ws_name):
+		#---- 8 pulses are needed to reach the end position
+		ws_scanner = StreamingWireScanner(ws_name)
+		assert ws_scanner.scan(-4.,4.,1.0,timeout = 0.5) == None
+		assert scanWireScanners([ws_name,],-4.,4.,1.0,timeout = 0.5) == {ws_name:None}
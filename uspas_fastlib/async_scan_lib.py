@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The asyncio scan engine for the (Virtual) Accelerator
+# scans: set - settle - read many PVs for each point
+#--------------------------------------------------------
+
+import math
+import asyncio
+import itertools
+
+import numpy
+
+from uspas_fastlib.epics_group_lib import PV_Group
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
+
+class ScanAxis:
+	"""
+	One dimension of the scan: setpoint PV name and the list of values.
+	"""
+	def __init__(self, pv_name, values):
+		self.pv_name = pv_name
+		self.values = list(values)
+
+class AsyncScanEngine:
+	"""
+	The scan over the grid of setpoints (the last axis changes fastest).
+	For each point the changed setpoints are written, the engine waits
+	for the new beam pulses from the settle PVs, and then all read PVs
+	are read in one batched CA operation.
+	The settle counters are marked after the server has completed the setpoints
+	puts, so by default the engine waits for 1 new pulse (n_updates = 1) like
+	StreamingWireScanner. Each point takes about one refresh period of the Virtual Accelerator.
+	The blocking CA puts are done in the executor threads, so the event loop
+	is not blocked.
+	The initial setpoints are restored at the end of the scan, after an error,
+	or if the scan task is cancelled (including Ctrl-C).
+	axes - list of ScanAxis
+	read_pv_names - list of PVs to read at each point (BPMs, WS, etc.)
+	settle_pv_names - PVs for BeamUpdateWaiter, by default read_pv_names
+	output_file_name - if given, each point is appended to this text file immediately
+	"""
+	def __init__(self, axes, read_pv_names, settle_pv_names = None,
+			n_updates = 1, settle_timeout = 5.0, output_file_name = None):
+		self.axes = axes
+		self.read_pv_names = list(read_pv_names)
+		if(settle_pv_names == None):
+			settle_pv_names = self.read_pv_names
+		self.settle_pv_names = list(settle_pv_names)
+		self.n_updates = n_updates
+		self.settle_timeout = settle_timeout
+		self.output_file_name = output_file_name
+		self.set_group = None
+		self.read_group = None
+		self.waiter = None
+		#---- results
+		self.set_values = numpy.zeros((0,len(self.axes)))
+		self.read_values = numpy.zeros((0,len(self.read_pv_names)))
+		self.settled_arr = []
+
+	def getScanPoints(self):
+		"""
+		Returns the list of setpoints tuples for all scan points.
+		"""
+		return list(itertools.product(*[axis.values for axis in self.axes]))
+
+	def _connect(self):
+		self.set_group = PV_Group([axis.pv_name for axis in self.axes])
+		self.read_group = PV_Group(self.read_pv_names)
+		self.waiter = BeamUpdateWaiter(self.settle_pv_names)
+
+	def _putSetpoints(self, point, ind_arr):
+		pvs = self.set_group.getPVs()
+		for ind in ind_arr:
+			pvs[ind].put(point[ind],wait = True)
+
+	def _restoreSetpoints(self, init_setpoints):
+		for pv, value in zip(self.set_group.getPVs(),init_setpoints):
+			if(not math.isnan(value)):
+				pv.put(value,wait = True)
+
+	async def _settle(self, loop):
+		return await loop.run_in_executor(None,self.waiter.wait,self.n_updates,self.settle_timeout)
+
+	async def run(self):
+		"""
+		The coroutine performing the scan. Returns (set_values,read_values)
+		NumPy arrays with shapes (n_points,n_axes) and (n_points,n_read_pvs).
+		"""
+		loop = asyncio.get_running_loop()
+		await loop.run_in_executor(None,self._connect)
+		init_setpoints = await loop.run_in_executor(None,self.set_group.get)
+		points = self.getScanPoints()
+		set_values = []
+		read_values = []
+		self.settled_arr = []
+		fl_out = None
+		if(self.output_file_name != None):
+			fl_out = open(self.output_file_name,"w")
+			fl_out.write("# " + " ".join([axis.pv_name for axis in self.axes] + self.read_pv_names) + "\n")
+			fl_out.flush()
+		try:
+			old_point = None
+			for point in points:
+				changed_ind_arr = [ind for ind in range(len(point)) if(old_point == None or old_point[ind] != point[ind])]
+				await loop.run_in_executor(None,self._putSetpoints,point,changed_ind_arr)
+				self.waiter.mark()
+				old_point = point
+				settled = await self._settle(loop)
+				values = await loop.run_in_executor(None,self.read_group.get)
+				set_values.append(point)
+				read_values.append(values)
+				self.settled_arr.append(settled)
+				if(fl_out != None):
+					fl_out.write(" ".join(["%14.7g"%val for val in (list(point) + list(values))]) + "\n")
+					fl_out.flush()
+		finally:
+			if(fl_out != None):
+				fl_out.close()
+			#---- restore initial setpoints
+			await loop.run_in_executor(None,self._restoreSetpoints,init_setpoints)
+			self.waiter.disconnect()
+			self.set_values = numpy.array(set_values).reshape((len(set_values),len(self.axes)))
+			self.read_values = numpy.array(read_values).reshape((len(read_values),len(self.read_pv_names)))
+		return (self.set_values,self.read_values)
+
+	def runScan(self):
+		"""
+		Runs the scan in the new event loop and returns (set_values,read_values).
+		"""
+		return asyncio.run(self.run())
+
+	def getSettledFlags(self):
+		"""
+		Returns the list of flags. False means the settle timeout for this point.
+		"""
+		return self.settled_arr
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The class to wait for the new beam pulse data from
+# the (Virtual) Accelerator instead of fixed sleep time
+#--------------------------------------------------------
+
+import time
+import threading
+
+import numpy
+
+from epics import pv as pv_channel
+
+class BeamUpdateWaiter:
+	"""
+	Subscribes (camonitor) to the readback PVs like BPM phases or WS signals
+	and counts their updates. Call mark() right before the setpoint change, and then
+	wait() returns as soon as the new beam pulses have arrived.
+	The default n_updates = 2 skips the pulse that could be calculated
+	before the setpoint was applied.
+	pv_names - list of readback PV names
+	"""
+	def __init__(self, pv_names, timeout = 2.0):
+		self.pv_names = list(pv_names)
+		self.condition = threading.Condition()
+		self.update_counts = numpy.zeros(len(self.pv_names),dtype = numpy.int64)
+		self.marked_counts = numpy.zeros(len(self.pv_names),dtype = numpy.int64)
+		self.values = numpy.full(len(self.pv_names),numpy.nan)
+		self.index_dict = {}
+		for ind, pv_name in enumerate(self.pv_names):
+			self.index_dict[pv_name.strip()] = ind
+		self.pvs = [pv_channel.PV(pv_name.strip(), callback = self._onUpdate, auto_monitor = True) for pv_name in self.pv_names]
+		time_end = time.time() + timeout
+		for pv in self.pvs:
+			pv.wait_for_connection(timeout = max(time_end - time.time(),0.001))
+		#---- the initial values from monitors should not be counted as new pulses
+		self.wait(n_updates = 1,timeout = max(time_end - time.time(),0.001),wait_all = True)
+
+	def _onUpdate(self, pvname = None, value = None, **kwargs):
+		ind = self.index_dict.get(pvname)
+		if(ind == None): return
+		with self.condition:
+			self.update_counts[ind] += 1
+			if(value is not None and numpy.isscalar(value)):
+				self.values[ind] = value
+			self.condition.notify_all()
+
+	def mark(self):
+		"""
+		Remembers the update counters. Call it right before the setpoint change,
+		otherwise the pulse arriving between the change and mark() is not counted.
+		"""
+		with self.condition:
+			self.marked_counts[:] = self.update_counts
+
+	def wait(self, n_updates = 2, timeout = 5.0, wait_all = False):
+		"""
+		Waits until one (or all if wait_all = True) of the PVs is updated
+		n_updates times after the last mark(). The Virtual Accelerator updates all
+		PVs in the same cycle, but the monitors for unchanged values are not posted,
+		so by default one PV is enough. Returns False if timeout happened.
+		"""
+		time_end = time.time() + timeout
+		with self.condition:
+			while(True):
+				new_counts = self.update_counts - self.marked_counts
+				if(wait_all):
+					done = bool(numpy.all(new_counts >= n_updates))
+				else:
+					done = bool(numpy.any(new_counts >= n_updates))
+				if(done): return True
+				time_left = time_end - time.time()
+				if(time_left <= 0.): return False
+				self.condition.wait(time_left)
+
+	def putAndWait(self, setpoint_pv, value, n_updates = 2, timeout = 5.0, wait_all = False):
+		"""
+		Puts the value into the setpoint PV and waits for the new beam pulses.
+		setpoint_pv - pyepics PV object or PV name
+		"""
+		if(isinstance(setpoint_pv,str)):
+			setpoint_pv = pv_channel.PV(setpoint_pv)
+		self.mark()
+		setpoint_pv.put(value)
+		return self.wait(n_updates,timeout,wait_all)
+
+	def getValues(self):
+		"""
+		Returns NumPy array with the last monitored values of PVs.
+		"""
+		with self.condition:
+			return numpy.array(self.values)
+
+	def getValue(self, pv_name):
+		"""
+		Returns the last monitored value of the PV.
+		"""
+		with self.condition:
+			return self.values[self.index_dict[pv_name.strip()]]
+
+	def disconnect(self):
+		"""
+		Removes monitors and disconnects PVs.
+		"""
+		for pv in self.pvs:
+			pv.clear_callbacks()
+			pv.disconnect()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The functions for the bulk exchange of the coordinates
+# between PyORBIT Bunch and NumPy arrays.
+# The PyORBIT Bunch does not give access to its C++ arrays
+# (no buffer protocol, no array getters), so there is still
+# one Python->C++ call per particle and coordinate. Here these
+# calls are driven by C-level iterators (map, fromiter, deque)
+# instead of the Python loop body, which removes only the loop
+# overhead. The text dump/read round trip (dumpBunch/readBunch)
+# is not faster because it formats and parses every number.
+#--------------------------------------------------------
+
+from collections import deque
+from itertools import starmap
+
+import numpy
+
+from orbit.core.bunch import Bunch
+from orbit.core.bunch import BunchTwissAnalysis
+
+#---- coordinates indexes in the (N,6) arrays
+X_IND, XP_IND, Y_IND, YP_IND, Z_IND, DE_IND = 0, 1, 2, 3, 4, 5
+COORD_NAMES = ("x","xp","y","yp","z","dE")
+
+def getBunchCoordinate(bunch, coord_index, n_parts = None):
+	"""
+	Returns 1D NumPy array with one coordinate (0...5 for x,xp,y,yp,z,dE)
+	of all (or first n_parts) particles in the bunch. The getter is called
+	for each particle, but by C-level iteration without Python loop body.
+	"""
+	if(n_parts == None or n_parts > bunch.getSize()):
+		n_parts = bunch.getSize()
+	getter = getattr(bunch,COORD_NAMES[coord_index])
+	return numpy.fromiter(map(getter,range(n_parts)),dtype = numpy.float64,count = n_parts)
+
+def getBunchCoordinates(bunch, coords = None, n_parts = None):
+	"""
+	Returns (N,6) NumPy array with (x,xp,y,yp,z,dE) of all (or first n_parts)
+	particles in the bunch. If coords array with the right shape is given,
+	it will be filled and returned.
+	"""
+	if(n_parts == None or n_parts > bunch.getSize()):
+		n_parts = bunch.getSize()
+	if(coords is None or coords.shape != (n_parts,6)):
+		coords = numpy.empty((n_parts,6),dtype = numpy.float64)
+	for coord_index in range(6):
+		coords[:,coord_index] = getBunchCoordinate(bunch,coord_index,n_parts)
+	return coords
+
+def setBunchCoordinates(bunch, coords):
+	"""
+	Puts (N,6) NumPy array coordinates into the bunch. If the number of
+	particles is different, the particles in the bunch are replaced.
+	"""
+	coords = numpy.asarray(coords,dtype = numpy.float64)
+	n_parts = coords.shape[0]
+	if(bunch.getSize() != n_parts):
+		bunch.deleteAllParticles()
+		deque(starmap(bunch.addParticle,coords.tolist()),maxlen = 0)
+		return bunch
+	for coord_index in range(6):
+		setter = getattr(bunch,COORD_NAMES[coord_index])
+		deque(map(setter,range(n_parts),coords[:,coord_index].tolist()),maxlen = 0)
+	return bunch
+
+def makeBunch(coords, bunch_template):
+	"""
+	Returns new bunch with the synchronous particle, mass, charge, and
+	macro-size of the template bunch and particles from (N,6) array.
+	"""
+	bunch = Bunch()
+	bunch_template.copyEmptyBunchTo(bunch)
+	bunch.macroSize(bunch_template.macroSize())
+	return setBunchCoordinates(bunch,coords)
+
+def getBunchMoments(bunch, twiss_analysis = None):
+	"""
+	Returns (avg,corr) NumPy arrays with 6 averages and 6x6 central
+	second moments of the bunch. The sums are calculated in C++ by
+	BunchTwissAnalysis without copying particles' coordinates.
+	"""
+	if(twiss_analysis == None):
+		twiss_analysis = BunchTwissAnalysis()
+	twiss_analysis.analyzeBunch(bunch)
+	avg = numpy.array([twiss_analysis.getAverage(ind) for ind in range(6)])
+	corr = numpy.empty((6,6))
+	for ind0 in range(6):
+		for ind1 in range(ind0,6):
+			corr[ind0,ind1] = twiss_analysis.getCorrelation(ind0,ind1)
+			corr[ind1,ind0] = corr[ind0,ind1]
+	return (avg,corr)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The binary bunch file format: JSON header with the bunch
+# parameters and the contiguous float64 (N,6) array of
+# particles coordinates which is read by numpy.memmap
+#--------------------------------------------------------
+
+import os
+import json
+
+import numpy
+
+from orbit.core.bunch import Bunch
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates, setBunchCoordinates
+
+#---- the file starts with BUNCH_FILE_MAGIC and uint32 length of the JSON header
+BUNCH_FILE_MAGIC = b"PYORBIT_BUNCH_V1"
+#---- the coordinates array starts at the multiple of this value
+BUNCH_FILE_ALIGNMENT = 64
+
+def isBunchFile(file_name):
+	"""
+	Returns True if the file is the binary bunch file.
+	"""
+	file_in = open(file_name,"rb")
+	magic = file_in.read(len(BUNCH_FILE_MAGIC))
+	file_in.close()
+	return (magic == BUNCH_FILE_MAGIC)
+
+def getBunchHeader(bunch):
+	"""
+	Returns the header dictionary with the synchronous particle energy and time,
+	mass, charge, macro-size, and bunch attributes.
+	"""
+	sync_part = bunch.getSyncParticle()
+	header = {}
+	header["e_kin"] = sync_part.kinEnergy()
+	header["time"] = sync_part.time()
+	header["mass"] = bunch.mass()
+	header["charge"] = bunch.charge()
+	header["macro_size"] = bunch.macroSize()
+	attr_double_dict = {}
+	for name in bunch.bunchAttrDoubleNames():
+		attr_double_dict[name] = bunch.bunchAttrDouble(name)
+	attr_int_dict = {}
+	for name in bunch.bunchAttrIntNames():
+		attr_int_dict[name] = bunch.bunchAttrInt(name)
+	header["attr_double"] = attr_double_dict
+	header["attr_int"] = attr_int_dict
+	return header
+
+def setBunchHeader(bunch, header):
+	"""
+	Sets the bunch parameters from the header dictionary.
+	"""
+	bunch.mass(header["mass"])
+	bunch.charge(header["charge"])
+	bunch.macroSize(header["macro_size"])
+	for name, value in header.get("attr_double",{}).items():
+		bunch.bunchAttrDouble(name,value)
+	for name, value in header.get("attr_int",{}).items():
+		bunch.bunchAttrInt(name,value)
+	sync_part = bunch.getSyncParticle()
+	sync_part.kinEnergy(header["e_kin"])
+	sync_part.time(header["time"])
+
+def writeBunchArrays(file_name, coords, header):
+	"""
+	Writes (N,6) coordinates array and the header dictionary to the binary bunch file.
+	"""
+	coords = numpy.ascontiguousarray(coords,dtype = "<f8")
+	header = dict(header)
+	header["n_parts"] = coords.shape[0]
+	header_bytes = json.dumps(header).encode("utf-8")
+	n_bytes = len(BUNCH_FILE_MAGIC) + 4 + len(header_bytes)
+	n_pad = (BUNCH_FILE_ALIGNMENT - n_bytes % BUNCH_FILE_ALIGNMENT) % BUNCH_FILE_ALIGNMENT
+	header_bytes += b" "*n_pad
+	file_out = open(file_name,"wb")
+	file_out.write(BUNCH_FILE_MAGIC)
+	file_out.write(numpy.array([len(header_bytes),],dtype = "<u4").tobytes())
+	file_out.write(header_bytes)
+	file_out.write(coords.tobytes())
+	file_out.close()
+
+def writeBunchFile(bunch, file_name):
+	"""
+	Writes the bunch to the binary bunch file. Only local particles are written,
+	so it is for one CPU.
+	"""
+	writeBunchArrays(file_name,getBunchCoordinates(bunch),getBunchHeader(bunch))
+
+def getRandomIndexes(n_total, n_parts, random_seed = None):
+	"""
+	Returns the sorted array of n_parts random indexes from range(n_total) without repetitions.
+	"""
+	if(n_parts >= n_total):
+		return numpy.arange(n_total)
+	rng = numpy.random.default_rng(random_seed)
+	return numpy.sort(rng.choice(n_total,size = n_parts,replace = False))
+
+def makeBunchFromArrays(coords, header, n_parts = None, random_seed = None, bunch = None):
+	"""
+	Returns the bunch with the header parameters and all particles from (N,6)
+	coords array or n_parts random particles. The macro-size is increased
+	for the subsample to keep the total charge of the bunch.
+	"""
+	if(bunch == None):
+		bunch = Bunch()
+	else:
+		bunch.deleteAllParticles()
+	setBunchHeader(bunch,header)
+	n_total = coords.shape[0]
+	if(n_parts != None and n_parts < n_total):
+		#---- sorted indexes read the memory-mapped file sequentially
+		coords = coords[getRandomIndexes(n_total,n_parts,random_seed)]
+		bunch.macroSize(header["macro_size"]*n_total/max(n_parts,1))
+	return setBunchCoordinates(bunch,numpy.asarray(coords))
+
+class BunchFile:
+	"""
+	The binary bunch file opened for reading. The coordinates are numpy.memmap
+	(N,6) array, so the opening does not depend on the number of particles.
+	"""
+	def __init__(self, file_name, mode = "r"):
+		self.file_name = file_name
+		file_in = open(file_name,"rb")
+		magic = file_in.read(len(BUNCH_FILE_MAGIC))
+		if(magic != BUNCH_FILE_MAGIC):
+			file_in.close()
+			raise ValueError("BunchFile: %s is not the binary bunch file."%file_name)
+		header_length = int(numpy.frombuffer(file_in.read(4),dtype = "<u4")[0])
+		self.header = json.loads(file_in.read(header_length).decode("utf-8"))
+		file_in.close()
+		offset = len(BUNCH_FILE_MAGIC) + 4 + header_length
+		n_parts = self.header["n_parts"]
+		if(n_parts == 0):
+			self.coords = numpy.zeros((0,6))
+		else:
+			self.coords = numpy.memmap(file_name,dtype = "<f8",mode = mode,offset = offset,shape = (n_parts,6))
+
+	def getHeader(self):
+		"""
+		Returns the header dictionary.
+		"""
+		return self.header
+
+	def getSize(self):
+		"""
+		Returns the number of particles.
+		"""
+		return self.header["n_parts"]
+
+	def getCoordinates(self):
+		"""
+		Returns memory-mapped (N,6) array of (x,xp,y,yp,z,dE).
+		"""
+		return self.coords
+
+	def getSubsample(self, n_parts, random_seed = None):
+		"""
+		Returns (n_parts,6) array of random particles coordinates.
+		"""
+		return numpy.asarray(self.coords[getRandomIndexes(self.getSize(),n_parts,random_seed)])
+
+	def makeBunch(self, n_parts = None, random_seed = None, bunch = None):
+		"""
+		Returns the bunch with all particles or n_parts random particles,
+		see makeBunchFromArrays(...).
+		"""
+		return makeBunchFromArrays(self.coords,self.header,n_parts,random_seed,bunch)
+
+def readBunch(file_name, n_parts = None, random_seed = None, bin_file_name = None):
+	"""
+	Returns the bunch from the binary bunch file or from the PyORBIT text file
+	(Bunch.dumpBunch(...) format). For the text file, if bin_file_name is given,
+	the binary copy is written once and is used next time while it is newer than
+	the text file.
+	n_parts - number of random particles, all particles if None
+	"""
+	if(isBunchFile(file_name)):
+		return BunchFile(file_name).makeBunch(n_parts,random_seed)
+	if(bin_file_name != None and os.path.isfile(bin_file_name)):
+		if(os.path.getmtime(bin_file_name) >= os.path.getmtime(file_name)):
+			return BunchFile(bin_file_name).makeBunch(n_parts,random_seed)
+	bunch = Bunch()
+	bunch.readBunch(file_name)
+	if(bin_file_name != None):
+		bin_dir_name = os.path.dirname(bin_file_name)
+		if(bin_dir_name != "" and not os.path.isdir(bin_dir_name)):
+			os.makedirs(bin_dir_name)
+		writeBunchFile(bunch,bin_file_name)
+	if(n_parts == None or n_parts >= bunch.getSize()):
+		return bunch
+	return makeBunchFromArrays(getBunchCoordinates(bunch),getBunchHeader(bunch),n_parts,random_seed)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The functions to make the reduced bunch (first N,
+# random, stratified, or rms moments preserving subsample)
+# from the big bunch in one NumPy pass
+#--------------------------------------------------------
+
+import numpy
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates, getBunchMoments, makeBunch
+from uspas_fastlib.bunch_file_lib import getRandomIndexes
+
+def _makeReducedBunch(bunch, coords, keep_total_charge):
+	bunch_out = makeBunch(coords,bunch)
+	if(keep_total_charge and coords.shape[0] > 0):
+		bunch_out.macroSize(bunch.macroSize()*bunch.getSize()/coords.shape[0])
+	return bunch_out
+
+def getFirstParticlesBunch(bunch, n_parts, keep_total_charge = True):
+	"""
+	Returns the new bunch with the first n_parts particles of the bunch.
+	Only these particles are copied.
+	keep_total_charge - if True the macro-size is increased by N/n_parts
+	"""
+	coords = getBunchCoordinates(bunch,n_parts = n_parts)
+	return _makeReducedBunch(bunch,coords,keep_total_charge)
+
+def getRandomParticlesBunch(bunch, n_parts, random_seed = None, keep_total_charge = True):
+	"""
+	Returns the new bunch with n_parts random particles of the bunch (without repetitions).
+	"""
+	coords = getBunchCoordinates(bunch)
+	coords = coords[getRandomIndexes(coords.shape[0],n_parts,random_seed)]
+	return _makeReducedBunch(bunch,coords,keep_total_charge)
+
+def getStratifiedIndexes(values, n_parts, random_seed = None):
+	"""
+	Returns the array of n_parts indexes: the values are sorted and divided
+	into n_parts strata with equal number of points, and one random point
+	is taken from each stratum. So the distribution of values is kept
+	better than with the simple random choice.
+	"""
+	n_total = len(values)
+	if(n_parts >= n_total):
+		return numpy.arange(n_total)
+	rng = numpy.random.default_rng(random_seed)
+	order = numpy.argsort(values,kind = "stable")
+	bounds = (numpy.arange(n_parts + 1)*n_total)//n_parts
+	indexes = bounds[:-1] + (rng.random(n_parts)*(bounds[1:] - bounds[:-1])).astype(numpy.int64)
+	return numpy.sort(order[indexes])
+
+def getStratifiedParticlesBunch(bunch, n_parts, coord_index = 4, random_seed = None, keep_total_charge = True):
+	"""
+	Returns the new bunch with n_parts particles stratified over the coordinate
+	with coord_index (0...5 for x,xp,y,yp,z,dE). By default it is z, so the
+	longitudinal profile (and BPM phases and amplitudes) are kept.
+	"""
+	coords = getBunchCoordinates(bunch)
+	coords = coords[getStratifiedIndexes(coords[:,coord_index],n_parts,random_seed)]
+	return _makeReducedBunch(bunch,coords,keep_total_charge)
+
+def matchMoments(coords, avg, corr):
+	"""
+	Returns the (n,6) array linearly transformed to have exactly the averages avg
+	and the 6x6 central second moments corr (normalized by n as in BunchTwissAnalysis).
+	"""
+	coords_avg = coords.mean(axis = 0)
+	coords_corr = numpy.cov(coords,rowvar = False,bias = True)
+	#---- x_new = avg + L*L_sub^-1*(x - avg_sub) with Cholesky factors of corr matrices
+	chol = numpy.linalg.cholesky(corr)
+	chol_sub = numpy.linalg.cholesky(coords_corr)
+	transform = chol.dot(numpy.linalg.inv(chol_sub))
+	return avg + (coords - coords_avg).dot(transform.T)
+
+def getMomentsMatchedBunch(bunch, n_parts, random_seed = None, keep_total_charge = True, twiss_analysis = None):
+	"""
+	Returns the new bunch with n_parts random particles transformed linearly to have
+	the same centroid and 6x6 rms moments (Twiss and emittances in all planes,
+	and correlations between planes) as the original bunch.
+	n_parts should be much bigger than 6.
+	"""
+	(avg,corr) = getBunchMoments(bunch,twiss_analysis)
+	coords = getBunchCoordinates(bunch)
+	coords = coords[getRandomIndexes(coords.shape[0],n_parts,random_seed)]
+	if(coords.shape[0] > 6):
+		coords = matchMoments(coords,avg,corr)
+	return _makeReducedBunch(bunch,coords,keep_total_charge)
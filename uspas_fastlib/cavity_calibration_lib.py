@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The pipeline for the phase and amplitude calibration
+# of all linac RF cavities with the Virtual Accelerator
+# phase scans and PyORBIT model phase scans
+#--------------------------------------------------------
+
+import math
+import time
+import json
+
+import numpy
+
+from uspas_fastlib.epics_group_lib import PV_Group
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
+from uspas_fastlib.cos_fitting_lib import fitCosineArrays
+
+def getCavityLLRF_Names(offsets_file_name):
+	"""
+	Returns the list of LLRF names like SCL_LLRF:FCM01a from the VA offsets
+	JSON file (like EnergyRestoration/va_offsets.json) in the file order.
+	"""
+	fl_in = open(offsets_file_name,"r")
+	offsets_dict = json.load(fl_in)
+	fl_in.close()
+	return [name for name in offsets_dict.keys() if(name.find("_LLRF:") >= 0)]
+
+def getBPM_Names(offsets_file_name):
+	"""
+	Returns the list of BPM names like SCL_Diag:BPM11 from the VA offsets JSON file.
+	"""
+	fl_in = open(offsets_file_name,"r")
+	offsets_dict = json.load(fl_in)
+	fl_in.close()
+	return [name for name in offsets_dict.keys() if(name.find(":BPM") >= 0)]
+
+def getModelCavityName(llrf_name):
+	"""
+	Returns the PyORBIT lattice cavity name for the LLRF name:
+	MEBT_LLRF:FCM1 -> MEBT1, DTL_LLRF:FCM3 -> DTL3, CCL_LLRF:FCM2 -> CCL2,
+	SCL_LLRF:FCM01a -> SCL:Cav01a
+	"""
+	(seq_name,fcm_name) = llrf_name.split("_LLRF:FCM")
+	if(seq_name == "SCL"):
+		return "SCL:Cav" + fcm_name
+	return seq_name + fcm_name
+
+def _wrapPhaseDeg(phase_arr, phase_target):
+	"""
+	Returns phases in the [phase_target-180,phase_target+180] range.
+	"""
+	return (numpy.asarray(phase_arr) - phase_target + 180.) % 360. - 180. + phase_target
+
+class CavityCalibrationResult:
+	"""
+	The calibration results for one cavity.
+	phase_offset - VA phase = model phase + phase_offset [deg]
+	amp_scale - VA amplitude setpoint that gives the design (model) amplitude
+	"""
+	def __init__(self, llrf_name, cav_name):
+		self.llrf_name = llrf_name
+		self.cav_name = cav_name
+		self.bpm_names = []
+		self.phase_offset = 0.
+		self.phase_offset_err = 0.
+		self.amp_scale = 0.
+		self.amp_scale_err = 0.
+		#---- scan data: cavity phases, VA and model BPM phases (n_phases,n_bpms)
+		self.phase_arr = numpy.zeros(0)
+		self.va_bpm_phases = numpy.zeros((0,0))
+		self.model_bpm_phases = numpy.zeros((0,0))
+		self.settled = True
+
+	def getText(self):
+		"""
+		Returns the line with results for the output file.
+		"""
+		st = "%-18s %-12s "%(self.llrf_name,self.cav_name)
+		st += " %+9.3f %8.3f  %10.6f %10.6f "%(self.phase_offset,self.phase_offset_err,self.amp_scale,self.amp_scale_err)
+		st += " " + " ".join(self.bpm_names)
+		return st
+
+class CavityCalibrationPipeline:
+	"""
+	Calibrates RF cavities one by one from upstream to downstream.
+	For each cavity the VA phase scan is performed with all downstream cavities
+	switched off. The BPM phase curves are fitted by cosine functions and compared
+	with the model curves. The cavity is then set to the design phase and amplitude
+	with the found offset and scale, and the pipeline goes to the next cavity.
+	All model phase scans are submitted to the ParallelPhaseScanRunner at the start,
+	so they are calculated by the pool of processes while the VA scans are running,
+	and usually the model curve is ready when the VA scan of the cavity ends.
+	runner - ParallelPhaseScanRunner with the model of the whole VA linac
+	llrf_names - list of cavities like SCL_LLRF:FCM01a ordered from upstream
+	bpm_names - list of all VA BPMs, they are read in one batched operation
+	phase_arr - cavity phases for the scan in deg
+	design_settings - {cav_name:(phase_deg,amp)} design settings of model cavities,
+	                  by default they are taken from the runner
+	va_amp_dict - {llrf_name:amp} VA amplitude setpoints for scans, by default
+	              the present setpoints
+	n_bpms - number of BPMs after the cavity used in the analysis
+	"""
+	def __init__(self, runner, llrf_names, bpm_names, phase_arr, design_settings = None,
+			va_amp_dict = None, n_bpms = 2, n_updates = 2, settle_timeout = 5.0):
+		self.runner = runner
+		self.llrf_names = list(llrf_names)
+		self.bpm_names = list(bpm_names)
+		self.phase_arr = numpy.array(phase_arr,dtype = numpy.float64)
+		if(design_settings == None):
+			design_settings = runner.getDesignSettings()
+		self.design_settings = design_settings
+		self.va_amp_dict = va_amp_dict
+		self.n_bpms = n_bpms
+		self.n_updates = n_updates
+		self.settle_timeout = settle_timeout
+		self.results = []
+
+	def _connect(self):
+		self.phase_group = PV_Group([llrf_name + ":CtlPhaseSet" for llrf_name in self.llrf_names])
+		self.amp_group = PV_Group([llrf_name + ":CtlAmpSet" for llrf_name in self.llrf_names])
+		self.bpm_group = PV_Group([bpm_name + ":phaseAvg" for bpm_name in self.bpm_names])
+		self.waiter = BeamUpdateWaiter(self.bpm_group.getNames())
+
+	def _submitModelScans(self):
+		futures = []
+		for llrf_name in self.llrf_names:
+			cav_name = getModelCavityName(llrf_name)
+			(phase_deg,amp) = self.design_settings[cav_name]
+			futures.append(self.runner.submitPhaseScan(cav_name,self.phase_arr,amp))
+		return futures
+
+	def scanCavityVA(self, cav_ind, amp):
+		"""
+		Performs the VA phase scan of the cavity. Returns (bpm_phases,settled) where
+		bpm_phases[n_phases,n_all_bpms] NumPy array.
+		"""
+		phase_pv = self.phase_group.getPVs()[cav_ind]
+		amp_pv = self.amp_group.getPVs()[cav_ind]
+		amp_pv.put(amp)
+		bpm_phases = numpy.zeros((len(self.phase_arr),len(self.bpm_names)))
+		settled = True
+		for ind, phase in enumerate(self.phase_arr):
+			settled = self.waiter.putAndWait(phase_pv,phase,self.n_updates,self.settle_timeout) and settled
+			bpm_phases[ind,:] = self.bpm_group.get()
+		return (bpm_phases,settled)
+
+	def analyzeCavity(self, llrf_name, va_amp, va_bpm_phases, model_result):
+		"""
+		Fits VA and model BPM phase curves for the first n_bpms BPMs after the cavity
+		and returns CavityCalibrationResult.
+		va_bpm_phases - (n_phases,n_all_bpms) array
+		model_result - (bpm_names,bpm_phases,bpm_amps) from the model phase scan
+		"""
+		result = CavityCalibrationResult(llrf_name,getModelCavityName(llrf_name))
+		(model_bpm_names,model_bpm_phases,model_bpm_amps) = model_result
+		bpm_ind_arr = []
+		model_ind_arr = []
+		for model_ind, bpm_name in enumerate(model_bpm_names):
+			if(bpm_name in self.bpm_names and len(bpm_ind_arr) < self.n_bpms):
+				bpm_ind_arr.append(self.bpm_names.index(bpm_name))
+				model_ind_arr.append(model_ind)
+		result.bpm_names = [self.bpm_names[ind] for ind in bpm_ind_arr]
+		result.phase_arr = self.phase_arr
+		result.va_bpm_phases = numpy.unwrap(va_bpm_phases[:,bpm_ind_arr],period = 360.,axis = 0)
+		result.model_bpm_phases = numpy.unwrap(model_bpm_phases[:,model_ind_arr],period = 360.,axis = 0)
+		if(len(bpm_ind_arr) == 0):
+			result.phase_offset = numpy.nan
+			result.amp_scale = numpy.nan
+			return result
+		#---- VA and model curves are fitted in one batch, shape (2*n_bpms,n_phases)
+		y_arr = numpy.concatenate((result.va_bpm_phases.T,result.model_bpm_phases.T),axis = 0)
+		(params,covs) = fitCosineArrays(self.phase_arr,y_arr)
+		n_bpms = len(bpm_ind_arr)
+		(va_params,model_params) = (params[:n_bpms],params[n_bpms:])
+		(va_covs,model_covs) = (covs[:n_bpms],covs[n_bpms:])
+		#---- VA(phase) = Model(phase - phase_offset)
+		offsets = model_params[:,1] - va_params[:,1]
+		offsets = _wrapPhaseDeg(offsets,offsets[0])
+		offset_vars = va_covs[:,1,1] + model_covs[:,1,1]
+		#---- the BPM phase swing is proportional to the cavity amplitude
+		amp_ratios = model_params[:,0]/va_params[:,0]
+		amp_ratio_vars = amp_ratios**2*(va_covs[:,0,0]/va_params[:,0]**2 + model_covs[:,0,0]/model_params[:,0]**2)
+		(result.phase_offset,result.phase_offset_err) = self._getWeightedMean(offsets,offset_vars)
+		result.phase_offset = float(_wrapPhaseDeg(result.phase_offset,0.))
+		(amp_ratio,amp_ratio_err) = self._getWeightedMean(amp_ratios,amp_ratio_vars)
+		result.amp_scale = va_amp*amp_ratio
+		result.amp_scale_err = va_amp*amp_ratio_err
+		return result
+
+	def _getWeightedMean(self, val_arr, var_arr):
+		"""
+		Returns (mean,error) weighted by 1/variance, or simple mean for bad variances.
+		"""
+		if(numpy.all(numpy.isfinite(var_arr)) and numpy.all(var_arr > 0.)):
+			weights = 1.0/var_arr
+			return (float(numpy.sum(weights*val_arr)/numpy.sum(weights)),float(math.sqrt(1.0/numpy.sum(weights))))
+		return (float(numpy.mean(val_arr)),numpy.nan)
+
+	def run(self, output_file_name = None, verbose = True):
+		"""
+		Calibrates all cavities and returns the list of CavityCalibrationResult.
+		Each cavity is left with design phase and amplitude according to the calibration.
+		"""
+		self._connect()
+		init_phases = self.phase_group.get()
+		init_amps = self.amp_group.get()
+		futures = self._submitModelScans()
+		#---- all cavities are switched off in one batched put
+		self.amp_group.put(0.,wait = True)
+		fl_out = None
+		if(output_file_name != None):
+			fl_out = open(output_file_name,"w")
+			fl_out.write("# llrf_name  cav_name  phase_offset  err  amp_scale  err  bpms\n")
+		self.results = []
+		try:
+			for cav_ind, llrf_name in enumerate(self.llrf_names):
+				time_start = time.time()
+				va_amp = init_amps[cav_ind]
+				if(self.va_amp_dict != None):
+					va_amp = self.va_amp_dict[llrf_name]
+				(va_bpm_phases,settled) = self.scanCavityVA(cav_ind,va_amp)
+				time_va = time.time() - time_start
+				model_result = futures[cav_ind].result()
+				result = self.analyzeCavity(llrf_name,va_amp,va_bpm_phases,model_result)
+				result.settled = settled
+				self.results.append(result)
+				#---- set the calibrated design setting before the next cavity
+				(phase_design,amp_design) = self.design_settings[result.cav_name]
+				phase_pv = self.phase_group.getPVs()[cav_ind]
+				amp_pv = self.amp_group.getPVs()[cav_ind]
+				if(math.isnan(result.phase_offset) or math.isnan(result.amp_scale)):
+					phase_pv.put(self.phase_arr[0],wait = True)
+					amp_pv.put(va_amp,wait = True)
+				else:
+					phase_pv.put(_wrapPhaseDeg(phase_design + result.phase_offset,0.),wait = True)
+					amp_pv.put(result.amp_scale,wait = True)
+				if(fl_out != None):
+					fl_out.write(result.getText() + "\n")
+					fl_out.flush()
+				if(verbose):
+					print ("%s VA scan time[sec]= %6.1f total[sec]= %6.1f"%(result.getText(),time_va,time.time() - time_start))
+		finally:
+			if(fl_out != None):
+				fl_out.close()
+			#---- not calibrated cavities are returned to the initial phases and amplitudes
+			for cav_ind in range(len(self.results),len(self.llrf_names)):
+				if(not math.isnan(init_phases[cav_ind])):
+					self.phase_group.getPVs()[cav_ind].put(init_phases[cav_ind])
+				if(not math.isnan(init_amps[cav_ind])):
+					self.amp_group.getPVs()[cav_ind].put(init_amps[cav_ind])
+			for future in futures:
+				future.cancel()
+			self.waiter.disconnect()
+		return self.results
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the bunch tracking with the bunch
+# snapshots (checkpoints) at the selected lattice nodes
+#--------------------------------------------------------
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccNode, AccActionsContainer
+from orbit.py_linac.lattice import RF_Cavity
+
+def getTopLevelIndexDict(accLattice):
+	"""
+	Returns the dictionary {node:index} where index is the index of the
+	1st level lattice node that is the node itself or its parent.
+	"""
+	index_dict = {}
+	def addNode(node,index):
+		index_dict[node] = index
+		for child in node.getChildNodes(AccNode.ENTRANCE):
+			addNode(child,index)
+		for part_index in range(node.getnParts()):
+			for child in node.getChildNodes(AccNode.BODY,part_index):
+				addNode(child,index)
+		for child in node.getChildNodes(AccNode.EXIT):
+			addNode(child,index)
+	for index, node in enumerate(accLattice.getNodes()):
+		addNode(node,index)
+	return index_dict
+
+class _CheckpointActionsContainer(AccActionsContainer):
+	"""
+	Actions container that makes the bunch snapshots at the entrances of
+	the checkpoint nodes, performs its own actions (the tracking action
+	added by LinacAccLattice.trackBunch), and then calls the user's actions container.
+	"""
+	def __init__(self, checkpoint_tracker, actionContainer = None):
+		AccActionsContainer.__init__(self,"Checkpoint Actions Container")
+		self.checkpoint_tracker = checkpoint_tracker
+		self.actionContainer = actionContainer
+
+	def performActions(self, paramsDict, place = AccActionsContainer.ENTRANCE):
+		if(place == AccActionsContainer.ENTRANCE):
+			self.checkpoint_tracker.makeSnapshot(paramsDict["node"],paramsDict["bunch"])
+		AccActionsContainer.performActions(self,paramsDict,place)
+		if(self.actionContainer != None):
+			self.actionContainer.performActions(paramsDict,place)
+
+class CheckpointTracker:
+	"""
+	Tracks the bunch through the linac lattice and keeps copies of the bunch
+	at the entrances of the checkpoint nodes (1st level nodes).
+	After changes in some elements (quads, correctors, RF cavities) the tracking
+	is resumed from the last snapshot upstream of the most upstream changed element.
+	The model nodes (BPM models etc.) upstream of the changed elements keep
+	their values from the previous tracking. An RF cavity is changed at the
+	position of its 1st RF gap.
+	If RF cavities are changed and trackDesignBunch(...) is needed, it is up to the user.
+	"""
+	def __init__(self, accLattice, checkpoint_nodes = None):
+		self.accLattice = accLattice
+		self.index_dict = getTopLevelIndexDict(accLattice)
+		self.bunch_in = None
+		#---- {index of 1st level node: bunch}
+		self.snapshots = {}
+		self.checkpoint_indexes = set()
+		if(checkpoint_nodes != None):
+			self.setCheckpointNodes(checkpoint_nodes)
+
+	def setCheckpointNodes(self, checkpoint_nodes):
+		"""
+		Sets the checkpoint nodes. For child nodes the snapshot will be at the
+		entrance of their 1st level parent node. Existing snapshots are removed.
+		"""
+		self.checkpoint_indexes = set([self.index_dict[node] for node in checkpoint_nodes])
+		self.snapshots = {}
+
+	def setCheckpointStep(self, index_step):
+		"""
+		Sets every index_step-th 1st level node as a checkpoint.
+		"""
+		nodes = self.accLattice.getNodes()
+		self.setCheckpointNodes([nodes[ind] for ind in range(0,len(nodes),index_step)])
+
+	def makeSnapshot(self, node, bunch):
+		"""
+		Keeps the copy of the bunch if the node is a 1st level checkpoint node.
+		"""
+		index = self.index_dict.get(node)
+		if(index == None or index not in self.checkpoint_indexes): return
+		if(self.accLattice.getNodes()[index] is not node): return
+		bunch_snapshot = self.snapshots.get(index)
+		if(bunch_snapshot == None):
+			bunch_snapshot = Bunch()
+			self.snapshots[index] = bunch_snapshot
+		bunch.copyBunchTo(bunch_snapshot)
+
+	def getSnapshot(self, node):
+		"""
+		Returns the bunch snapshot for the checkpoint node or None.
+		"""
+		return self.snapshots.get(self.index_dict[node])
+
+	def trackBunch(self, bunch_in, paramsDict = None, actionContainer = None):
+		"""
+		Tracks the copy of the bunch_in through the whole lattice recording the snapshots.
+		Returns the bunch at the lattice exit.
+		"""
+		self.bunch_in = Bunch()
+		bunch_in.copyBunchTo(self.bunch_in)
+		self.snapshots = {}
+		return self._trackFrom(-1,self.bunch_in,paramsDict,actionContainer)
+
+	def trackAfterChange(self, changed_nodes, paramsDict = None, actionContainer = None):
+		"""
+		Resumes tracking from the last snapshot upstream of the most upstream
+		node in the changed_nodes list. Returns the bunch at the lattice exit.
+		"""
+		if(self.bunch_in == None):
+			raise ValueError("CheckpointTracker: trackBunch(...) should be called first.")
+		change_index = min([self._getChangeIndex(node) for node in changed_nodes])
+		start_index = -1
+		for index in self.snapshots.keys():
+			if(index <= change_index and index > start_index):
+				start_index = index
+		#---- snapshots downstream of the start will be recorded again
+		for index in list(self.snapshots.keys()):
+			if(index > start_index):
+				del self.snapshots[index]
+		if(start_index < 0):
+			return self._trackFrom(-1,self.bunch_in,paramsDict,actionContainer)
+		return self._trackFrom(start_index,self.snapshots[start_index],paramsDict,actionContainer)
+
+	def _getChangeIndex(self, node):
+		if(isinstance(node,RF_Cavity)):
+			node = node.getRF_GapNodes()[0]
+		return self.index_dict[node]
+
+	def _trackFrom(self, start_index, bunch_start, paramsDict, actionContainer):
+		bunch = Bunch()
+		bunch_start.copyBunchTo(bunch)
+		if(paramsDict == None):
+			paramsDict = {}
+		#---- the path length is counted from the lattice entrance as in the full tracking
+		paramsDict["path_length"] = 0.
+		if(start_index > 0):
+			start_node = self.accLattice.getNodes()[start_index]
+			paramsDict["path_length"] = self.accLattice.getNodePositionsDict()[start_node][0]
+		checkpointContainer = _CheckpointActionsContainer(self,actionContainer)
+		self.accLattice.trackBunch(bunch,paramsDict = paramsDict,actionContainer = checkpointContainer,index_start = start_index)
+		return bunch
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The functions for the closed form (linear least squares)
+# fitting of y = amp*cos(x + phase_offset) + avg_val
+# for one or many phase scan curves at once
+#--------------------------------------------------------
+
+import math
+
+import numpy
+
+def fitCosineArrays(x_arr, y_arr, w_arr = None):
+	"""
+	Fits y = amp*cos(x + phase_offset) + avg_val, x and phase_offset in degrees,
+	for many curves at once. The function is linear in
+	(a,b,c) = (amp*cos(phase_offset), -amp*sin(phase_offset), avg_val),
+	so the fit is the solution of the 3x3 normal equations for each curve.
+	x_arr - 1D array of x (common for all curves) or 2D array (n_curves,n_points)
+	y_arr - 1D array (one curve) or 2D array (n_curves,n_points), NaN points are skipped
+	w_arr - optional weights with the shape of y_arr (1/sigma^2)
+	Returns (params,covs) NumPy arrays: params[n_curves,3] with columns
+	(amp,phase_offset,avg_val) and covs[n_curves,3,3] - covariance matrices
+	of these parameters scaled with the fit residuals (reduced chi^2).
+	Curves with less than 4 valid points have NaN covariance.
+	"""
+	y_arr = numpy.atleast_2d(numpy.asarray(y_arr,dtype = numpy.float64))
+	x_arr = numpy.broadcast_to(numpy.asarray(x_arr,dtype = numpy.float64),y_arr.shape)
+	if(w_arr is None):
+		w_arr = numpy.ones(y_arr.shape)
+	w_arr = numpy.broadcast_to(numpy.asarray(w_arr,dtype = numpy.float64),y_arr.shape)
+	mask = numpy.isfinite(x_arr) & numpy.isfinite(y_arr)
+	w_arr = numpy.where(mask,w_arr,0.)
+	y_arr = numpy.where(mask,y_arr,0.)
+	phase_arr = numpy.radians(numpy.where(mask,x_arr,0.))
+	#---- basis[n_curves,n_points,3] = (cos(x),sin(x),1)
+	basis = numpy.stack((numpy.cos(phase_arr),numpy.sin(phase_arr),numpy.ones(y_arr.shape)),axis = -1)
+	mtrx = numpy.einsum("mni,mn,mnj->mij",basis,w_arr,basis)
+	rhs = numpy.einsum("mni,mn,mn->mi",basis,w_arr,y_arr)
+	#---- pinv does not fail for degenerate curves
+	mtrx_inv = numpy.linalg.pinv(mtrx)
+	coeffs = numpy.einsum("mij,mj->mi",mtrx_inv,rhs)
+	residuals = y_arr - numpy.einsum("mni,mi->mn",basis,coeffs)
+	sum_diff2 = numpy.sum(w_arr*residuals**2,axis = 1)
+	dof = numpy.sum(mask,axis = 1) - 3
+	with numpy.errstate(divide = "ignore", invalid = "ignore"):
+		chi2 = numpy.where(dof > 0,sum_diff2/numpy.maximum(dof,1),numpy.nan)
+	cov_lin = mtrx_inv*chi2[:,numpy.newaxis,numpy.newaxis]
+	#---- transformation (a,b,c) -> (amp,phase_offset,avg_val)
+	(a,b,c) = (coeffs[:,0],coeffs[:,1],coeffs[:,2])
+	amp = numpy.hypot(a,b)
+	phase_offset = numpy.degrees(numpy.arctan2(-b,a))
+	params = numpy.stack((amp,phase_offset,c),axis = -1)
+	with numpy.errstate(divide = "ignore", invalid = "ignore"):
+		jac = numpy.zeros(mtrx.shape)
+		jac[:,0,0] = a/amp
+		jac[:,0,1] = b/amp
+		jac[:,1,0] = (180./math.pi)*b/amp**2
+		jac[:,1,1] = -(180./math.pi)*a/amp**2
+		jac[:,2,2] = 1.0
+	covs = numpy.einsum("mij,mjk,mlk->mil",jac,cov_lin,jac)
+	return (params,covs)
+
+def fitCosineFuncLSQ(x_arr, y_arr, w_arr = None):
+	"""
+	The closed form replacement of fitCosineFunc(x_arr,y_arr) for one curve.
+	Returns ((amp,phase_offset,avg_val),cov) where cov is 3x3 covariance matrix.
+	"""
+	(params,covs) = fitCosineArrays(x_arr,y_arr,w_arr)
+	(amp,phase_offset,avg_val) = params[0]
+	return ((float(amp),float(phase_offset),float(avg_val)),covs[0])
+
+def getCosineFitErrors(covs):
+	"""
+	Returns errors (sqrt of diagonal) of (amp,phase_offset,avg_val) for
+	one or many covariance matrices.
+	"""
+	return numpy.sqrt(numpy.diagonal(numpy.asarray(covs),axis1 = -2,axis2 = -1))
+
+def getCosineFitValues(x_arr, params):
+	"""
+	Returns the fitted values for x_arr and params[...,3] = (amp,phase_offset,avg_val).
+	The shape is (n_curves,n_points) for 2D params.
+	"""
+	params = numpy.asarray(params,dtype = numpy.float64)
+	x_arr = numpy.asarray(x_arr,dtype = numpy.float64)
+	amp = params[...,0,numpy.newaxis]
+	phase_offset = params[...,1,numpy.newaxis]
+	avg_val = params[...,2,numpy.newaxis]
+	return amp*numpy.cos(numpy.radians(x_arr + phase_offset)) + avg_val
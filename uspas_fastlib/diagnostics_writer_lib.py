@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The buffered columnar writer and the memory-mapped reader
+# of the along-lattice beam diagnostics (Twiss, sizes,
+# energy, number of particles)
+#--------------------------------------------------------
+
+import math
+import os
+
+import numpy
+
+#---- columns in the order of pyorbit_twiss_sizes_ekin.dat file
+COLUMN_NAMES = ["position",
+	"alphaX","betaX","emittX","normEmittX",
+	"alphaY","betaY","emittY","normEmittY",
+	"alphaZ","betaZ","emittZ","emittZphiMeV",
+	"sizeX","sizeY","sizeZ_deg",
+	"eKin","Nparts"]
+
+#---- the node names file in the diagnostics directory
+NODE_NAMES_FILE = "node_names.txt"
+
+#---- the .npy header size is fixed, so the header can be rewritten after appending
+NPY_HEADER_SIZE = 128
+
+def _getColumnDtype(column_name):
+	if(column_name == "Nparts"):
+		return numpy.dtype("<i8")
+	if(column_name == "node_index"):
+		return numpy.dtype("<i4")
+	return numpy.dtype("<f8")
+
+def _writeNpyHeader(file_out, dtype, n_rows):
+	"""
+	Writes the .npy format 1.0 header of NPY_HEADER_SIZE bytes for 1D array.
+	"""
+	header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }"%(dtype.str,n_rows)
+	header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+	file_out.seek(0)
+	file_out.write(b"\x93NUMPY\x01\x00")
+	file_out.write(numpy.array([len(header),],dtype = "<u2").tobytes())
+	file_out.write(header.encode("latin1"))
+
+def getBunchDiagnostics(bunch, twiss_analysis, z_to_phase_coeff):
+	"""
+	Returns the list of values for the COLUMN_NAMES columns except position
+	as in pyorbit_lattice_from_xml_example.py.
+	z_to_phase_coeff - deg/m coefficient for the longitudinal sizes
+	"""
+	gamma = bunch.getSyncParticle().gamma()
+	beta = bunch.getSyncParticle().beta()
+	twiss_analysis.analyzeBunch(bunch)
+	values = []
+	for plane in range(3):
+		(alpha,beta_twiss,emitt) = (twiss_analysis.getTwiss(plane)[0],twiss_analysis.getTwiss(plane)[1],twiss_analysis.getTwiss(plane)[3]*1.0e+6)
+		if(plane < 2):
+			values += [alpha,beta_twiss,emitt,emitt*gamma*beta]
+		else:
+			values += [alpha,beta_twiss,emitt,z_to_phase_coeff*emitt]
+	x_rms = math.sqrt(twiss_analysis.getTwiss(0)[1]*twiss_analysis.getTwiss(0)[3])*1000.
+	y_rms = math.sqrt(twiss_analysis.getTwiss(1)[1]*twiss_analysis.getTwiss(1)[3])*1000.
+	z_rms_deg = z_to_phase_coeff*math.sqrt(twiss_analysis.getTwiss(2)[1]*twiss_analysis.getTwiss(2)[3])
+	values += [x_rms,y_rms,z_rms_deg]
+	values += [bunch.getSyncParticle().kinEnergy()*1.0e+3,bunch.getSizeGlobal()]
+	return values
+
+class DiagnosticsWriter:
+	"""
+	Buffers the diagnostics records in NumPy arrays and appends them
+	by chunks of chunk_size records to the .npy files (one file per column)
+	in the dir_name directory. The .npy headers are updated after each chunk,
+	so the files can be read (and memory-mapped) by DiagnosticsData at any time.
+	The node names are stored once in node_names.txt, the records keep
+	the node_index column.
+	"""
+	def __init__(self, dir_name, chunk_size = 1000):
+		self.dir_name = dir_name
+		self.chunk_size = chunk_size
+		if(not os.path.isdir(self.dir_name)):
+			os.makedirs(self.dir_name)
+		self.column_names = ["node_index",] + COLUMN_NAMES
+		self.buffers = {}
+		self.files = {}
+		for column_name in self.column_names:
+			self.buffers[column_name] = numpy.zeros(chunk_size,dtype = _getColumnDtype(column_name))
+			file_out = open(os.path.join(self.dir_name,column_name + ".npy"),"wb")
+			_writeNpyHeader(file_out,_getColumnDtype(column_name),0)
+			self.files[column_name] = file_out
+		self.n_buffered = 0
+		self.n_written = 0
+		#---- {node_name:index}
+		self.node_index_dict = {}
+		self.node_names = []
+		self.n_names_written = 0
+		open(os.path.join(self.dir_name,NODE_NAMES_FILE),"w").close()
+
+	def addRecord(self, node_name, position, values):
+		"""
+		Adds the record. values - the list of values for COLUMN_NAMES after position.
+		"""
+		node_index = self.node_index_dict.get(node_name)
+		if(node_index == None):
+			node_index = len(self.node_names)
+			self.node_index_dict[node_name] = node_index
+			self.node_names.append(node_name)
+		ind = self.n_buffered
+		self.buffers["node_index"][ind] = node_index
+		self.buffers["position"][ind] = position
+		for column_name, value in zip(COLUMN_NAMES[1:],values):
+			self.buffers[column_name][ind] = value
+		self.n_buffered += 1
+		if(self.n_buffered == self.chunk_size):
+			self.flush()
+
+	def addBunchRecord(self, node_name, position, bunch, twiss_analysis, z_to_phase_coeff):
+		"""
+		Adds the record with the bunch parameters, see getBunchDiagnostics(...).
+		"""
+		self.addRecord(node_name,position,getBunchDiagnostics(bunch,twiss_analysis,z_to_phase_coeff))
+
+	def getNumberOfRecords(self):
+		"""
+		Returns the number of added records.
+		"""
+		return self.n_written + self.n_buffered
+
+	def flush(self):
+		"""
+		Appends the buffered records to the files and updates the files headers.
+		"""
+		if(self.n_names_written < len(self.node_names)):
+			file_out = open(os.path.join(self.dir_name,NODE_NAMES_FILE),"a")
+			for node_name in self.node_names[self.n_names_written:]:
+				file_out.write(node_name + "\n")
+			file_out.close()
+			self.n_names_written = len(self.node_names)
+		if(self.n_buffered == 0): return
+		n_rows = self.n_written + self.n_buffered
+		for column_name in self.column_names:
+			file_out = self.files[column_name]
+			file_out.seek(0,os.SEEK_END)
+			file_out.write(self.buffers[column_name][:self.n_buffered].tobytes())
+			_writeNpyHeader(file_out,self.buffers[column_name].dtype,n_rows)
+			file_out.flush()
+		self.n_written = n_rows
+		self.n_buffered = 0
+
+	def close(self):
+		"""
+		Writes the buffered records and closes the files.
+		"""
+		self.flush()
+		for column_name in self.column_names:
+			self.files[column_name].close()
+		self.files = {}
+
+class DiagnosticsData:
+	"""
+	The diagnostics written by DiagnosticsWriter. The columns are memory-mapped
+	(mmap_mode = "r") or loaded (mmap_mode = None) NumPy arrays.
+	"""
+	def __init__(self, dir_name, mmap_mode = "r"):
+		self.dir_name = dir_name
+		file_in = open(os.path.join(self.dir_name,NODE_NAMES_FILE),"r")
+		self.node_names = [line.rstrip("\n") for line in file_in]
+		file_in.close()
+		self.columns = {}
+		for column_name in ["node_index",] + COLUMN_NAMES:
+			self.columns[column_name] = numpy.load(os.path.join(self.dir_name,column_name + ".npy"),mmap_mode = mmap_mode)
+		#---- the files could be appended between the columns loading
+		n_rows = min([len(arr) for arr in self.columns.values()])
+		for column_name in self.columns.keys():
+			self.columns[column_name] = self.columns[column_name][:n_rows]
+
+	def getNumberOfRecords(self):
+		"""
+		Returns the number of records.
+		"""
+		return len(self.columns["position"])
+
+	def getColumn(self, column_name):
+		"""
+		Returns the column array, column_name is "node_index" or from COLUMN_NAMES.
+		"""
+		return self.columns[column_name]
+
+	def getNodeNames(self):
+		"""
+		Returns the list of node names for all records.
+		"""
+		return [self.node_names[ind] for ind in self.columns["node_index"]]
+
+	def writeText(self, file_name, index_start = 0, index_stop = None):
+		"""
+		Writes the records to the text file in the pyorbit_twiss_sizes_ekin.dat format.
+		"""
+		if(index_stop == None):
+			index_stop = self.getNumberOfRecords()
+		file_out = open(file_name,"w")
+		s = " Node   position "
+		s += "   alphaX betaX emittX  normEmittX"
+		s += "   alphaY betaY emittY  normEmittY"
+		s += "   alphaZ betaZ emittZ  emittZphiMeV"
+		s += "   sizeX sizeY sizeZ_deg"
+		s += "   eKin Nparts "
+		file_out.write(s + "\n")
+		for ind in range(index_start,index_stop):
+			vals = [self.columns[column_name][ind] for column_name in COLUMN_NAMES]
+			s = " %35s  %4.5f " % (self.node_names[self.columns["node_index"][ind]],vals[0])
+			s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % tuple(vals[1:5])
+			s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % tuple(vals[5:9])
+			s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % tuple(vals[9:13])
+			s += "   %5.3f  %5.3f  %5.3f " % tuple(vals[13:16])
+			s += "  %10.6f   %8d " % (vals[16],vals[17])
+			file_out.write(s + "\n")
+		file_out.close()
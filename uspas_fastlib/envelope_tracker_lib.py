@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the rms envelope (6x6 sigma matrix)
+# tracking through the linac lattice with RF gaps and
+# optional linear space charge
+#--------------------------------------------------------
+
+import math
+
+import numpy
+
+from orbit.lattice import AccNode
+
+from orbit.py_linac.lattice import Quad, Bend
+from orbit.py_linac.lattice import DCorrectorH, DCorrectorV
+from orbit.py_linac.lattice import MarkerLinacNode
+from orbit.py_linac.lattice import BaseRF_Gap
+
+from uspas_fastlib.linear_tracker_lib import getDriftMap6x6, getQuadMap6x6, getBendMap6x6
+from uspas_fastlib.linear_tracker_lib import getRF_GapMap6x6
+from uspas_fastlib.linear_tracker_lib import C_LIGHT_GEV
+from uspas_fastlib.bunch_arrays_lib import getBunchMoments
+
+#---- speed of light in m/sec
+C_LIGHT = 2.99792458e+8
+#---- 1/(4*pi*eps0) in m/F
+COULOMB_COEFF = 8.9875517923e+9
+
+def getEllipsoidFormFactor(p):
+	"""
+	Returns the longitudinal form factor f(p) of the uniformly charged ellipsoid,
+	p = rz/sqrt(rx*ry) in the rest frame. f(1) = 1/3.
+	"""
+	if(abs(p - 1.0) < 1.0e-6):
+		return 1.0/3.0
+	if(p < 1.0):
+		sq = math.sqrt(1.0 - p**2)
+		return p/(1.0 - p**2)*(math.acos(p)/sq - p)
+	sq = math.sqrt(p**2 - 1.0)
+	return p/(p**2 - 1.0)*(p - math.acosh(p)/sq)
+
+def getGapTTF(rf_gap, beta, frequency):
+	"""
+	Returns the transit time factor T for the RF gap from its TTF polynomials
+	T(kappa), kappa = 2*pi*f/(c*beta), with beta limited by the TTF beta range.
+	If the gap has no T polynomial, the E0TL/E0L ratio is returned.
+	"""
+	E0L = rf_gap.getParam("E0L")
+	(polyT,polyS,polyTp,polySp) = rf_gap.getTTF_Polynimials()
+	if(E0L == 0. or (polyT.order() == 0 and polyT.coefficient(0) == 0.)):
+		if(E0L == 0.):
+			return 1.0
+		return rf_gap.getParam("E0TL")/E0L
+	(beta_min,beta_max) = rf_gap.getBetaMinMax()
+	beta = min(max(beta,beta_min),beta_max)
+	kappa = 2*math.pi*frequency/(C_LIGHT*beta)
+	return polyT.value(kappa)
+
+class EnvelopeTracker:
+	"""
+	Tracks the 6x6 beam sigma matrix (x,xp,y,yp,z,dE) in (m,rad,m,rad,m,GeV)
+	through LinacAccLattice: drifts, quads, bends, and thin RF gaps.
+	The synchronous particle is tracked together with the envelope. The RF gaps
+	phases are defined as in PyORBIT: cavity phase + mode*pi + 2*pi*f*(t - t_design),
+	so the lattice should be design tracked (trackDesignBunch) before.
+	The gap energy gain is charge*amp*E0L*T(beta)*cos(phase) with T from TTF
+	polynomials (use_ttf = True) or E0TL*amp. The gap linear map has
+	longitudinal focusing, transverse defocusing, and adiabatic damping.
+	The linear space charge of the uniformly charged ellipsoid with the same
+	rms sizes (Trace3D model) is applied as kicks every sc_step meters if
+	peak_current > 0. The beam centroid is transported by the same linear maps,
+	and DCH/DCV correctors kick the centroid. Other thin elements are ignored.
+	The results are reported at the exits of 1st level nodes and at the body
+	children markers and correctors (like BPMs inside the drifts or DCH in quads).
+	peak_current - in mA
+	bunch_frequency - in Hz
+	"""
+	def __init__(self, accLattice, peak_current = 0., bunch_frequency = 402.5e+6, use_ttf = True, sc_step = 0.01):
+		self.accLattice = accLattice
+		self.peak_current = peak_current
+		self.bunch_frequency = bunch_frequency
+		self.use_ttf = use_ttf
+		self.sc_step = sc_step
+		#---- results at the lattice entrance and the exits of 1st level nodes
+		self.node_names = []
+		self.positions = numpy.zeros(0)
+		self.sigmas = numpy.zeros((0,6,6))
+		self.centroids = numpy.zeros((0,6))
+		self.e_kins = numpy.zeros(0)
+		self.times = numpy.zeros(0)
+		self.mass = 0.
+
+	def _getSyncParams(self, e_kin, mass):
+		gamma = 1.0 + e_kin/mass
+		beta = math.sqrt(1.0 - 1.0/gamma**2)
+		momentum = mass*beta*gamma
+		return (momentum,beta,gamma)
+
+	def _getSpaceChargeMap(self, sigma, length, beta, gamma, mass, charge):
+		"""
+		Returns the 6x6 space charge kick matrix for the length.
+		"""
+		matr = numpy.identity(6)
+		if(self.peak_current <= 0. or length <= 0.):
+			return matr
+		#---- uniform ellipsoid semi-axes in the lab frame
+		rx = math.sqrt(5.0*max(sigma[0,0],1.0e-30))
+		ry = math.sqrt(5.0*max(sigma[2,2],1.0e-30))
+		rz = math.sqrt(5.0*max(sigma[4,4],1.0e-30))
+		rz_rest = gamma*rz
+		form_factor = getEllipsoidFormFactor(rz_rest/math.sqrt(rx*ry))
+		#---- bunch charge in C times 1/(4*pi*eps0) times particle charge, in V*m
+		coeff = COULOMB_COEFF*abs(charge)*(self.peak_current*1.0e-3/self.bunch_frequency)
+		mass_eV = mass*1.0e+9
+		#---- x'' = q*E_rest/(gamma^2*beta^2*m*c^2)
+		kx = 3*coeff*(1.0 - form_factor)/(rx*(rx + ry)*rz_rest)/(mass_eV*beta**2*gamma**2)
+		ky = 3*coeff*(1.0 - form_factor)/(ry*(rx + ry)*rz_rest)/(mass_eV*beta**2*gamma**2)
+		#---- d(dE)/ds = q*E_z with z_rest = gamma*z, in GeV/m^2
+		kz = 3*coeff*form_factor*gamma/(rx*ry*rz_rest)*1.0e-9
+		matr[1,0] = kx*length
+		matr[3,2] = ky*length
+		matr[5,4] = kz*length
+		return matr
+
+	def _trackRF_Gap(self, rf_gap, e_kin, time, mass, charge):
+		"""
+		Returns (matr,e_kin) - the linear map of the thin RF gap and the energy after it.
+		"""
+		rf_cav = rf_gap.getRF_Cavity()
+		amp = rf_cav.getAmp()
+		frequency = rf_cav.getFrequency()
+		if(amp == 0.):
+			return (numpy.identity(6),e_kin)
+		(momentum_in,beta_in,gamma_in) = self._getSyncParams(e_kin,mass)
+		phase = rf_cav.getPhase() + rf_gap.getParam("mode")*math.pi
+		phase += 2*math.pi*frequency*(time - rf_cav.getDesignArrivalTime())
+		if(self.use_ttf):
+			E0TL = amp*rf_gap.getParam("E0L")*getGapTTF(rf_gap,beta_in,frequency)
+		else:
+			E0TL = amp*rf_gap.getParam("E0TL")
+		e_kin_out = e_kin + charge*E0TL*math.cos(phase)
+		return (getRF_GapMap6x6(E0TL,phase,frequency,e_kin,e_kin_out,mass,charge),e_kin_out)
+
+	def _getCorrectorKick(self, node, e_kin, mass, charge):
+		"""
+		Returns the 6D centroid kick vector of DCH or DCV corrector.
+		"""
+		(momentum,beta,gamma) = self._getSyncParams(e_kin,mass)
+		kick = charge*node.getParam("B")*node.getParam("effLength")*C_LIGHT_GEV/momentum
+		vector = numpy.zeros(6)
+		#---- DCH has vertical field, force is F = q*(v x B)
+		if(isinstance(node,DCorrectorH)):
+			vector[1] = -kick
+		else:
+			vector[3] = kick
+		return vector
+
+	def _getElementMap(self, node, length, e_kin, mass, charge, is_first = False, is_last = False):
+		(momentum,beta,gamma) = self._getSyncParams(e_kin,mass)
+		if(isinstance(node,Quad)):
+			return getQuadMap6x6(length,node.getParam("dB/dr"),momentum,beta,gamma,mass,charge)
+		if(isinstance(node,Bend)):
+			theta = node.getParam("theta")*length/node.getLength()
+			ea1 = 0.
+			ea2 = 0.
+			if(is_first): ea1 = node.getParam("ea1")
+			if(is_last): ea2 = node.getParam("ea2")
+			return getBendMap6x6(length,theta,ea1,ea2,beta,gamma,mass)
+		return getDriftMap6x6(length,beta,gamma,mass)
+
+	def track(self, sigma_in, e_kin, time, mass, charge, centroid_in = None):
+		"""
+		Tracks the sigma matrix through the lattice. Returns the sigma matrix at the exit.
+		The sigma matrices, centroids, energies, times, and positions at the report points
+		are available after that, see getSigmas(), getCentroids(), getEnergies(),
+		getTimes(), getPositions().
+		sigma_in - 6x6 central second moments
+		e_kin - synchronous particle kinetic energy in GeV
+		time - synchronous particle time in sec
+		centroid_in - 6D centroid relative to the synchronous particle, zeros if None
+		"""
+		self.mass = mass
+		sigma = numpy.array(sigma_in,dtype = numpy.float64)
+		centroid = numpy.zeros(6)
+		if(centroid_in is not None):
+			centroid = numpy.array(centroid_in,dtype = numpy.float64)
+		self.node_names = []
+		positions = []
+		sigmas = []
+		centroids = []
+		e_kins = []
+		times = []
+		def addReport(name, pos):
+			self.node_names.append(name)
+			positions.append(pos)
+			sigmas.append(sigma.copy())
+			centroids.append(centroid.copy())
+			e_kins.append(e_kin)
+			times.append(time)
+		addReport("start",0.)
+		pos = 0.
+		for node in self.accLattice.getNodes():
+			if(isinstance(node,BaseRF_Gap)):
+				(matr,e_kin) = self._trackRF_Gap(node,e_kin,time,mass,charge)
+				sigma = matr.dot(sigma).dot(matr.T)
+				centroid = matr.dot(centroid)
+			if(isinstance(node,(DCorrectorH,DCorrectorV))):
+				centroid = centroid + self._getCorrectorKick(node,e_kin,mass,charge)
+			n_node_parts = node.getnParts()
+			for part_index in range(n_node_parts):
+				for child in node.getChildNodes(AccNode.BODY,part_index):
+					if(isinstance(child,(DCorrectorH,DCorrectorV))):
+						centroid = centroid + self._getCorrectorKick(child,e_kin,mass,charge)
+					if(isinstance(child,(DCorrectorH,DCorrectorV,MarkerLinacNode))):
+						addReport(child.getName(),pos)
+				length = node.getLength(part_index)
+				if(length <= 0.): continue
+				n_steps = 1
+				if(self.peak_current > 0.):
+					n_steps = max(1,int(math.ceil(length/self.sc_step)))
+				step = length/n_steps
+				for ind in range(n_steps):
+					(momentum,beta,gamma) = self._getSyncParams(e_kin,mass)
+					#---- space charge kicks in the middles of the steps
+					is_first = (part_index == 0 and ind == 0)
+					is_last = (part_index == n_node_parts - 1 and ind == n_steps - 1)
+					if(self.peak_current > 0.):
+						matr = self._getElementMap(node,step/2,e_kin,mass,charge,is_first,False)
+						matr = self._getSpaceChargeMap(matr.dot(sigma).dot(matr.T),step,beta,gamma,mass,charge).dot(matr)
+						matr = self._getElementMap(node,step/2,e_kin,mass,charge,False,is_last).dot(matr)
+					else:
+						matr = self._getElementMap(node,step,e_kin,mass,charge,is_first,is_last)
+					sigma = matr.dot(sigma).dot(matr.T)
+					centroid = matr.dot(centroid)
+					time += step/(beta*C_LIGHT)
+					pos += step
+			addReport(node.getName(),pos)
+		self.positions = numpy.array(positions)
+		self.sigmas = numpy.array(sigmas)
+		self.centroids = numpy.array(centroids)
+		self.e_kins = numpy.array(e_kins)
+		self.times = numpy.array(times)
+		return sigma
+
+	def trackBunch(self, bunch, twiss_analysis = None):
+		"""
+		Tracks the envelope with the sigma matrix and the synchronous particle
+		and the centroid from the bunch. The bunch is not changed.
+		Returns the sigma matrix at the exit.
+		"""
+		(avg,corr) = getBunchMoments(bunch,twiss_analysis)
+		sync_part = bunch.getSyncParticle()
+		return self.track(corr,sync_part.kinEnergy(),sync_part.time(),bunch.mass(),bunch.charge(),avg)
+
+	def getNodeNames(self):
+		"""
+		Returns the list of the report points names, the 1st is "start".
+		"""
+		return self.node_names
+
+	def getPositions(self):
+		"""
+		Returns NumPy array of positions in m.
+		"""
+		return self.positions
+
+	def getSigmas(self):
+		"""
+		Returns NumPy array (K,6,6) of sigma matrices.
+		"""
+		return self.sigmas
+
+	def getEnergies(self):
+		"""
+		Returns NumPy array of synchronous particle kinetic energies in GeV.
+		"""
+		return self.e_kins
+
+	def getCentroids(self):
+		"""
+		Returns NumPy array (K,6) of centroids relative to the synchronous particle.
+		"""
+		return self.centroids
+
+	def getTimes(self):
+		"""
+		Returns NumPy array of synchronous particle arrival times in sec.
+		"""
+		return self.times
+
+	def getSampleIndexes(self, pos_step = 0.1):
+		"""
+		Returns the list of indexes of the results nearest to the grid points with pos_step.
+		"""
+		if(len(self.positions) == 0): return []
+		indexes = []
+		for pos_grid in numpy.arange(0.,self.positions[-1] + pos_step/2,pos_step):
+			ind = int(numpy.argmin(abs(self.positions - pos_grid)))
+			if(len(indexes) == 0 or indexes[-1] != ind):
+				indexes.append(ind)
+		return indexes
+
+	def writeTwissSizesEkin(self, file_name, pos_step = 0.1, rf_frequency = 402.5e+6, n_parts = 0):
+		"""
+		Writes the file with the same columns as pyorbit_twiss_sizes_ekin.dat
+		in pyorbit_lattice_from_xml_example.py for the positions on the pos_step grid.
+		rf_frequency - for the z to phase conversion in Hz,
+		n_parts - the value for the Nparts column.
+		"""
+		file_out = open(file_name,"w")
+		s = " Node   position "
+		s += "   alphaX betaX emittX  normEmittX"
+		s += "   alphaY betaY emittY  normEmittY"
+		s += "   alphaZ betaZ emittZ  emittZphiMeV"
+		s += "   sizeX sizeY sizeZ_deg"
+		s += "   eKin Nparts "
+		file_out.write(s + "\n")
+		for ind in self.getSampleIndexes(pos_step):
+			sigma = self.sigmas[ind]
+			(momentum,beta,gamma) = self._getSyncParams(self.e_kins[ind],self.mass)
+			z_to_phase_coeff = 360./(beta*C_LIGHT/rf_frequency)
+			twiss_arr = []
+			for plane in range(3):
+				i = 2*plane
+				emitt = math.sqrt(max(sigma[i,i]*sigma[i + 1,i + 1] - sigma[i,i + 1]**2,1.0e-60))
+				twiss_arr.append((-sigma[i,i + 1]/emitt,sigma[i,i]/emitt,emitt*1.0e+6))
+			((alphaX,betaX,emittX),(alphaY,betaY,emittY),(alphaZ,betaZ,emittZ)) = twiss_arr
+			x_rms = math.sqrt(sigma[0,0])*1000.
+			y_rms = math.sqrt(sigma[2,2])*1000.
+			z_rms_deg = z_to_phase_coeff*math.sqrt(sigma[4,4])
+			s = " %35s  %4.5f " % (self.node_names[ind], self.positions[ind])
+			s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % (alphaX, betaX, emittX, emittX*gamma*beta)
+			s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % (alphaY, betaY, emittY, emittY*gamma*beta)
+			s += "   %6.4f  %6.4f  %6.4f  %6.4f   " % (alphaZ, betaZ, emittZ, z_to_phase_coeff*emittZ)
+			s += "   %5.3f  %5.3f  %5.3f " % (x_rms, y_rms, z_rms_deg)
+			s += "  %10.6f   %8d " % (self.e_kins[ind]*1.0e+3, n_parts)
+			file_out.write(s + "\n")
+		file_out.close()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the batched EPICS Channel Access
+# operations with groups of PVs
+#--------------------------------------------------------
+
+import time
+
+import numpy
+
+from epics import ca
+from epics import pv as pv_channel
+
+class PV_Group:
+	"""
+	Group of PVs that are connected, read, and written together.
+	All requests are sent first and then the replies are collected, so
+	the operation with the whole group takes about one round-trip time.
+	pv_names - list of PV names
+	timeout - connection timeout in seconds
+	"""
+	def __init__(self, pv_names, timeout = 2.0):
+		self.pv_names = list(pv_names)
+		#---- PV creation starts the connection, it does not wait
+		self.pvs = [pv_channel.PV(pv_name.strip(), auto_monitor = False) for pv_name in self.pv_names]
+		self.connect(timeout)
+
+	def connect(self, timeout = 2.0):
+		"""
+		Waits for connection of all PVs. Returns the list of not connected PV names.
+		"""
+		time_end = time.time() + timeout
+		for pv in self.pvs:
+			pv.wait_for_connection(timeout = max(time_end - time.time(),0.001))
+		return self.getNotConnectedNames()
+
+	def getNotConnectedNames(self):
+		"""
+		Returns the list of not connected PV names.
+		"""
+		return [self.pv_names[ind] for ind, pv in enumerate(self.pvs) if(not pv.connected)]
+
+	def getPVs(self):
+		"""
+		Returns the list of pyepics PV objects.
+		"""
+		return self.pvs
+
+	def getNames(self):
+		"""
+		Returns the list of PV names.
+		"""
+		return self.pv_names
+
+	def get(self, timeout = 2.0):
+		"""
+		Returns NumPy array of PVs values. Not connected or timed out PVs give NaN.
+		It can be called from any thread (e.g. asyncio executor).
+		"""
+		#---- the low level ca functions use the CA context of the calling thread
+		ca.use_initial_context()
+		for pv in self.pvs:
+			if(pv.connected):
+				ca.get(pv.chid,wait = False)
+		ca.flush_io()
+		time_end = time.time() + timeout
+		values = numpy.full(len(self.pvs),numpy.nan)
+		for ind, pv in enumerate(self.pvs):
+			if(not pv.connected): continue
+			value = ca.get_complete(pv.chid,timeout = max(time_end - time.time(),0.001))
+			if(value is not None):
+				values[ind] = value
+		return values
+
+	def getDict(self, timeout = 2.0):
+		"""
+		Returns the dictionary {pv_name:value}.
+		"""
+		return dict(zip(self.pv_names,self.get(timeout)))
+
+	def put(self, values, wait = False, timeout = 2.0):
+		"""
+		Writes values (one value for all PVs or a list) to the PVs.
+		If wait is True, it waits until all puts are completed or timeout.
+		Returns True if all puts are completed (always True for wait = False).
+		"""
+		if(numpy.isscalar(values)):
+			values = [values]*len(self.pvs)
+		if(len(values) != len(self.pvs)):
+			raise ValueError("PV_Group.put: number of values %d != number of PVs %d"%(len(values),len(self.pvs)))
+		ca.use_initial_context()
+		for pv, value in zip(self.pvs,values):
+			pv.put(value,wait = False,use_complete = wait)
+		ca.flush_io()
+		if(not wait):
+			return True
+		time_end = time.time() + timeout
+		while(time.time() < time_end):
+			if(all([pv.put_complete for pv in self.pvs])):
+				return True
+			ca.poll(evt = 1.0e-3)
+		return False
+
+def getMagnetPV_Names(nodes, suffix = ":B_Set"):
+	"""
+	Returns the list of VA PV names for magnets PyORBIT nodes
+	like MEBT_Mag:QH01 -> MEBT_Mag:PS_QH01:B_Set.
+	"""
+	return [node.getName().replace(":",":PS_") + suffix for node in nodes]
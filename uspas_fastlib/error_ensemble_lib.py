@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the tracking of many error-seeded linac
+# lattices (quads fields, RF cavities phases and amplitudes,
+# correctors fields) in a pool of processes
+#--------------------------------------------------------
+
+import math
+import os
+
+import numpy
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from orbit.core.bunch import Bunch, BunchTwissAnalysis
+from orbit.py_linac.lattice_modifications import Add_quad_apertures_to_lattice
+from orbit.py_linac.lattice_modifications import Add_rfgap_apertures_to_lattice
+
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.bunch_file_lib import readBunch
+from uspas_fastlib.bunch_reduction_lib import getFirstParticlesBunch
+from uspas_fastlib.orbit_response_lib import getBPM_Nodes, getCorrectorNodes, BPM_OrbitRecorder
+
+#---- the error specification keys and their default values (rms of Gaussian errors)
+#---- quad_rel - relative error of quads gradients
+#---- cav_phase_deg - error of RF cavities phases in deg
+#---- cav_amp_rel - relative error of RF cavities amplitudes
+#---- corr_field - offsets of correctors fields in T
+#---- cutoff - errors are limited by +-cutoff*rms
+ERROR_SPEC_DEFAULTS = {"quad_rel":0.,"cav_phase_deg":0.,"cav_amp_rel":0.,"corr_field":0.,"cutoff":3.0}
+
+def getErrorSpec(error_spec):
+	"""
+	Returns the error specification dictionary with default values for missing keys.
+	"""
+	res_spec = dict(ERROR_SPEC_DEFAULTS)
+	for key, value in error_spec.items():
+		if(key not in ERROR_SPEC_DEFAULTS):
+			raise ValueError("getErrorSpec: unknown error key %s"%key)
+		res_spec[key] = value
+	return res_spec
+
+def generateErrors(seed, n_quads, n_cavs, n_corrs, error_spec):
+	"""
+	Returns the dictionary with NumPy arrays of errors for the seed:
+	quad_rel[n_quads], cav_phase_deg[n_cavs], cav_amp_rel[n_cavs], corr_field[n_corrs].
+	The errors depend only on the seed, not on the worker process.
+	"""
+	error_spec = getErrorSpec(error_spec)
+	rng = numpy.random.default_rng(seed)
+	cutoff = error_spec["cutoff"]
+	errors = {}
+	for key, n_elements in (("quad_rel",n_quads),("cav_phase_deg",n_cavs),("cav_amp_rel",n_cavs),("corr_field",n_corrs)):
+		errors[key] = error_spec[key]*numpy.clip(rng.standard_normal(n_elements),-cutoff,cutoff)
+	return errors
+
+class ErrorEnsembleModel:
+	"""
+	PyORBIT linac model for the error-seeded tracking. The lattice and the bunch
+	are created once, and the design tracking is performed for nominal settings.
+	For each seed the errors are added to the nominal settings, the bunch is
+	tracked, and the settings are restored.
+	Parameters:
+	names - list of sequences names
+	xml_file_name - lattice XML file
+	bunch_file - PyORBIT text or binary bunch file, see bunch_file_lib.readBunch(...)
+	n_particles - number of the first particles from the bunch file, all if None
+	bpm_name_substring - BPMs with this substring in the name are used, like "CCL"
+	add_apertures - if True the quads and RF gaps apertures are added
+	"""
+	def __init__(self, names, xml_file_name, bunch_file, n_particles = None,
+			bpm_name_substring = "", add_apertures = True, bin_file_name = None):
+		self.accLattice = getLinacAccLattice(names,xml_file_name)
+		if(add_apertures):
+			aprtNodes = Add_quad_apertures_to_lattice(self.accLattice)
+			aprtNodes = Add_rfgap_apertures_to_lattice(self.accLattice,aprtNodes)
+		self.bunch_in = readBunch(bunch_file,bin_file_name = bin_file_name)
+		if(n_particles != None):
+			self.bunch_in = getFirstParticlesBunch(self.bunch_in,n_particles,keep_total_charge = False)
+		self.quads = self.accLattice.getQuads()
+		self.rf_cavs = self.accLattice.getRF_Cavities()
+		self.corr_nodes = getCorrectorNodes(self.accLattice)
+		self.bpm_nodes = getBPM_Nodes(self.accLattice,bpm_name_substring)
+		self.twiss_analysis = BunchTwissAnalysis()
+		#---- nominal settings
+		self.quad_fields = [quad.getParam("dB/dr") for quad in self.quads]
+		self.cav_settings = [(rf_cav.getPhase(),rf_cav.getAmp()) for rf_cav in self.rf_cavs]
+		self.corr_fields = [corr_node.getField() for corr_node in self.corr_nodes]
+		bunch = Bunch()
+		self.bunch_in.copyBunchTo(bunch)
+		self.accLattice.trackDesignBunch(bunch)
+
+	def getBPM_Names(self):
+		"""
+		Returns the list of BPMs names.
+		"""
+		return [bpm_node.getName() for bpm_node in self.bpm_nodes]
+
+	def getElementNames(self):
+		"""
+		Returns the dictionary with lists of quads, cavities, and correctors names.
+		"""
+		names_dict = {}
+		names_dict["quads"] = [quad.getName() for quad in self.quads]
+		names_dict["cavs"] = [rf_cav.getName() for rf_cav in self.rf_cavs]
+		names_dict["correctors"] = [corr_node.getName() for corr_node in self.corr_nodes]
+		names_dict["bpms"] = self.getBPM_Names()
+		return names_dict
+
+	def restoreNominalSettings(self):
+		"""
+		Restores the nominal quads, RF cavities, and correctors settings.
+		"""
+		for quad, field in zip(self.quads,self.quad_fields):
+			quad.setParam("dB/dr",field)
+		for rf_cav, (phase,amp) in zip(self.rf_cavs,self.cav_settings):
+			rf_cav.setPhase(phase)
+			rf_cav.setAmp(amp)
+		for corr_node, field in zip(self.corr_nodes,self.corr_fields):
+			corr_node.setField(field)
+
+	def applyErrors(self, errors):
+		"""
+		Sets nominal settings plus errors from generateErrors(...).
+		"""
+		for quad, field, error in zip(self.quads,self.quad_fields,errors["quad_rel"]):
+			quad.setParam("dB/dr",field*(1.0 + error))
+		for ind, rf_cav in enumerate(self.rf_cavs):
+			(phase,amp) = self.cav_settings[ind]
+			rf_cav.setPhase(phase + errors["cav_phase_deg"][ind]*math.pi/180.)
+			rf_cav.setAmp(amp*(1.0 + errors["cav_amp_rel"][ind]))
+		for corr_node, field, error in zip(self.corr_nodes,self.corr_fields,errors["corr_field"]):
+			corr_node.setField(field + error)
+
+	def runSeed(self, seed, error_spec):
+		"""
+		Tracks the bunch through the lattice with errors for the seed.
+		Returns (orbit,twiss,n_parts): BPMs orbit [x...,y...] in mm,
+		(3,3) array of the exit (alpha,beta,emitt) for x,y,z, and number of
+		particles at the exit.
+		"""
+		errors = generateErrors(seed,len(self.quads),len(self.rf_cavs),len(self.corr_nodes),error_spec)
+		recorder = BPM_OrbitRecorder(self.bpm_nodes)
+		bunch = Bunch()
+		self.bunch_in.copyBunchTo(bunch)
+		self.applyErrors(errors)
+		try:
+			self.accLattice.trackBunch(bunch,actionContainer = recorder)
+		finally:
+			self.restoreNominalSettings()
+		twiss = numpy.zeros((3,3))
+		n_parts = bunch.getSizeGlobal()
+		if(n_parts > 0):
+			self.twiss_analysis.analyzeBunch(bunch)
+			for plane in range(3):
+				(alpha,beta,gamma,emitt) = self.twiss_analysis.getTwiss(plane)[:4]
+				twiss[plane] = (alpha,beta,emitt)
+		else:
+			twiss[:,:] = numpy.nan
+		return (recorder.orbit.copy(),twiss,n_parts)
+
+#---- the model of the worker process, it is created once by the pool initializer
+_worker_model = None
+
+def _initWorker(model_params):
+	global _worker_model
+	_worker_model = ErrorEnsembleModel(**model_params)
+
+def _runWorkerSeed(seed, error_spec):
+	return _worker_model.runSeed(seed,error_spec)
+
+def _getWorkerElementNames():
+	return _worker_model.getElementNames()
+
+class ErrorEnsembleRunner:
+	"""
+	Runs the error-seeded trackings over a pool of processes.
+	Each worker builds its own ErrorEnsembleModel(**model_params) once,
+	so the time of the study is n_seeds*tracking_time/n_workers.
+	The model_params dictionary should have only picklable values.
+	With "spawn" start method the calling script should have
+	the if __name__ == "__main__": guard.
+	"""
+	def __init__(self, model_params, n_workers = None, mp_context = None):
+		self.model_params = model_params
+		if(n_workers == None):
+			n_workers = os.cpu_count()
+		self.n_workers = n_workers
+		if(mp_context != None):
+			mp_context = multiprocessing.get_context(mp_context)
+		self.executor = ProcessPoolExecutor(max_workers = n_workers, mp_context = mp_context,
+			initializer = _initWorker, initargs = (model_params,))
+		self.names_dict = None
+
+	def getElementNames(self):
+		"""
+		Returns the dictionary with lists of quads, cavities, correctors, and BPMs names.
+		"""
+		if(self.names_dict == None):
+			self.names_dict = self.executor.submit(_getWorkerElementNames).result()
+		return self.names_dict
+
+	def run(self, error_spec, n_seeds, seed_start = 0):
+		"""
+		Runs seeds from seed_start to seed_start + n_seeds - 1.
+		Returns the dictionary of NumPy arrays:
+		seeds[n_seeds], orbits[n_seeds,2*n_bpms] in mm, twiss[n_seeds,3,3] at the exit,
+		n_parts[n_seeds], and errors quad_rel, cav_phase_deg, cav_amp_rel, corr_field
+		[n_seeds,n_elements]. The errors are regenerated from the seeds here,
+		so they are not transferred from the workers.
+		"""
+		seeds = list(range(seed_start,seed_start + n_seeds))
+		chunksize = max(1,int(math.ceil(n_seeds/(4.0*self.n_workers))))
+		results = list(self.executor.map(_runWorkerSeed,seeds,[error_spec,]*n_seeds,chunksize = chunksize))
+		names_dict = self.getElementNames()
+		res_dict = {}
+		res_dict["seeds"] = numpy.array(seeds)
+		res_dict["orbits"] = numpy.array([res[0] for res in results]).reshape((n_seeds,2*len(names_dict["bpms"])))
+		res_dict["twiss"] = numpy.array([res[1] for res in results]).reshape((n_seeds,3,3))
+		res_dict["n_parts"] = numpy.array([res[2] for res in results],dtype = numpy.int64)
+		errors_arr = [generateErrors(seed,len(names_dict["quads"]),len(names_dict["cavs"]),len(names_dict["correctors"]),error_spec) for seed in seeds]
+		for key in ("quad_rel","cav_phase_deg","cav_amp_rel","corr_field"):
+			res_dict[key] = numpy.array([errors[key] for errors in errors_arr]).reshape((n_seeds,-1))
+		return res_dict
+
+	def shutdown(self):
+		"""
+		Stops worker processes.
+		"""
+		self.executor.shutdown()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.shutdown()
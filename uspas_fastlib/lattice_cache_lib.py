@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The functions to build the SNS linac lattice from the
+# compiled (binary) image of the XML lattice file.
+#--------------------------------------------------------
+
+import os
+import re
+import hashlib
+import pickle
+
+from orbit.utils.xml import XmlDataAdaptor
+from orbit.py_linac.linac_parsers import SNS_LinacLatticeFactory
+
+#---- change it if the structure of the image is changed
+LATTICE_IMAGE_VERSION = 1
+
+def getXmlFileHash(xml_file_name):
+	"""
+	Returns SHA1 hex digest of the XML file content.
+	"""
+	sha = hashlib.sha1()
+	fl_in = open(xml_file_name,"rb")
+	sha.update(fl_in.read())
+	fl_in.close()
+	return sha.hexdigest()
+
+def getLatticeImageFileName(names,xml_file_name,cache_dir = None):
+	"""
+	Returns the file name of the lattice image for the list of sequences names.
+	The name includes the hash of the XML file, so the image of the
+	modified XML file will have a different name.
+	By default the cache directory is lattice_cache near the XML file.
+	"""
+	if(cache_dir == None):
+		cache_dir = os.path.join(os.path.dirname(os.path.abspath(xml_file_name)),"lattice_cache")
+	key = getXmlFileHash(xml_file_name) + ":" + ",".join(names) + ":" + str(LATTICE_IMAGE_VERSION)
+	key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+	prefix = os.path.splitext(os.path.basename(xml_file_name))[0] + "_" + "_".join(names)
+	return os.path.join(cache_dir,prefix + "_" + key[:16] + ".pkl")
+
+def compileDataAdaptor(data_adaptor):
+	"""
+	Returns the (name,attributes,children) nested tuples image of XmlDataAdaptor.
+	"""
+	atts = tuple([(key,data_adaptor.stringValue(key)) for key in data_adaptor.attributes()])
+	children = tuple([compileDataAdaptor(child) for child in data_adaptor.childAdaptors()])
+	return (data_adaptor.getName(),atts,children)
+
+def restoreDataAdaptor(image, data_adaptor = None):
+	"""
+	Returns XmlDataAdaptor restored from the (name,attributes,children) image.
+	"""
+	(name,atts,children) = image
+	if(data_adaptor == None):
+		data_adaptor = XmlDataAdaptor(name)
+	for (key,value) in atts:
+		data_adaptor.setValue(key,value)
+	for child_image in children:
+		restoreDataAdaptor(child_image,data_adaptor.createChild(child_image[0]))
+	return data_adaptor
+
+def compileLatticeImage(names,xml_file_name,image_file_name):
+	"""
+	Parses the XML file once and writes the binary image with the sequences
+	from the names list only. The image keeps the elements tables with
+	their parameters, RF gaps TTF polynomials, and cavities tables.
+	Returns the image.
+	"""
+	acc_da = XmlDataAdaptor.adaptorForFile(xml_file_name)
+	seq_images = []
+	for seq_da in acc_da.childAdaptors():
+		if(seq_da.getName() in names):
+			seq_images.append(compileDataAdaptor(seq_da))
+	atts = tuple([(key,acc_da.stringValue(key)) for key in acc_da.attributes()])
+	image = (acc_da.getName(),atts,tuple(seq_images))
+	#---- write to the temporary file first to avoid broken images
+	cache_dir = os.path.dirname(image_file_name)
+	if(not os.path.isdir(cache_dir)):
+		os.makedirs(cache_dir)
+	tmp_file_name = image_file_name + ".tmp" + str(os.getpid())
+	fl_out = open(tmp_file_name,"wb")
+	pickle.dump((LATTICE_IMAGE_VERSION,image),fl_out,pickle.HIGHEST_PROTOCOL)
+	fl_out.close()
+	os.replace(tmp_file_name,image_file_name)
+	removeStaleLatticeImages(image_file_name)
+	return image
+
+def removeStaleLatticeImages(image_file_name):
+	"""
+	Removes the images for the same sequences list made from old XML files.
+	Only the files with exactly the same prefix and a 16 hex digits key are removed,
+	so the images for other sequences lists (like MEBT_DTL1 for MEBT) are kept.
+	"""
+	cache_dir = os.path.dirname(image_file_name)
+	base_name = os.path.basename(image_file_name)
+	prefix = base_name[:-len("0123456789abcdef.pkl")]
+	pattern = re.compile(re.escape(prefix) + "[0-9a-f]{16}\\.pkl")
+	for file_name in os.listdir(cache_dir):
+		if(file_name != base_name and pattern.fullmatch(file_name)):
+			#---- the parallel process could remove it already
+			try:
+				os.remove(os.path.join(cache_dir,file_name))
+			except OSError:
+				pass
+
+def readLatticeImage(image_file_name):
+	"""
+	Returns the lattice image from the file or None if it is absent or broken.
+	"""
+	if(not os.path.isfile(image_file_name)):
+		return None
+	try:
+		fl_in = open(image_file_name,"rb")
+		(version,image) = pickle.load(fl_in)
+		fl_in.close()
+	except Exception:
+		return None
+	if(version != LATTICE_IMAGE_VERSION):
+		return None
+	return image
+
+def getLinacAccLattice(names,xml_file_name,cache_dir = None, linac_factory = None):
+	"""
+	Returns LinacAccLattice for the sequences names like SNS_LinacLatticeFactory.
+	The XML file is parsed only when there is no image for the (names,XML hash)
+	pair in the cache directory. Otherwise, the lattice is built from the image.
+	"""
+	if(linac_factory == None):
+		linac_factory = SNS_LinacLatticeFactory()
+	image_file_name = getLatticeImageFileName(names,xml_file_name,cache_dir)
+	image = readLatticeImage(image_file_name)
+	if(image == None):
+		image = compileLatticeImage(names,xml_file_name,image_file_name)
+	acc_da = restoreDataAdaptor(image)
+	return linac_factory.getLinacAccLatticeFromDA(names,acc_da)
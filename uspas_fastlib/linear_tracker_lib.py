@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the vectorized NumPy tracking through
+# linear linac lattices (drifts, quads, correctors, bends,
+# and thin RF gaps)
+#--------------------------------------------------------
+
+import math
+
+import numpy
+
+from orbit.core.bunch import Bunch
+from orbit.core.bunch import BunchTwissAnalysis
+
+from orbit.lattice import AccNode, AccActionsContainer
+
+from orbit.py_linac.lattice import Drift, Quad, Bend
+from orbit.py_linac.lattice import DCorrectorH, DCorrectorV
+from orbit.py_linac.lattice import BaseRF_Gap
+
+from uspas_fastlib.bunch_arrays_lib import getBunchCoordinates, getBunchMoments
+
+#---- coefficient to get the B*rho in T*m from momentum in GeV/c
+B_RHO_COEFF = 3.335640952
+#---- speed of light divided by 1.0e+9 to get kicks for momentum in GeV/c
+C_LIGHT_GEV = 0.299792458
+#---- speed of light in m/sec
+C_LIGHT = 2.99792458e+8
+
+def getDriftMap6x6(length,beta,gamma,mass):
+	"""
+	Returns 6x6 NumPy transport matrix for a drift
+	for (x,xp,y,yp,z,dE) coordinates in (m,rad,m,rad,m,GeV).
+	"""
+	matr = numpy.identity(6)
+	matr[0,1] = length
+	matr[2,3] = length
+	matr[4,5] = length/(gamma**3*beta**2*mass)
+	return matr
+
+def getQuadMap6x6(length,gradient,momentum,beta,gamma,mass,charge):
+	"""
+	Returns 6x6 NumPy transport matrix for a quad without the chromatic effects.
+	If charge*gradient > 0 the quad is focusing in x-direction.
+	gradient - in T/m
+	"""
+	matr = getDriftMap6x6(length,beta,gamma,mass)
+	kq = charge*gradient/(B_RHO_COEFF*momentum)
+	if(kq == 0. or length == 0.):
+		return matr
+	sqrt_kq = math.sqrt(abs(kq))
+	phase = sqrt_kq*length
+	focus = numpy.array([[math.cos(phase),math.sin(phase)/sqrt_kq],[-sqrt_kq*math.sin(phase),math.cos(phase)]])
+	defocus = numpy.array([[math.cosh(phase),math.sinh(phase)/sqrt_kq],[sqrt_kq*math.sinh(phase),math.cosh(phase)]])
+	if(kq > 0.):
+		matr[0:2,0:2] = focus
+		matr[2:4,2:4] = defocus
+	else:
+		matr[0:2,0:2] = defocus
+		matr[2:4,2:4] = focus
+	return matr
+
+def getBendMap6x6(length,theta,ea1,ea2,beta,gamma,mass):
+	"""
+	Returns 6x6 NumPy transport matrix for a horizontal sector bend with
+	edge angles ea1 and ea2 (rad). The dispersion terms are for dE in GeV.
+	Positive z is ahead of the synchronous particle.
+	"""
+	if(theta == 0.):
+		return getDriftMap6x6(length,beta,gamma,mass)
+	rho = length/theta
+	cs = math.cos(theta)
+	sn = math.sin(theta)
+	#---- dp/p = dE_to_delta*dE
+	dE_to_delta = 1.0/(beta**2*gamma*mass)
+	matr = numpy.identity(6)
+	matr[0,0] = cs
+	matr[0,1] = rho*sn
+	matr[0,5] = rho*(1.0 - cs)*dE_to_delta
+	matr[1,0] = -sn/rho
+	matr[1,1] = cs
+	matr[1,5] = sn*dE_to_delta
+	matr[2,3] = length
+	matr[4,0] = -sn
+	matr[4,1] = -rho*(1.0 - cs)
+	matr[4,5] = (length/gamma**2 - length + rho*sn)*dE_to_delta
+	edge_in = numpy.identity(6)
+	edge_in[1,0] = math.tan(ea1)/rho
+	edge_in[3,2] = -math.tan(ea1)/rho
+	edge_out = numpy.identity(6)
+	edge_out[1,0] = math.tan(ea2)/rho
+	edge_out[3,2] = -math.tan(ea2)/rho
+	return edge_out.dot(matr.dot(edge_in))
+
+def getRF_GapMap6x6(E0TL,phase,frequency,e_kin_in,e_kin_out,mass,charge):
+	"""
+	Returns 6x6 NumPy linear map of the thin RF gap around the synchronous particle:
+	longitudinal focusing, transverse defocusing, and adiabatic damping.
+	E0TL - gap amplitude in GeV, phase - synchronous phase in rad
+	e_kin_in, e_kin_out - synchronous particle energies before and after the gap
+	"""
+	gamma_in = 1.0 + e_kin_in/mass
+	gamma_out = 1.0 + e_kin_out/mass
+	beta_in = math.sqrt(1.0 - 1.0/gamma_in**2)
+	beta_out = math.sqrt(1.0 - 1.0/gamma_out**2)
+	beta = (beta_in + beta_out)/2
+	gamma = (gamma_in + gamma_out)/2
+	rf_lambda = C_LIGHT/frequency
+	matr = numpy.identity(6)
+	#---- adiabatic damping
+	damping = (beta_in*gamma_in)/(beta_out*gamma_out)
+	#---- Trace3D: delta(beta*gamma*x') = -pi*q*E0TL*sin(phase)*x/(m*beta**2*gamma**2*lambda)
+	kick_r = -math.pi*charge*E0TL*math.sin(phase)/(mass*beta**2*gamma**2*rf_lambda*beta_out*gamma_out)
+	matr[1,0] = kick_r
+	matr[1,1] = damping
+	matr[3,2] = kick_r
+	matr[3,3] = damping
+	#---- phase of the particle is phase - 2*pi*z/(beta*lambda), positive z is ahead
+	matr[5,4] = charge*E0TL*math.sin(phase)*2*math.pi/(beta*rf_lambda)
+	return matr
+
+class LinearLatticeTracker:
+	"""
+	Vectorized tracker for LinacAccLattice made from drifts, quads, DCH/DCV correctors,
+	bends, and RF gaps. The particles coordinates are in the (N,6) NumPy array with
+	(x,xp,y,yp,z,dE) in (m,rad,m,rad,m,GeV) as in the PyORBIT Bunch.
+	Each element is an affine map coords_out = M*coords + V where V is non-zero
+	for correctors only. The maps are composed once, so the particles
+	are transformed once and the centroids at the exits of all 1st level
+	nodes are calculated from the initial centroid only.
+	The synchronous particle energy and time are tracked together with the maps,
+	and the RF gaps phases are defined as in PyORBIT: cavity phase + mode*pi +
+	2*pi*f*(t - t_design), so the lattice with RF cavities should be design tracked
+	(trackDesignBunch) before.
+	Differences from the LinacAccLattice.trackBunch(...):
+	1. no chromatic effects and fringe fields in quads
+	2. no apertures, so there are no particle losses
+	3. RF gaps are linearized around the synchronous particle with E0TL*amp
+	4. unknown nodes with non-zero length are replaced by drift maps,
+	   they are listed in getUnsupportedNodes()
+	Use compareWithTrackBunch(...) to see the differences for the particular lattice.
+	"""
+	def __init__(self, accLattice):
+		self.accLattice = accLattice
+		#---- elements = [(node,part_index,report_index), ...]
+		self.elements = []
+		#---- report points are the exits of 1st level nodes
+		self.report_nodes = []
+		self.report_positions = []
+		self.unsupported_nodes = []
+		#---- cumulative affine maps at the report points
+		self.cumulative_matrices = None
+		self.cumulative_vectors = None
+		#---- (eKin,time,mass,charge) for existing maps
+		self.map_params = None
+		self.centroids = None
+		self.collectElements()
+
+	def collectElements(self):
+		"""
+		Collects the lattice nodes and child nodes in the order of the tracking.
+		It should be called again if the structure of the lattice is changed.
+		"""
+		self.elements = []
+		self.report_nodes = []
+		self.report_positions = []
+		self.unsupported_nodes = []
+		node_pos_dict = self.accLattice.getNodePositionsDict()
+		for node in self.accLattice.getNodes():
+			report_index = len(self.report_nodes)
+			self._collectNode(node,report_index)
+			self.report_nodes.append(node)
+			self.report_positions.append(node_pos_dict[node][1])
+		self.map_params = None
+
+	def _collectNode(self, node, report_index):
+		for child in node.getChildNodes(AccNode.ENTRANCE):
+			self._collectNode(child,report_index)
+		for part_index in range(node.getnParts()):
+			for child in node.getChildNodes(AccNode.BODY,part_index):
+				self._collectNode(child,report_index)
+			self.elements.append((node,part_index,report_index))
+			if(not isinstance(node,(Drift,Quad,Bend,DCorrectorH,DCorrectorV,BaseRF_Gap))):
+				if(node.getLength(part_index) > 0.):
+					if(node not in self.unsupported_nodes):
+						self.unsupported_nodes.append(node)
+		for child in node.getChildNodes(AccNode.EXIT):
+			self._collectNode(child,report_index)
+
+	def getUnsupportedNodes(self):
+		"""
+		Returns the list of unknown nodes which are tracked as drifts.
+		"""
+		return self.unsupported_nodes
+
+	def getReportNodes(self):
+		"""
+		Returns the list of 1st level nodes. The centroids are reported at their exits.
+		"""
+		return self.report_nodes
+
+	def getPositions(self):
+		"""
+		Returns NumPy array of the report points positions in meters.
+		"""
+		return numpy.array(self.report_positions)
+
+	def getElementMap(self, node, part_index, e_kin, time, mass, charge):
+		"""
+		Returns (M,V) affine map of the part of the node for the synchronous particle
+		with e_kin and time at the entrance of the part.
+		"""
+		gamma = 1.0 + e_kin/mass
+		beta = math.sqrt(1.0 - 1.0/gamma**2)
+		momentum = mass*beta*gamma
+		length = node.getLength(part_index)
+		vector = numpy.zeros(6)
+		if(isinstance(node,Quad)):
+			return (getQuadMap6x6(length,node.getParam("dB/dr"),momentum,beta,gamma,mass,charge),vector)
+		if(isinstance(node,Bend)):
+			theta = node.getParam("theta")/node.getnParts()
+			ea1 = 0.
+			ea2 = 0.
+			if(part_index == 0): ea1 = node.getParam("ea1")
+			if(part_index == node.getnParts() - 1): ea2 = node.getParam("ea2")
+			return (getBendMap6x6(length,theta,ea1,ea2,beta,gamma,mass),vector)
+		if(isinstance(node,(DCorrectorH,DCorrectorV))):
+			eff_length = node.getParam("effLength")/node.getnParts()
+			kick = charge*node.getParam("B")*eff_length*C_LIGHT_GEV/momentum
+			#---- DCH has vertical field, force is F = q*(v x B)
+			if(isinstance(node,DCorrectorH)):
+				vector[1] = -kick
+			else:
+				vector[3] = kick
+			return (getDriftMap6x6(length,beta,gamma,mass),vector)
+		if(isinstance(node,BaseRF_Gap)):
+			rf_cav = node.getRF_Cavity()
+			if(rf_cav.getAmp() == 0.):
+				return (numpy.identity(6),vector)
+			(e_kin_out,phase) = self.getRF_GapEnergyPhase(node,e_kin,time,mass,charge)
+			E0TL = rf_cav.getAmp()*node.getParam("E0TL")
+			return (getRF_GapMap6x6(E0TL,phase,rf_cav.getFrequency(),e_kin,e_kin_out,mass,charge),vector)
+		return (getDriftMap6x6(length,beta,gamma,mass),vector)
+
+	def getRF_GapEnergyPhase(self, rf_gap, e_kin, time, mass, charge):
+		"""
+		Returns (e_kin_out,phase) - the synchronous particle energy after the RF gap
+		and its RF phase in rad.
+		"""
+		rf_cav = rf_gap.getRF_Cavity()
+		amp = rf_cav.getAmp()
+		if(amp == 0.):
+			return (e_kin,0.)
+		phase = rf_cav.getPhase() + rf_gap.getParam("mode")*math.pi
+		phase += 2*math.pi*rf_cav.getFrequency()*(time - rf_cav.getDesignArrivalTime())
+		return (e_kin + charge*amp*rf_gap.getParam("E0TL")*math.cos(phase),phase)
+
+	def update(self, bunch):
+		"""
+		Composes the maps for the synchronous particle of the bunch.
+		Call it after changes of the quads, correctors, bends fields, or RF cavities.
+		"""
+		syncPart = bunch.getSyncParticle()
+		e_kin = syncPart.kinEnergy()
+		time = syncPart.time()
+		mass = bunch.mass()
+		charge = bunch.charge()
+		n_report = len(self.report_nodes)
+		self.cumulative_matrices = numpy.zeros((n_report,6,6))
+		self.cumulative_vectors = numpy.zeros((n_report,6))
+		matr_cum = numpy.identity(6)
+		vct_cum = numpy.zeros(6)
+		for (node,part_index,report_index) in self.elements:
+			(matr,vct) = self.getElementMap(node,part_index,e_kin,time,mass,charge)
+			matr_cum = matr.dot(matr_cum)
+			vct_cum = matr.dot(vct_cum) + vct
+			if(isinstance(node,BaseRF_Gap)):
+				(e_kin,phase) = self.getRF_GapEnergyPhase(node,e_kin,time,mass,charge)
+			else:
+				gamma = 1.0 + e_kin/mass
+				time += node.getLength(part_index)/(math.sqrt(1.0 - 1.0/gamma**2)*C_LIGHT)
+			#---- the last element of the 1st level node defines the map at its exit
+			self.cumulative_matrices[report_index] = matr_cum
+			self.cumulative_vectors[report_index] = vct_cum
+		self.map_params = (syncPart.kinEnergy(),syncPart.time(),mass,charge)
+
+	def _checkMaps(self, bunch):
+		syncPart = bunch.getSyncParticle()
+		params = (syncPart.kinEnergy(),syncPart.time(),bunch.mass(),bunch.charge())
+		if(self.map_params != params):
+			self.update(bunch)
+
+	def getTotalMap(self, bunch):
+		"""
+		Returns (M,V) affine map for the whole lattice.
+		"""
+		self._checkMaps(bunch)
+		return (self.cumulative_matrices[-1],self.cumulative_vectors[-1])
+
+	def track(self, coords, bunch):
+		"""
+		Tracks (N,6) coordinates array through the lattice. The bunch defines the
+		synchronous particle, mass, and charge. Returns the new (N,6) array.
+		The centroids at the exits of the 1st level nodes are available
+		from getCentroids() after tracking.
+		"""
+		self._checkMaps(bunch)
+		coords = numpy.asarray(coords,dtype = numpy.float64)
+		centroid = coords.mean(axis = 0)
+		self.centroids = numpy.einsum("kij,j->ki",self.cumulative_matrices,centroid) + self.cumulative_vectors
+		coords_out = coords.dot(self.cumulative_matrices[-1].T)
+		coords_out += self.cumulative_vectors[-1]
+		return coords_out
+
+	def getCoordinatesAt(self, coords, report_index, bunch):
+		"""
+		Returns (N,6) coordinates at the exit of the 1st level node with report_index.
+		"""
+		self._checkMaps(bunch)
+		coords = numpy.asarray(coords,dtype = numpy.float64)
+		coords_out = coords.dot(self.cumulative_matrices[report_index].T)
+		coords_out += self.cumulative_vectors[report_index]
+		return coords_out
+
+	def getCentroids(self):
+		"""
+		Returns (K,6) array of centroids at the exits of the 1st level nodes
+		after the last tracking.
+		"""
+		return self.centroids
+
+	def compareWithTrackBunch(self, bunch, coords = None):
+		"""
+		Tracks the bunch by LinacAccLattice.trackBunch(...) and this tracker.
+		The bunch is not changed. Returns (K,6) array of the centroids differences
+		(tracker - PyORBIT) at the exits of the 1st level nodes and prints
+		the nodes where the differences are noticeable.
+		"""
+		if(coords is None):
+			coords = getBunchCoordinates(bunch)
+		self.track(coords,bunch)
+		twiss_analysis = BunchTwissAnalysis()
+		orbit_centroids = numpy.zeros((len(self.report_nodes),6))
+		report_index_dict = {}
+		for report_index, node in enumerate(self.report_nodes):
+			report_index_dict[node] = report_index
+		def action_exit(paramsDict):
+			node = paramsDict["node"]
+			if(node not in report_index_dict): return
+			(avg,corr) = getBunchMoments(paramsDict["bunch"],twiss_analysis)
+			orbit_centroids[report_index_dict[node]] = avg
+		actionContainer = AccActionsContainer("Linear Tracker Comparison")
+		actionContainer.addAction(action_exit,AccActionsContainer.EXIT)
+		bunch_test = Bunch()
+		bunch.copyBunchTo(bunch_test)
+		self.accLattice.trackBunch(bunch_test,actionContainer = actionContainer)
+		diff = self.centroids - orbit_centroids
+		#---- differences relative to the max centroid values along the lattice
+		scale = numpy.maximum(abs(orbit_centroids).max(axis = 0),1.0e-12)
+		rel_diff = abs(diff)/scale
+		for report_index, node in enumerate(self.report_nodes):
+			if(rel_diff[report_index].max() > 0.01):
+				st = " %35s  pos= %8.3f "%(node.getName(),self.report_positions[report_index])
+				st += " diff x,xp,y,yp,z,dE = " + " %+10.3e"*6%tuple(diff[report_index])
+				print (st)
+		return diff
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The vectorized NumPy functions for the longitudinal Twiss
+# reconstruction from the BPM amplitudes during the RF
+# cavity phase scan with the "thin RF gap - drift" model
+# and the bootstrap errors estimation
+#--------------------------------------------------------
+
+import math
+
+import numpy
+
+from concurrent.futures import ThreadPoolExecutor
+
+from uspas_fastlib.twiss_lsq_lib import getLSQ_Matrices
+from uspas_fastlib.twiss_lsq_lib import solveCorrelationsLSQ
+from uspas_fastlib.twiss_lsq_lib import getTwissFromCorrelations
+
+#---- speed of light in m/sec
+C_LIGHT = 2.99792458e+8
+
+def getBetaGamma(eKin_arr, mass):
+	"""
+	Returns (beta,gamma) NumPy arrays for kinetic energies and mass in GeV.
+	"""
+	gamma = 1.0 + numpy.asarray(eKin_arr,dtype = numpy.float64)/mass
+	beta = numpy.sqrt(1.0 - 1.0/gamma**2)
+	return (beta,gamma)
+
+def getLongitudinalMatrices2x2(qE0TL, rf_frequency, eKin_arr, rf_phase_arr, Ldrift, mass):
+	"""
+	Returns (...,2,2) NumPy array of "thin RF gap - drift" transport matrices for
+	(z,dE) in (m,GeV) as getTransportMatrix(...) in pyorbit_sns_scl_long_twiss_hint_0.py.
+	qE0TL - RF gap amplitude in GeV
+	rf_frequency - RF frequency in Hz
+	eKin_arr - kinetic energies in GeV for beta in both matrices
+	rf_phase_arr - RF phases in deg in deltaE = qE0TL*cos(rf_phase)
+	Ldrift - drift length in m
+	All parameters can be broadcastable arrays.
+	"""
+	(beta,gamma) = getBetaGamma(eKin_arr,mass)
+	rf_phase_arr = numpy.asarray(rf_phase_arr,dtype = numpy.float64)
+	kick = -qE0TL*(2*math.pi*rf_frequency)/(beta*C_LIGHT)*numpy.sin(rf_phase_arr*math.pi/180.)
+	drift = Ldrift/(gamma**3*beta**2*mass)
+	(kick,drift) = numpy.broadcast_arrays(kick,drift)
+	matrs = numpy.zeros(kick.shape + (2,2))
+	#---- D*RF = [[1 + drift*kick, drift],[kick, 1]]
+	matrs[...,0,0] = 1.0 + drift*kick
+	matrs[...,0,1] = drift
+	matrs[...,1,0] = kick
+	matrs[...,1,1] = 1.0
+	return matrs
+
+def getRMS2_Z_FromBPM_Amps(bpm_amp_arr, eKin_arr, bpm_frequency, mass):
+	"""
+	Returns NumPy array of RMS^2 longitudinal sizes in m^2 at BPM from the BPM
+	amplitudes normalized by the amplitude of the point-like bunch:
+	bpm_amp = exp(-phase_rms^2/2). For amplitudes outside (0,1) the result is NaN,
+	and these points are excluded by solveCorrelationsLSQ(...).
+	"""
+	bpm_amp_arr = numpy.asarray(bpm_amp_arr,dtype = numpy.float64)
+	(beta,gamma) = getBetaGamma(eKin_arr,mass)
+	is_valid = (bpm_amp_arr > 0.) & (bpm_amp_arr < 1.0)
+	rms2_phase = -2*numpy.log(numpy.where(is_valid,bpm_amp_arr,0.5))
+	coeff_phase2_to_z2 = 1./(2*math.pi*bpm_frequency/(beta*C_LIGHT))**2
+	return numpy.where(is_valid,coeff_phase2_to_z2*rms2_phase,numpy.nan)
+
+def getEnergies(eKin_in, qE0TL, rf_phase_arr):
+	"""
+	Returns NumPy array of kinetic energies after the thin RF gap for RF phases in deg.
+	"""
+	return eKin_in + qE0TL*numpy.cos(numpy.asarray(rf_phase_arr,dtype = numpy.float64)*math.pi/180.)
+
+def _bootstrapChunk(lsq_matrix, rms2_arr, w_arr, n_samples, seed_seq):
+	rng = numpy.random.default_rng(seed_seq)
+	n_points = rms2_arr.shape[-1]
+	ind_arr = rng.integers(0,n_points,size = (n_samples,n_points))
+	w_samples = None
+	if(w_arr is not None):
+		w_samples = w_arr[ind_arr]
+	(corr,cov) = solveCorrelationsLSQ(lsq_matrix[ind_arr],rms2_arr[ind_arr],w_samples)
+	return corr
+
+def bootstrapCorrelations(lsq_matrix, rms2_arr, w_arr = None, n_bootstrap = 1000, random_seed = None, n_chunks = 8, n_workers = None):
+	"""
+	Returns (corr_samples,twiss_samples) NumPy arrays (n_bootstrap,3) for the bootstrap
+	resamples (with replacement) of the scan points. Each resample LSQ problem is solved
+	in the batched call. The resamples are divided into n_chunks solved in parallel
+	threads (NumPy releases GIL). The results depend on random_seed and n_chunks,
+	but not on n_workers. Non-physical resamples have NaN Twiss.
+	lsq_matrix - (K,3) LSQ matrix
+	rms2_arr - (K,) RMS^2 sizes
+	w_arr - (K,) weights or None
+	"""
+	lsq_matrix = numpy.asarray(lsq_matrix,dtype = numpy.float64)
+	rms2_arr = numpy.asarray(rms2_arr,dtype = numpy.float64)
+	if(w_arr is not None):
+		w_arr = numpy.asarray(w_arr,dtype = numpy.float64)
+	n_chunks = max(1,min(n_chunks,n_bootstrap))
+	chunk_sizes = [n_bootstrap//n_chunks + (1 if ind < n_bootstrap % n_chunks else 0) for ind in range(n_chunks)]
+	seed_seqs = numpy.random.SeedSequence(random_seed).spawn(n_chunks)
+	with ThreadPoolExecutor(max_workers = n_workers) as executor:
+		futures = [executor.submit(_bootstrapChunk,lsq_matrix,rms2_arr,w_arr,n_samples,seed_seq) for (n_samples,seed_seq) in zip(chunk_sizes,seed_seqs)]
+		corr_samples = numpy.concatenate([future.result() for future in futures])
+	(twiss_samples,twiss_cov) = getTwissFromCorrelations(corr_samples)
+	return (corr_samples,twiss_samples)
+
+def reconstructLongTwiss(qE0TL, rf_frequency, eKin_arr, rf_phase_arr, Ldrift, mass, rms2_arr,
+		w_arr = None, n_bootstrap = 0, random_seed = None):
+	"""
+	Returns the dictionary with the longitudinal Twiss reconstruction results:
+	"corr" - (<z^2>,<z*dE>,<dE^2>) in (m^2,m*GeV,GeV^2) and "corr_cov" - its covariance,
+	"twiss" - (alpha,beta,emitt) with beta in m/GeV and emitt in m*GeV,
+	"twiss_cov" - covariance from the analytic Jacobians,
+	and if n_bootstrap > 0 "corr_boot_std" and "twiss_boot_std" - bootstrap std values.
+	"""
+	lsq_matrix = getLSQ_Matrices(getLongitudinalMatrices2x2(qE0TL,rf_frequency,eKin_arr,rf_phase_arr,Ldrift,mass))
+	(corr,corr_cov) = solveCorrelationsLSQ(lsq_matrix,rms2_arr,w_arr)
+	(twiss,twiss_cov) = getTwissFromCorrelations(corr,corr_cov)
+	res_dict = {"corr":corr,"corr_cov":corr_cov,"twiss":twiss,"twiss_cov":twiss_cov}
+	if(n_bootstrap > 0):
+		(corr_samples,twiss_samples) = bootstrapCorrelations(lsq_matrix,rms2_arr,w_arr,n_bootstrap,random_seed)
+		res_dict["corr_boot_std"] = numpy.nanstd(corr_samples,axis = 0)
+		res_dict["twiss_boot_std"] = numpy.nanstd(twiss_samples,axis = 0)
+	return res_dict
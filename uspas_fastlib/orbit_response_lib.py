@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the orbit correction with the BPMs vs.
+# dipole correctors response matrix calculated by PyORBIT
+# and cached for the lattice optics settings
+#--------------------------------------------------------
+
+import os
+import hashlib
+
+import numpy
+
+from orbit.core.bunch import Bunch, BunchTwissAnalysis
+from orbit.lattice import AccActionsContainer
+from orbit.py_linac.lattice import MarkerLinacNode
+from orbit.py_linac.lattice import DCorrectorH, DCorrectorV
+
+from uspas_fastlib.checkpoint_tracking_lib import CheckpointTracker
+
+def getBPM_Nodes(accLattice, name_substring = ""):
+	"""
+	Returns the list of BPM markers (1st level and body children nodes)
+	with name_substring in the name, like "CCL".
+	"""
+	bpm_nodes = []
+	for node in accLattice.getNodes():
+		for bpm_node in [node,] + node.getBodyChildren():
+			if(isinstance(bpm_node,MarkerLinacNode) and bpm_node.getName().find("BPM") >= 0):
+				if(bpm_node.getName().find(name_substring) >= 0):
+					bpm_nodes.append(bpm_node)
+	return bpm_nodes
+
+def getCorrectorNodes(accLattice, name_substring = ""):
+	"""
+	Returns the list of DCH and DCV nodes (children of quads and 1st level nodes)
+	with name_substring in the name, like "CCL".
+	"""
+	corr_nodes = []
+	for node in accLattice.getNodes():
+		for corr_node in [node,] + node.getAllChildren():
+			if(isinstance(corr_node,(DCorrectorH,DCorrectorV)) and corr_node.getName().find(name_substring) >= 0):
+				if(corr_node not in corr_nodes):
+					corr_nodes.append(corr_node)
+	return corr_nodes
+
+class BPM_OrbitRecorder(AccActionsContainer):
+	"""
+	Records the bunch centroid (x,y) in mm at the entrances of BPM nodes.
+	It is used as actionContainer in trackBunch(...), the orbit array
+	[x_1,...x_n,y_1,...,y_n] is in the orbit attribute after tracking.
+	"""
+	def __init__(self, bpm_nodes):
+		AccActionsContainer.__init__(self,"BPM Orbit Recorder")
+		self.twiss_analysis = BunchTwissAnalysis()
+		self.bpm_index_dict = {}
+		for ind, bpm_node in enumerate(bpm_nodes):
+			self.bpm_index_dict[bpm_node] = ind
+		self.n_bpms = len(bpm_nodes)
+		#---- orbit = [x_1,...x_n,y_1,...,y_n]
+		self.orbit = numpy.zeros(2*self.n_bpms)
+		#---- the tracking action is added to this container by trackBunch(...)
+		self.addAction(self.recordOrbit,AccActionsContainer.ENTRANCE)
+
+	def recordOrbit(self, paramsDict):
+		ind = self.bpm_index_dict.get(paramsDict["node"])
+		if(ind == None): return
+		bunch = paramsDict["bunch"]
+		if(bunch.getSizeGlobal() == 0):
+			self.orbit[ind] = numpy.nan
+			self.orbit[ind + self.n_bpms] = numpy.nan
+			return
+		self.twiss_analysis.analyzeBunch(bunch)
+		self.orbit[ind] = self.twiss_analysis.getAverage(0)*1000.
+		self.orbit[ind + self.n_bpms] = self.twiss_analysis.getAverage(2)*1000.
+
+class OrbitResponseMatrix:
+	"""
+	The response matrix R of BPMs orbit [x_1,...x_n,y_1,...,y_n] in mm
+	to the dipole correctors fields in T:  d(orbit) = R * d(fields).
+	The columns are calculated by PyORBIT tracking with the finite field steps.
+	Each tracking with the changed corrector is resumed from the bunch snapshot
+	at the corrector (CheckpointTracker), so only the lattice downstream is tracked.
+	The matrices are kept in memory and optionally in the cache_dir files,
+	the key is the hash of the quads and RF cavities settings and the input
+	energy. The correctors fields are not in the key because the response is linear.
+	accLattice - linac lattice after trackDesignBunch(...)
+	bunch_in - the initial bunch
+	corrector_nodes - list of DCH and DCV nodes
+	bpm_nodes - list of BPM marker nodes, see getBPM_Nodes(...)
+	delta_field - corrector field step in T
+	"""
+	def __init__(self, accLattice, bunch_in, corrector_nodes, bpm_nodes, delta_field = 1.0e-3, cache_dir = None):
+		self.accLattice = accLattice
+		self.bunch_in = bunch_in
+		self.corrector_nodes = list(corrector_nodes)
+		self.bpm_nodes = list(bpm_nodes)
+		self.delta_field = delta_field
+		self.cache_dir = cache_dir
+		if(self.cache_dir != None and not os.path.isdir(self.cache_dir)):
+			os.makedirs(self.cache_dir)
+		#---- {key:matrix}
+		self.matrix_dict = {}
+		self.matrix_key = None
+		self.matrix = None
+		#---- SVD of the matrix: (u,s,vt)
+		self.svd = None
+
+	def getCorrectorNames(self):
+		"""
+		Returns the list of correctors names - columns of the matrix.
+		"""
+		return [node.getName() for node in self.corrector_nodes]
+
+	def getBPM_Names(self):
+		"""
+		Returns the list of BPMs names. The rows of the matrix are x for all BPMs and then y.
+		"""
+		return [node.getName() for node in self.bpm_nodes]
+
+	def getSettingsKey(self):
+		"""
+		Returns the hash key of the lattice optics settings, correctors, and BPMs.
+		"""
+		key_arr = []
+		key_arr.append("%.9e"%self.bunch_in.getSyncParticle().kinEnergy())
+		for quad in self.accLattice.getQuads():
+			key_arr.append("%s %.9e"%(quad.getName(),quad.getParam("dB/dr")))
+		for rf_cav in self.accLattice.getRF_Cavities():
+			key_arr.append("%s %.9e %.9e"%(rf_cav.getName(),rf_cav.getAmp(),rf_cav.getPhase()))
+		key_arr += self.getCorrectorNames()
+		key_arr += self.getBPM_Names()
+		key_arr.append("%.9e"%self.delta_field)
+		return hashlib.sha1("\n".join(key_arr).encode("utf-8")).hexdigest()
+
+	def _getCacheFileName(self, key):
+		return os.path.join(self.cache_dir,"orbit_response_" + key + ".npy")
+
+	def getOrbit(self, bunch_in = None):
+		"""
+		Tracks the bunch with present settings and returns the orbit array [x..., y...] in mm.
+		"""
+		if(bunch_in == None):
+			bunch_in = self.bunch_in
+		recorder = BPM_OrbitRecorder(self.bpm_nodes)
+		bunch = Bunch()
+		bunch_in.copyBunchTo(bunch)
+		self.accLattice.trackBunch(bunch,actionContainer = recorder)
+		return recorder.orbit.copy()
+
+	def calculateMatrix(self):
+		"""
+		Calculates the response matrix by tracking: one full tracking and one
+		partial tracking for each corrector. Returns the matrix.
+		"""
+		recorder = BPM_OrbitRecorder(self.bpm_nodes)
+		tracker = CheckpointTracker(self.accLattice,self.corrector_nodes)
+		tracker.trackBunch(self.bunch_in,actionContainer = recorder)
+		orbit_base = recorder.orbit.copy()
+		matrix = numpy.zeros((len(orbit_base),len(self.corrector_nodes)))
+		#---- trackAfterChange(...) records again the snapshots downstream of the changed
+		#---- corrector, so the correctors go from downstream to upstream, and each
+		#---- tracking starts from the snapshot that was not made with a changed corrector
+		ind_arr = list(range(len(self.corrector_nodes)))
+		ind_arr.sort(key = lambda ind: tracker.index_dict[self.corrector_nodes[ind]],reverse = True)
+		for ind in ind_arr:
+			corr_node = self.corrector_nodes[ind]
+			field = corr_node.getField()
+			#---- BPMs upstream of the corrector are not tracked again
+			recorder.orbit[:] = orbit_base
+			corr_node.setField(field + self.delta_field)
+			try:
+				tracker.trackAfterChange([corr_node,],actionContainer = recorder)
+			finally:
+				corr_node.setField(field)
+			matrix[:,ind] = (recorder.orbit - orbit_base)/self.delta_field
+		return matrix
+
+	def getMatrix(self):
+		"""
+		Returns the response matrix for the present lattice settings. It is calculated
+		only if there is no matrix for these settings in memory or in the cache directory.
+		"""
+		key = self.getSettingsKey()
+		if(key == self.matrix_key):
+			return self.matrix
+		matrix = self.matrix_dict.get(key)
+		if(matrix is None and self.cache_dir != None and os.path.isfile(self._getCacheFileName(key))):
+			matrix = numpy.load(self._getCacheFileName(key))
+		if(matrix is None):
+			matrix = self.calculateMatrix()
+			if(self.cache_dir != None):
+				numpy.save(self._getCacheFileName(key),matrix)
+		self.matrix_dict[key] = matrix
+		self.matrix_key = key
+		self.matrix = matrix
+		#---- NaN rows (lost beam) are excluded from the SVD
+		self.svd = numpy.linalg.svd(numpy.nan_to_num(matrix),full_matrices = False)
+		return matrix
+
+	def getSingularValues(self):
+		"""
+		Returns the singular values of the response matrix.
+		"""
+		self.getMatrix()
+		return self.svd[1]
+
+	def solveCorrection(self, orbit, orbit_target = None, n_singular = None, tikhonov = 0.):
+		"""
+		Returns NumPy array of correctors field changes in T minimizing
+		|orbit + R*d(fields) - orbit_target|.
+		orbit - measured or model orbit [x..., y...] in mm, NaN values are ignored
+		n_singular - number of singular values to keep (truncated SVD)
+		tikhonov - Tikhonov regularization parameter in the matrix units (mm/T)
+		"""
+		matrix = self.getMatrix()
+		orbit = numpy.asarray(orbit,dtype = numpy.float64)
+		diff = -orbit
+		if(orbit_target is not None):
+			diff = numpy.asarray(orbit_target,dtype = numpy.float64) - orbit
+		mask = numpy.isfinite(diff) & numpy.all(numpy.isfinite(matrix),axis = 1)
+		if(numpy.all(mask)):
+			(u,s,vt) = self.svd
+		else:
+			(u,s,vt) = numpy.linalg.svd(matrix[mask],full_matrices = False)
+		filter_arr = s/(s**2 + tikhonov**2)
+		if(n_singular != None):
+			filter_arr[n_singular:] = 0.
+		return vt.T.dot(filter_arr*u.T.dot(diff[mask]))
+
+	def predictOrbit(self, orbit, delta_fields):
+		"""
+		Returns the orbit after the correctors field changes without tracking.
+		"""
+		return numpy.asarray(orbit) + self.getMatrix().dot(delta_fields)
+
+	def applyCorrection(self, delta_fields):
+		"""
+		Adds the field changes to the correctors in the model.
+		"""
+		for corr_node, delta_field in zip(self.corrector_nodes,delta_fields):
+			corr_node.setField(corr_node.getField() + delta_field)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The local pcaspy server with the PVs for testing
+# of the EPICS scripts without Virtual Accelerator
+#--------------------------------------------------------
+
+import argparse
+
+from pcaspy import SimpleServer, Driver
+from pcaspy.tools import ServerThread
+
+def makePV_Database(pv_names, value = 0., prec = 5):
+	"""
+	Returns the pcaspy PVs database {pv_name:{"type":"float",...}, ...}
+	with the same initial value for all PVs.
+	"""
+	pvdb = {}
+	for pv_name in pv_names:
+		pvdb[pv_name] = {"type":"float", "prec":prec, "value":value}
+	return pvdb
+
+class StandInDriver(Driver):
+	"""
+	The pcaspy driver that keeps written values. The update_func(driver,reason,value)
+	is called after each write, so it can change other PVs like readbacks.
+	"""
+	def __init__(self, update_func = None):
+		Driver.__init__(self)
+		self.update_func = update_func
+
+	def write(self, reason, value):
+		self.setParam(reason,value)
+		if(self.update_func != None):
+			self.update_func(self,reason,value)
+		self.updatePVs()
+		return True
+
+class StandInServer:
+	"""
+	The pcaspy server for the PVs database running in its own thread.
+	"""
+	def __init__(self, pvdb, prefix = "", update_func = None):
+		self.server = SimpleServer()
+		self.server.createPV(prefix,pvdb)
+		self.driver = StandInDriver(update_func)
+		self.server_thread = None
+
+	def start(self):
+		"""
+		Starts processing of the CA requests in the thread.
+		"""
+		self.server_thread = ServerThread(self.server)
+		self.server_thread.start()
+
+	def stop(self):
+		"""
+		Stops the server thread.
+		"""
+		if(self.server_thread != None):
+			self.server_thread.stop()
+			self.server_thread = None
+
+	def setValue(self, pv_name, value):
+		"""
+		Sets the value of the PV and notifies clients.
+		"""
+		self.driver.setParam(pv_name,value)
+		self.driver.updatePVs()
+
+	def getValue(self, pv_name):
+		"""
+		Returns the value of the PV.
+		"""
+		return self.driver.getParam(pv_name)
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+
+def main():
+	parser = argparse.ArgumentParser(description = "Local pcaspy server with the float PVs.")
+	parser.add_argument("pv_names_file", type = str, help = "File with PV names, one per line")
+	args = parser.parse_args()
+	fl_in = open(args.pv_names_file,"r")
+	pv_names = [ln.strip() for ln in fl_in.readlines() if(len(ln.strip()) > 0)]
+	fl_in.close()
+	server = StandInServer(makePV_Database(pv_names))
+	print ("Serving %d PVs. Press Ctrl-C to stop."%len(pv_names))
+	while(True):
+		server.server.process(0.1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for parallel RF cavities settings scans
+# with PyORBIT linac models in a pool of processes
+#--------------------------------------------------------
+
+import math
+import os
+import random
+
+import numpy
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from orbit.core.bunch import Bunch, BunchTwissAnalysis
+from orbit.bunch_generators import TwissContainer
+from orbit.bunch_generators import WaterBagDist3D
+from orbit.lattice import AccNode
+from orbit.py_linac.lattice import MarkerLinacNode
+
+from uspas_pylib.bpm_model_node_lib import ModelBPM
+from uspas_pylib.aperture_nodes_lib import addPhaseApertureNodes
+from uspas_pylib.sns_linac_bunch_generator import SNS_Linac_BunchGenerator
+
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+
+class CavityScanModel:
+	"""
+	PyORBIT linac model with BPM-model nodes for RF cavities settings scans.
+	The lattice and the initial bunch are created once.
+	Parameters:
+	names - list of sequences names
+	xml_file_name - lattice XML file
+	bunch_file - file for Bunch.readBunch(...), if None the bunch is generated
+	             from twiss = ((alphaX,betaX,emittX),(alphaY,...),(alphaZ,...))
+	e_kin_ini - initial energy in GeV for generated bunch
+	n_particles - number of particles for generated bunch
+	peak_current - in mA
+	bpm_frequency - in Hz
+	track_design - if True the trackDesignBunch(...) is called for each setting
+	               as in sns_scl_pyorbit_model_hint_0.py. In this case the cavities'
+	               phases are relative to the arrival time of the synchronous particle.
+	"""
+	def __init__(self, names, xml_file_name, bunch_file = None, twiss = None,
+			e_kin_ini = 0.1856, n_particles = 1000, peak_current = 38.0,
+			bpm_frequency = 402.5e+6, track_design = True, random_seed = 100):
+		random.seed(random_seed)
+		self.track_design = track_design
+		self.accLattice = getLinacAccLattice(names,xml_file_name)
+		self.rf_cavs = self.accLattice.getRF_Cavities()
+		self.rf_cavs_dict = {}
+		for rf_cav in self.rf_cavs:
+			self.rf_cavs_dict[rf_cav.getName()] = rf_cav
+		#---- design (phase [rad],amp) of cavities to restore them before each setting
+		self.design_settings = [(rf_cav.getPhase(),rf_cav.getAmp()) for rf_cav in self.rf_cavs]
+		#---- BPM models for BPMs after the 1st cavity
+		self.twiss_analysis = BunchTwissAnalysis()
+		node_position_dict = self.accLattice.getNodePositionsDict()
+		cav_1st_position = -1.0
+		if(len(self.rf_cavs) > 0):
+			cav_1st_position = self.rf_cavs[0].getPosition()
+		self.bpm_model_nodes = []
+		for marker_node in self.accLattice.getNodesOfClass(MarkerLinacNode):
+			if(marker_node.getName().find("BPM") < 0): continue
+			position = (node_position_dict[marker_node][0] + node_position_dict[marker_node][1])/2.
+			if(position < cav_1st_position): continue
+			bpm_model_node = ModelBPM(self.twiss_analysis,marker_node,position,peak_current,bpm_frequency)
+			marker_node.addChildNode(bpm_model_node,AccNode.ENTRANCE)
+			self.bpm_model_nodes.append(bpm_model_node)
+		addPhaseApertureNodes(self.accLattice)
+		#---- initial bunch
+		if(bunch_file != None):
+			self.bunch_in = Bunch()
+			self.bunch_in.readBunch(bunch_file)
+		else:
+			(twissX,twissY,twissZ) = [TwissContainer(alpha,beta,emitt) for (alpha,beta,emitt) in twiss]
+			bunch_gen = SNS_Linac_BunchGenerator(twissX,twissY,twissZ)
+			bunch_gen.setKinEnergy(e_kin_ini)
+			bunch_gen.setBeamCurrent(peak_current)
+			self.bunch_in = bunch_gen.getBunch(nParticles = n_particles, distributorClass = WaterBagDist3D)
+		for bpm_model_node in self.bpm_model_nodes:
+			bpm_model_node.setNumberParticles(self.bunch_in.getSizeGlobal())
+		#---- the design tracking defines the cavities' arrival times
+		bunch = Bunch()
+		self.bunch_in.copyBunchTo(bunch)
+		self.accLattice.trackDesignBunch(bunch)
+
+	def getBPM_Names(self):
+		"""
+		Returns the list of BPMs names.
+		"""
+		return [bpm_model_node.getBPM().getName() for bpm_model_node in self.bpm_model_nodes]
+
+	def getBPM_Positions(self):
+		"""
+		Returns NumPy array of BPMs positions in meters.
+		"""
+		return numpy.array([bpm_model_node.getPosition() for bpm_model_node in self.bpm_model_nodes])
+
+	def getCavityNames(self):
+		"""
+		Returns the list of RF cavities names.
+		"""
+		return [rf_cav.getName() for rf_cav in self.rf_cavs]
+
+	def restoreDesignSettings(self):
+		"""
+		Restores design phases and amplitudes of all RF cavities.
+		"""
+		for ind, rf_cav in enumerate(self.rf_cavs):
+			(phase,amp) = self.design_settings[ind]
+			rf_cav.setPhase(phase)
+			rf_cav.setAmp(amp)
+
+	def getDesignSetting(self, cav_name):
+		"""
+		Returns design (phase [deg], amp) for the cavity.
+		"""
+		(phase,amp) = self.design_settings[self.rf_cavs.index(self.rf_cavs_dict[cav_name])]
+		return (phase*180./math.pi,amp)
+
+	def runSetting(self, setting):
+		"""
+		Tracks the bunch for the setting = {cav_name:(phase_deg,amp), ...}.
+		Cavities that are not in the setting have design parameters.
+		Returns (bpm_phases,bpm_amps) NumPy arrays.
+		"""
+		self.restoreDesignSettings()
+		for cav_name, (phase_deg,amp) in setting.items():
+			rf_cav = self.rf_cavs_dict[cav_name]
+			rf_cav.setPhase(phase_deg*math.pi/180.)
+			rf_cav.setAmp(amp)
+		bunch = Bunch()
+		self.bunch_in.copyBunchTo(bunch)
+		if(self.track_design):
+			self.accLattice.trackDesignBunch(bunch)
+			bunch = Bunch()
+			self.bunch_in.copyBunchTo(bunch)
+		self.accLattice.trackBunch(bunch)
+		bpm_phases = numpy.array([bpm_model_node.getPhase() for bpm_model_node in self.bpm_model_nodes])
+		bpm_amps = numpy.array([bpm_model_node.getAmp() for bpm_model_node in self.bpm_model_nodes])
+		self.restoreDesignSettings()
+		return (bpm_phases,bpm_amps)
+
+	def runPhaseScan(self, cav_name, phase_arr, amp = None, downstream_off = True):
+		"""
+		Performs the phase scan of one cavity. The cavities downstream are
+		switched off if downstream_off is True, and other cavities have design parameters.
+		amp - cavity amplitude, by default the design one
+		Returns (bpm_names,bpm_phases,bpm_amps) for BPMs after the cavity,
+		NumPy arrays have shapes (n_phases,n_bpms).
+		"""
+		rf_cav = self.rf_cavs_dict[cav_name]
+		if(amp == None):
+			amp = self.getDesignSetting(cav_name)[1]
+		other_settings = {}
+		if(downstream_off):
+			for other_cav in self.rf_cavs:
+				if(other_cav.getPosition() > rf_cav.getPosition()):
+					other_settings[other_cav.getName()] = (self.getDesignSetting(other_cav.getName())[0],0.)
+		bpm_names = self.getBPM_Names()
+		bpm_positions = self.getBPM_Positions()
+		bpm_ind_arr = [ind for ind in range(len(bpm_names)) if(bpm_positions[ind] > rf_cav.getPosition())]
+		bpm_phases = numpy.zeros((len(phase_arr),len(bpm_ind_arr)))
+		bpm_amps = numpy.zeros((len(phase_arr),len(bpm_ind_arr)))
+		for ind, setting in enumerate(makePhaseScanSettings(cav_name,phase_arr,amp,other_settings)):
+			(phases,amps) = self.runSetting(setting)
+			bpm_phases[ind,:] = phases[bpm_ind_arr]
+			bpm_amps[ind,:] = amps[bpm_ind_arr]
+		return ([bpm_names[ind] for ind in bpm_ind_arr],bpm_phases,bpm_amps)
+
+#---- the model of the worker process, it is created once by the pool initializer
+_worker_model = None
+
+def _initWorker(model_params):
+	global _worker_model
+	_worker_model = CavityScanModel(**model_params)
+
+def _runWorkerSetting(setting):
+	return _worker_model.runSetting(setting)
+
+def _getWorkerDesignSettings():
+	return dict([(cav_name,_worker_model.getDesignSetting(cav_name)) for cav_name in _worker_model.getCavityNames()])
+
+def _runWorkerPhaseScan(cav_name, phase_arr, amp, downstream_off):
+	return _worker_model.runPhaseScan(cav_name,phase_arr,amp,downstream_off)
+
+class ParallelPhaseScanRunner:
+	"""
+	Runs the list of RF cavities settings over a pool of processes.
+	Each worker builds its own CavityScanModel(**model_params) once.
+	The model_params dictionary should have only picklable values.
+	With "spawn" start method the calling script should have
+	the if __name__ == "__main__": guard.
+	"""
+	def __init__(self, model_params, n_workers = None, mp_context = None):
+		self.model_params = model_params
+		if(n_workers == None):
+			n_workers = os.cpu_count()
+		self.n_workers = n_workers
+		if(mp_context != None):
+			mp_context = multiprocessing.get_context(mp_context)
+		self.executor = ProcessPoolExecutor(max_workers = n_workers, mp_context = mp_context,
+			initializer = _initWorker, initargs = (model_params,))
+
+	def run(self, settings):
+		"""
+		Returns (bpm_phases,bpm_amps) NumPy arrays with shapes (n_settings,n_bpms)
+		for the list of settings [{cav_name:(phase_deg,amp), ...}, ...].
+		"""
+		chunksize = max(1,int(math.ceil(len(settings)/(4.0*self.n_workers))))
+		results = list(self.executor.map(_runWorkerSetting,settings,chunksize = chunksize))
+		if(len(results) == 0):
+			return (numpy.zeros((0,0)),numpy.zeros((0,0)))
+		bpm_phases = numpy.array([res[0] for res in results])
+		bpm_amps = numpy.array([res[1] for res in results])
+		return (bpm_phases,bpm_amps)
+
+	def getDesignSettings(self):
+		"""
+		Returns the dictionary {cav_name:(phase_deg,amp)} with design settings
+		of the model cavities.
+		"""
+		return self.executor.submit(_getWorkerDesignSettings).result()
+
+	def submitPhaseScan(self, cav_name, phase_arr, amp = None, downstream_off = True):
+		"""
+		Submits the whole phase scan of one cavity to one worker and returns
+		the Future with (bpm_names,bpm_phases,bpm_amps) - see CavityScanModel.runPhaseScan.
+		The scans of several cavities run in parallel in different workers.
+		"""
+		return self.executor.submit(_runWorkerPhaseScan,cav_name,list(phase_arr),amp,downstream_off)
+
+	def shutdown(self):
+		"""
+		Stops worker processes.
+		"""
+		self.executor.shutdown()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.shutdown()
+
+def makePhaseScanSettings(cav_name, phase_arr, amp, other_settings = None):
+	"""
+	Returns the list of settings for a phase scan of one cavity.
+	phase_arr - cavity phases in deg
+	other_settings - {cav_name:(phase_deg,amp), ...} for all scan points
+	"""
+	settings = []
+	for phase in phase_arr:
+		setting = {}
+		if(other_settings != None):
+			setting.update(other_settings)
+		setting[cav_name] = (phase,amp)
+		settings.append(setting)
+	return settings
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the precomputed RF cavities phase scan
+# tables: BPM phases vs. (cavity phase, amplitude, input
+# energy) and the fitting of measured scans with them
+#--------------------------------------------------------
+
+import math
+import os
+
+import numpy
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccActionsContainer
+from orbit.py_linac.lattice import MarkerLinacNode
+
+class CavityPhaseScanTable:
+	"""
+	The table of the synchronous particle BPM phases for the cavity phase scan.
+	The phases are not wrapped (360*f*time), so they are smooth functions of
+	cavity phase, amplitude, and input energy.
+	The cavity phase grid is uniform and periodic: -180 + 360*i/n_phases.
+	cav_name - PyORBIT cavity name
+	bpm_names - BPMs after the cavity
+	phase_arr - cavity phases in deg
+	amp_arr - cavity amplitudes
+	e_kin_arr - input kinetic energies in GeV
+	bpm_phases - array (n_e_kin,n_amps,n_phases,n_bpms) in deg
+	e_kin_out - array (n_e_kin,n_amps,n_phases) energy after the cavity at the 1st BPM in GeV
+	"""
+	def __init__(self, cav_name, bpm_names, phase_arr, amp_arr, e_kin_arr, bpm_phases, e_kin_out):
+		self.cav_name = cav_name
+		self.bpm_names = list(bpm_names)
+		self.phase_arr = numpy.asarray(phase_arr,dtype = numpy.float64)
+		self.amp_arr = numpy.asarray(amp_arr,dtype = numpy.float64)
+		self.e_kin_arr = numpy.asarray(e_kin_arr,dtype = numpy.float64)
+		self.bpm_phases = numpy.asarray(bpm_phases,dtype = numpy.float64)
+		self.e_kin_out = numpy.asarray(e_kin_out,dtype = numpy.float64)
+
+	def _getGridWeights(self, grid_arr, val):
+		"""
+		Returns (ind0,ind1,frac) for linear interpolation on non-uniform grid.
+		Values outside the grid are extrapolated by the end intervals.
+		"""
+		if(len(grid_arr) == 1):
+			return (0,0,0.)
+		ind0 = int(numpy.clip(numpy.searchsorted(grid_arr,val) - 1,0,len(grid_arr) - 2))
+		frac = (val - grid_arr[ind0])/(grid_arr[ind0 + 1] - grid_arr[ind0])
+		return (ind0,ind0 + 1,frac)
+
+	def _interpolateAmpEnergy(self, arr, amp, e_kin):
+		(ie0,ie1,fe) = self._getGridWeights(self.e_kin_arr,e_kin)
+		(ia0,ia1,fa) = self._getGridWeights(self.amp_arr,amp)
+		res = (1. - fe)*((1. - fa)*arr[ie0,ia0] + fa*arr[ie0,ia1])
+		res += fe*((1. - fa)*arr[ie1,ia0] + fa*arr[ie1,ia1])
+		return res
+
+	def _interpolatePhase(self, arr, phase_arr):
+		"""
+		Periodic linear interpolation along the 1st axis of arr.
+		"""
+		n_phases = len(self.phase_arr)
+		pos_arr = ((numpy.asarray(phase_arr) - self.phase_arr[0])*n_phases/360.) % n_phases
+		ind0_arr = numpy.floor(pos_arr).astype(numpy.int64) % n_phases
+		ind1_arr = (ind0_arr + 1) % n_phases
+		frac_arr = pos_arr - numpy.floor(pos_arr)
+		if(arr.ndim > 1):
+			frac_arr = frac_arr[:,numpy.newaxis]
+		return (1. - frac_arr)*arr[ind0_arr] + frac_arr*arr[ind1_arr]
+
+	def getBPM_Phases(self, phase_arr, amp, e_kin):
+		"""
+		Returns the interpolated BPM phases array (n_phases,n_bpms) for the cavity phases
+		phase_arr in deg, amplitude, and input energy in GeV.
+		"""
+		return self._interpolatePhase(self._interpolateAmpEnergy(self.bpm_phases,amp,e_kin),phase_arr)
+
+	def getOutputEnergy(self, phase_arr, amp, e_kin):
+		"""
+		Returns the interpolated energies after the cavity in GeV for the cavity phases.
+		"""
+		return self._interpolatePhase(self._interpolateAmpEnergy(self.e_kin_out,amp,e_kin),phase_arr)
+
+	def writeTable(self, file_name):
+		"""
+		Writes the table into the NumPy .npz file.
+		"""
+		numpy.savez(file_name,cav_name = self.cav_name,bpm_names = numpy.array(self.bpm_names),
+			phase_arr = self.phase_arr,amp_arr = self.amp_arr,e_kin_arr = self.e_kin_arr,
+			bpm_phases = self.bpm_phases,e_kin_out = self.e_kin_out)
+
+def readPhaseScanTable(file_name):
+	"""
+	Reads CavityPhaseScanTable from the .npz file.
+	"""
+	data = numpy.load(file_name)
+	return CavityPhaseScanTable(str(data["cav_name"]),[str(name) for name in data["bpm_names"]],
+		data["phase_arr"],data["amp_arr"],data["e_kin_arr"],data["bpm_phases"],data["e_kin_out"])
+
+class _SyncParticleRecorder(AccActionsContainer):
+	"""
+	Records the synchronous particle time and energy at the entrances of BPM nodes.
+	"""
+	def __init__(self, bpm_nodes):
+		AccActionsContainer.__init__(self,"Sync Particle Recorder")
+		self.bpm_index_dict = {}
+		for ind, bpm_node in enumerate(bpm_nodes):
+			self.bpm_index_dict[bpm_node] = ind
+		self.times = numpy.zeros(len(bpm_nodes))
+		self.e_kins = numpy.zeros(len(bpm_nodes))
+		#---- the tracking action is added to this container by trackBunch(...)
+		self.addAction(self.recordSyncParticle,AccActionsContainer.ENTRANCE)
+
+	def recordSyncParticle(self, paramsDict):
+		ind = self.bpm_index_dict.get(paramsDict["node"])
+		if(ind == None): return
+		sync_part = paramsDict["bunch"].getSyncParticle()
+		self.times[ind] = sync_part.time()
+		self.e_kins[ind] = sync_part.kinEnergy()
+
+class CavityPhaseScanTableGenerator:
+	"""
+	Generates the phase scan tables for RF cavities of the linac lattice.
+	Only the synchronous particle is tracked with trackBunch(...) from the
+	cavity's 1st RF gap to the last needed BPM. The other cavities in this part
+	of the lattice are switched off as in the phase scan.
+	The lattice is design tracked once with bunch_in to define the arrival
+	times and the design input energies of cavities. The scans do not change
+	the design arrival times of cavities.
+	accLattice - linac lattice
+	bunch_in - the initial bunch (only the synchronous particle is used)
+	bpm_frequency - in Hz
+	"""
+	def __init__(self, accLattice, bunch_in, bpm_frequency = 402.5e+6):
+		self.accLattice = accLattice
+		self.bpm_frequency = bpm_frequency
+		self.bunch = Bunch()
+		bunch_in.copyEmptyBunchTo(self.bunch)
+		self.rf_cavs = accLattice.getRF_Cavities()
+		self.rf_cavs_dict = {}
+		for rf_cav in self.rf_cavs:
+			self.rf_cavs_dict[rf_cav.getName()] = rf_cav
+		self.bpm_nodes = [node for node in accLattice.getNodesOfClass(MarkerLinacNode) if(node.getName().find("BPM") >= 0)]
+		#---- design tracking: input energy and time for the 1st gaps of cavities
+		gap_nodes = [rf_cav.getRF_GapNodes()[0] for rf_cav in self.rf_cavs]
+		recorder = _SyncParticleRecorder(gap_nodes)
+		bunch = Bunch()
+		bunch_in.copyEmptyBunchTo(bunch)
+		self.accLattice.trackDesignBunch(bunch,{},recorder)
+		self.design_e_kin_dict = {}
+		self.design_time_dict = {}
+		for ind, rf_cav in enumerate(self.rf_cavs):
+			self.design_e_kin_dict[rf_cav.getName()] = recorder.e_kins[ind]
+			self.design_time_dict[rf_cav.getName()] = recorder.times[ind]
+
+	def getDesignInputEnergy(self, cav_name):
+		"""
+		Returns the design input energy of the cavity in GeV.
+		"""
+		return self.design_e_kin_dict[cav_name]
+
+	def getBPM_Nodes(self, cav_name, n_bpms = 2):
+		"""
+		Returns the list of n_bpms BPM nodes after the cavity.
+		"""
+		rf_cav = self.rf_cavs_dict[cav_name]
+		last_gap_position = rf_cav.getRF_GapNodes()[-1].getPosition()
+		return [node for node in self.bpm_nodes if(node.getPosition() > last_gap_position)][:n_bpms]
+
+	def makeTable(self, cav_name, n_phases = 72, amp_rel_arr = None, e_kin_rel_arr = None, n_bpms = 2):
+		"""
+		Returns CavityPhaseScanTable for the cavity.
+		n_phases - number of the cavity phase points in 360 deg
+		amp_rel_arr - amplitudes relative to the design amplitude
+		e_kin_rel_arr - input energies relative to the design input energy
+		"""
+		if(amp_rel_arr == None):
+			amp_rel_arr = [0.8,0.9,1.0,1.1,1.2]
+		if(e_kin_rel_arr == None):
+			e_kin_rel_arr = [0.99,1.0,1.01]
+		rf_cav = self.rf_cavs_dict[cav_name]
+		bpm_nodes = self.getBPM_Nodes(cav_name,n_bpms)
+		if(len(bpm_nodes) == 0):
+			raise ValueError("CavityPhaseScanTableGenerator: no BPMs after the cavity %s"%cav_name)
+		recorder = _SyncParticleRecorder(bpm_nodes)
+		index_start = self.accLattice.getNodeIndex(rf_cav.getRF_GapNodes()[0])
+		index_stop = self.accLattice.getNodeIndex(bpm_nodes[-1])
+		#---- the other cavities between the cavity and the last BPM are switched off
+		other_cavs = [other_cav for other_cav in self.rf_cavs if(other_cav != rf_cav and
+			other_cav.getPosition() > rf_cav.getPosition() and other_cav.getPosition() < bpm_nodes[-1].getPosition())]
+		init_settings = [(cav,cav.getPhase(),cav.getAmp()) for cav in [rf_cav,] + other_cavs]
+		for other_cav in other_cavs:
+			other_cav.setAmp(0.)
+		design_amp = rf_cav.getAmp()
+		phase_arr = numpy.array([-180. + 360.*ind/n_phases for ind in range(n_phases)])
+		amp_arr = design_amp*numpy.array(amp_rel_arr,dtype = numpy.float64)
+		e_kin_arr = self.getDesignInputEnergy(cav_name)*numpy.array(e_kin_rel_arr,dtype = numpy.float64)
+		bpm_phases = numpy.zeros((len(e_kin_arr),len(amp_arr),n_phases,len(bpm_nodes)))
+		e_kin_out = numpy.zeros((len(e_kin_arr),len(amp_arr),n_phases))
+		time_start = self.design_time_dict[cav_name]
+		try:
+			for ie, e_kin in enumerate(e_kin_arr):
+				for ia, amp in enumerate(amp_arr):
+					rf_cav.setAmp(amp)
+					for ip, phase in enumerate(phase_arr):
+						rf_cav.setPhase(phase*math.pi/180.)
+						sync_part = self.bunch.getSyncParticle()
+						sync_part.kinEnergy(e_kin)
+						sync_part.time(time_start)
+						self.accLattice.trackBunch(self.bunch,{},recorder,index_start,index_stop)
+						bpm_phases[ie,ia,ip,:] = 360.*self.bpm_frequency*(recorder.times - time_start)
+						e_kin_out[ie,ia,ip] = recorder.e_kins[0]
+		finally:
+			for (cav,phase,amp) in init_settings:
+				cav.setPhase(phase)
+				cav.setAmp(amp)
+		return CavityPhaseScanTable(cav_name,[node.getName() for node in bpm_nodes],phase_arr,amp_arr,e_kin_arr,bpm_phases,e_kin_out)
+
+	def makeTables(self, cav_names = None, table_dir = None, **kwargs):
+		"""
+		Makes tables for all (or listed) cavities. If table_dir is given, each
+		table is written there as cav_name.npz with ":" replaced by "_".
+		Returns the dictionary {cav_name:CavityPhaseScanTable}.
+		"""
+		if(cav_names == None):
+			cav_names = [rf_cav.getName() for rf_cav in self.rf_cavs]
+		if(table_dir != None and not os.path.isdir(table_dir)):
+			os.makedirs(table_dir)
+		tables_dict = {}
+		for cav_name in cav_names:
+			table = self.makeTable(cav_name,**kwargs)
+			tables_dict[cav_name] = table
+			if(table_dir != None):
+				table.writeTable(os.path.join(table_dir,cav_name.replace(":","_") + ".npz"))
+		return tables_dict
+
+def _getCircularResiduals(meas_phases, model_phases):
+	"""
+	Returns (residuals,offsets) where offsets are circular mean differences for
+	each BPM (unknown BPM phase offsets) and residuals are wrapped to [-180,+180].
+	"""
+	diff = numpy.radians(meas_phases - model_phases)
+	offsets = numpy.angle(numpy.mean(numpy.exp(1j*diff),axis = -2,keepdims = True))
+	residuals = numpy.degrees(numpy.angle(numpy.exp(1j*(diff - offsets))))
+	return (residuals,numpy.degrees(offsets))
+
+def fitPhaseScan(table, phase_arr, meas_bpm_phases, n_offsets = 360, n_iterations = 10):
+	"""
+	Fits the measured phase scan with the table. The BPM phase offsets are unknown,
+	so only the shapes of the curves are compared.
+	phase_arr - measured scan cavity phases in deg (setpoints)
+	meas_bpm_phases - measured BPM phases (n_points,n_bpms) in deg for table.bpm_names
+	Returns ((phase_offset,amp,e_kin),rms_residual) where
+	setpoint phase = model phase + phase_offset.
+	The grid search over phase offsets and table nodes is followed by Gauss-Newton iterations.
+	"""
+	phase_arr = numpy.asarray(phase_arr,dtype = numpy.float64)
+	meas_bpm_phases = numpy.asarray(meas_bpm_phases,dtype = numpy.float64).reshape((len(phase_arr),-1))
+	#---- grid search: offsets x amps x energies
+	offset_arr = numpy.array([-180. + 360.*ind/n_offsets for ind in range(n_offsets)])
+	best = (numpy.inf,0.,table.amp_arr[0],table.e_kin_arr[0])
+	for ie, e_kin in enumerate(table.e_kin_arr):
+		for ia, amp in enumerate(table.amp_arr):
+			curves = table.bpm_phases[ie,ia]
+			#---- model phases for all offsets (n_offsets,n_points,n_bpms)
+			model_phases = table._interpolatePhase(curves,(phase_arr[numpy.newaxis,:] - offset_arr[:,numpy.newaxis]).ravel())
+			model_phases = model_phases.reshape((n_offsets,len(phase_arr),-1))
+			(residuals,offsets) = _getCircularResiduals(meas_bpm_phases[numpy.newaxis],model_phases)
+			score_arr = numpy.sum(residuals**2,axis = (1,2))
+			ind = numpy.argmin(score_arr)
+			if(score_arr[ind] < best[0]):
+				best = (score_arr[ind],offset_arr[ind],amp,e_kin)
+	params = numpy.array(best[1:],dtype = numpy.float64)
+	#---- Gauss-Newton iterations with numerical derivatives
+	steps = numpy.array([0.1,1.0e-3*max(abs(params[1]),1.0e-6),1.0e-4*params[2]])
+	def getResiduals(params):
+		model_phases = table.getBPM_Phases(phase_arr - params[0],params[1],params[2])
+		return _getCircularResiduals(meas_bpm_phases,model_phases)[0].ravel()
+	res_arr = getResiduals(params)
+	for iteration in range(n_iterations):
+		jac = numpy.zeros((len(res_arr),len(params)))
+		for ind in range(len(params)):
+			params_step = params.copy()
+			params_step[ind] += steps[ind]
+			jac[:,ind] = (getResiduals(params_step) - res_arr)/steps[ind]
+		delta = numpy.linalg.lstsq(jac,-res_arr,rcond = None)[0]
+		params_new = params + delta
+		res_new_arr = getResiduals(params_new)
+		if(numpy.sum(res_new_arr**2) >= numpy.sum(res_arr**2)): break
+		(params,res_arr) = (params_new,res_new_arr)
+	phase_offset = (params[0] + 180.) % 360. - 180.
+	rms_residual = math.sqrt(numpy.mean(res_arr**2))
+	return ((float(phase_offset),float(params[1]),float(params[2])),rms_residual)
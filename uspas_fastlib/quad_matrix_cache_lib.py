@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The quad -> wire scanner transport matrices calculated
+# by PyORBIT tracking on the quad gradient grid, cached on
+# disk, and interpolated for any gradient
+#--------------------------------------------------------
+
+import os
+import hashlib
+
+import numpy
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccNode
+from orbit.py_linac.lattice import LinacTrMatricesContrioller
+
+from uspas_fastlib.bunch_arrays_lib import getBunchMoments
+from uspas_fastlib.checkpoint_tracking_lib import getTopLevelIndexDict
+from uspas_fastlib.transfer_map_surrogate_lib import getNumpyMatrix
+from uspas_fastlib.twiss_lsq_lib import getLSQ_Matrices
+
+class QuadScanMatrixTable:
+	"""
+	The table of 6x6 transport matrices from the quad entrance to the wire scanner
+	for the quad gradients grid. The matrices are calculated by tracking the bunch
+	with LinacTrMatricesContrioller nodes, so they include the space charge and
+	other elements (like RF bunchers) between the quad and WS. The lattice upstream
+	of the quad is tracked only once, and the tracking is stopped at WS.
+	For other gradients the matrix elements are interpolated linearly or with
+	the cubic Hermite splines.
+	The tables are kept in the cache_dir .npz files. The key is the hash of the
+	quad and WS names, the grid, the input energy, the input bunch moments and
+	macro-size, and all quads and RF cavities settings except the scanned quad.
+	accLattice - linac lattice after trackDesignBunch(...)
+	bunch_in - the bunch at the lattice entrance
+	quad_name, ws_name - like "MEBT_Mag:QH03" and "MEBT_Diag:WS04a"
+	The gradients are the model dB/dr values in T/m.
+	"""
+	def __init__(self, accLattice, bunch_in, quad_name, ws_name, cache_dir = None, use_twiss_weights = True):
+		self.accLattice = accLattice
+		self.bunch_in = bunch_in
+		self.quad_node = accLattice.getNodeForName(quad_name)
+		self.ws_node = accLattice.getNodeForName(ws_name)
+		self.use_twiss_weights = use_twiss_weights
+		self.cache_dir = cache_dir
+		if(self.cache_dir != None and not os.path.isdir(self.cache_dir)):
+			os.makedirs(self.cache_dir)
+		self.gradient_arr = None
+		self.matrices = None
+		self.derivatives = None
+
+	def getSettingsKey(self, gradient_arr):
+		"""
+		Returns the hash key of the lattice settings and the gradient grid.
+		"""
+		key_arr = []
+		key_arr.append(self.quad_node.getName())
+		key_arr.append(self.ws_node.getName())
+		key_arr.append("%.9e"%self.bunch_in.getSyncParticle().kinEnergy())
+		key_arr.append("%d %s"%(self.bunch_in.getSizeGlobal(),self.use_twiss_weights))
+		key_arr.append("%.9e"%self.bunch_in.macroSize())
+		#---- the matrices depend on the input bunch distribution through the space charge
+		(avg,corr) = getBunchMoments(self.bunch_in)
+		key_arr.append(" ".join(["%.9e"%val for val in numpy.concatenate((avg,corr.ravel()))]))
+		key_arr += ["%.9e"%gradient for gradient in gradient_arr]
+		for quad in self.accLattice.getQuads():
+			if(quad is self.quad_node): continue
+			key_arr.append("%s %.9e"%(quad.getName(),quad.getParam("dB/dr")))
+		for rf_cav in self.accLattice.getRF_Cavities():
+			key_arr.append("%s %.9e %.9e"%(rf_cav.getName(),rf_cav.getAmp(),rf_cav.getPhase()))
+		return hashlib.sha1("\n".join(key_arr).encode("utf-8")).hexdigest()
+
+	def _getCacheFileName(self, key):
+		return os.path.join(self.cache_dir,"quad_scan_matrices_" + key + ".npz")
+
+	def calculateMatrices(self, gradient_arr):
+		"""
+		Returns (n_grad,6,6) NumPy array of transport matrices calculated by tracking.
+		"""
+		index_dict = getTopLevelIndexDict(self.accLattice)
+		quad_index = index_dict[self.quad_node]
+		ws_index = index_dict[self.ws_node]
+		#---- the bunch at the quad entrance
+		bunch_quad = Bunch()
+		self.bunch_in.copyBunchTo(bunch_quad)
+		if(quad_index > 0):
+			self.accLattice.trackBunch(bunch_quad,index_start = 0,index_stop = quad_index - 1)
+		controller = LinacTrMatricesContrioller()
+		tr_nodes = controller.addTrMatrxGenNodesAtEntrance(self.accLattice,[self.quad_node,self.ws_node])
+		for tr_node in tr_nodes:
+			tr_node.setTwissWeightUse(self.use_twiss_weights,self.use_twiss_weights,self.use_twiss_weights)
+		gradient_init = self.quad_node.getParam("dB/dr")
+		matrices = numpy.zeros((len(gradient_arr),6,6))
+		try:
+			for ind, gradient in enumerate(gradient_arr):
+				self.quad_node.setParam("dB/dr",gradient)
+				bunch = Bunch()
+				bunch_quad.copyBunchTo(bunch)
+				self.accLattice.trackBunch(bunch,index_start = quad_index,index_stop = ws_index)
+				matrix_quad = getNumpyMatrix(tr_nodes[0].getTransportMatrix())
+				matrix_ws = getNumpyMatrix(tr_nodes[1].getTransportMatrix())
+				matrices[ind] = matrix_ws.dot(numpy.linalg.inv(matrix_quad))[:6,:6]
+		finally:
+			self.quad_node.setParam("dB/dr",gradient_init)
+			for node, tr_node in zip([self.quad_node,self.ws_node],tr_nodes):
+				child_nodes = node.getChildNodes(AccNode.ENTRANCE)
+				if(tr_node in child_nodes):
+					child_nodes.remove(tr_node)
+		return matrices
+
+	def makeTable(self, gradient_arr):
+		"""
+		Makes the table for the gradients grid or loads it from the cache directory.
+		"""
+		gradient_arr = numpy.sort(numpy.asarray(gradient_arr,dtype = numpy.float64))
+		key = self.getSettingsKey(gradient_arr)
+		matrices = None
+		if(self.cache_dir != None and os.path.isfile(self._getCacheFileName(key))):
+			matrices = numpy.load(self._getCacheFileName(key))["matrices"]
+		if(matrices is None):
+			matrices = self.calculateMatrices(gradient_arr)
+			if(self.cache_dir != None):
+				numpy.savez(self._getCacheFileName(key),gradient_arr = gradient_arr,matrices = matrices)
+		self.gradient_arr = gradient_arr
+		self.matrices = matrices
+		#---- derivatives dM/dG at the grid points for the Hermite interpolation
+		if(len(gradient_arr) > 1):
+			self.derivatives = numpy.gradient(matrices,gradient_arr,axis = 0)
+		else:
+			self.derivatives = numpy.zeros(matrices.shape)
+		return matrices
+
+	def getMatrices(self, gradient_arr, cubic = True):
+		"""
+		Returns (n,6,6) NumPy array of interpolated matrices for the gradients.
+		The gradients outside the grid are clipped to the grid limits.
+		cubic - if True the cubic Hermite interpolation, otherwise linear
+		"""
+		if(self.matrices is None):
+			raise ValueError("QuadScanMatrixTable: makeTable(...) should be called first.")
+		grid = self.gradient_arr
+		gradient_arr = numpy.clip(numpy.asarray(gradient_arr,dtype = numpy.float64),grid[0],grid[-1])
+		if(len(grid) == 1):
+			return numpy.repeat(self.matrices,gradient_arr.size,axis = 0).reshape(gradient_arr.shape + (6,6))
+		ind = numpy.clip(numpy.searchsorted(grid,gradient_arr,side = "right") - 1,0,len(grid) - 2)
+		step = grid[ind + 1] - grid[ind]
+		t = ((gradient_arr - grid[ind])/step)[...,numpy.newaxis,numpy.newaxis]
+		(m0,m1) = (self.matrices[ind],self.matrices[ind + 1])
+		if(not cubic):
+			return m0 + t*(m1 - m0)
+		(d0,d1) = (self.derivatives[ind],self.derivatives[ind + 1])
+		step = step[...,numpy.newaxis,numpy.newaxis]
+		h00 = 2*t**3 - 3*t**2 + 1
+		h10 = t**3 - 2*t**2 + t
+		h01 = -2*t**3 + 3*t**2
+		h11 = t**3 - t**2
+		return h00*m0 + h10*step*d0 + h01*m1 + h11*step*d1
+
+	def getMatrix(self, gradient, cubic = True):
+		"""
+		Returns 6x6 interpolated matrix for the gradient.
+		"""
+		return self.getMatrices(numpy.array([gradient,]),cubic)[0]
+
+	def getLSQ_Matrices(self, gradient_arr, cubic = True):
+		"""
+		Returns (2,K,3) LSQ matrices for X and Y planes for twiss_lsq_lib.solveCorrelationsLSQ(...).
+		"""
+		matrices = self.getMatrices(gradient_arr,cubic)
+		return getLSQ_Matrices(numpy.stack((matrices[...,0:2,0:2],matrices[...,2:4,2:4])))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The actions container that calls actions only at the
+# selected nodes of the lattice
+#--------------------------------------------------------
+
+import re
+
+from orbit.lattice import AccNode, AccActionsContainer
+
+def getAllLatticeNodes(accLattice):
+	"""
+	Returns the list of all lattice nodes including child nodes
+	in the order of tracking.
+	"""
+	nodes = []
+	def collectNode(node):
+		for child in node.getChildNodes(AccNode.ENTRANCE):
+			collectNode(child)
+		nodes.append(node)
+		for part_index in range(node.getnParts()):
+			for child in node.getChildNodes(AccNode.BODY,part_index):
+				collectNode(child)
+		for child in node.getChildNodes(AccNode.EXIT):
+			collectNode(child)
+	for node in accLattice.getNodes():
+		collectNode(node)
+	return nodes
+
+class SamplingActionsContainer(AccActionsContainer):
+	"""
+	AccActionsContainer which performs the sampled actions only at the selected nodes.
+	The nodes are selected by the positions grid, node classes, or name regex.
+	The sampled actions are added by addSampledAction(...) and kept in a separate
+	container. The actions added by addAction(...) (like the tracking action added
+	by LinacAccLattice.trackBunch) are performed at all nodes as usual.
+	For not selected nodes there is only one set lookup per call,
+	so the sampled actions (and BunchTwissAnalysis inside them) are not called at all.
+	"""
+	def __init__(self, accLattice, name = "Sampling Actions Container"):
+		AccActionsContainer.__init__(self,name)
+		self.accLattice = accLattice
+		self.sampled_actions = AccActionsContainer(name + " Sampled Actions")
+		self.selected_nodes_dict = {}
+		self.clearSelection()
+
+	def addSampledAction(self, action, place = AccActionsContainer.ENTRANCE):
+		"""
+		Adds the action that will be performed only at the nodes selected for the place.
+		"""
+		self.sampled_actions.addAction(action,place)
+
+	def removeSampledAction(self, action, place = AccActionsContainer.ENTRANCE):
+		"""
+		Removes the sampled action.
+		"""
+		self.sampled_actions.removeAction(action,place)
+
+	def clearSelection(self):
+		"""
+		Removes all selected nodes.
+		"""
+		for place in (AccActionsContainer.ENTRANCE,AccActionsContainer.BODY,AccActionsContainer.EXIT):
+			self.selected_nodes_dict[place] = set()
+
+	def getSelectedNodes(self, place = AccActionsContainer.ENTRANCE):
+		"""
+		Returns the set of nodes selected for the place (ENTRANCE, BODY, or EXIT).
+		"""
+		return self.selected_nodes_dict[place]
+
+	def addNodes(self, nodes, places = (AccActionsContainer.ENTRANCE,)):
+		"""
+		Selects the nodes from the list for all places in the places tuple.
+		"""
+		for place in places:
+			self.selected_nodes_dict[place].update(nodes)
+
+	def addNodeClasses(self, node_classes, places = (AccActionsContainer.ENTRANCE,)):
+		"""
+		Selects all nodes (including child nodes) which are instances of
+		the classes from the node_classes list, e.g. [MarkerLinacNode,Quad,BaseRF_Gap].
+		"""
+		node_classes = tuple(node_classes)
+		nodes = [node for node in getAllLatticeNodes(self.accLattice) if isinstance(node,node_classes)]
+		self.addNodes(nodes,places)
+		return nodes
+
+	def addNameRegex(self, regex, places = (AccActionsContainer.ENTRANCE,)):
+		"""
+		Selects all nodes (including child nodes) with names matching the regular expression.
+		"""
+		pattern = re.compile(regex)
+		nodes = [node for node in getAllLatticeNodes(self.accLattice) if pattern.search(node.getName())]
+		self.addNodes(nodes,places)
+		return nodes
+
+	def addPositionGrid(self, pos_arr):
+		"""
+		Selects the first entrance or exit of 1st level nodes at or after
+		each position in the pos_arr (in meters).
+		"""
+		#---- events are entrances and exits of 1st level nodes in the order of tracking
+		node_pos_dict = self.accLattice.getNodePositionsDict()
+		events = []
+		for node in self.accLattice.getNodes():
+			(pos_start,pos_end) = node_pos_dict[node]
+			events.append((pos_start,node,AccActionsContainer.ENTRANCE))
+			events.append((pos_end,node,AccActionsContainer.EXIT))
+		pos_arr = sorted(pos_arr)
+		pos_eps = 1.0e-9
+		event_ind = 0
+		for pos in pos_arr:
+			while(event_ind < len(events) and events[event_ind][0] < pos - pos_eps):
+				event_ind += 1
+			if(event_ind == len(events)): break
+			(event_pos,node,place) = events[event_ind]
+			self.selected_nodes_dict[place].add(node)
+
+	def addPositionStep(self, pos_step, pos_start = 0., pos_end = None):
+		"""
+		Selects nodes for positions grid with the step pos_step in meters.
+		"""
+		if(pos_end == None):
+			pos_end = self.accLattice.getLength()
+		n_steps = int((pos_end - pos_start)/pos_step + 1.0e-9)
+		self.addPositionGrid([pos_start + pos_step*ind for ind in range(n_steps + 1)])
+
+	def performActions(self, paramsDict, place = AccActionsContainer.ENTRANCE):
+		"""
+		Performs the usual actions at all nodes and the sampled actions
+		only if the current node is selected for this place.
+		"""
+		AccActionsContainer.performActions(self,paramsDict,place)
+		if(paramsDict["node"] in self.selected_nodes_dict[place]):
+			self.sampled_actions.performActions(paramsDict,place)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The actions container that profiles the bunch tracking:
+# wall time, number of calls, and particles in/out for
+# each lattice node and each node class
+#--------------------------------------------------------
+
+import time
+import json
+
+from orbit.lattice import AccActionsContainer
+
+class NodeProfile:
+	"""
+	The profiling statistics of one node or one node class.
+	total_time - time between the node entrance and exit including child nodes
+	and without actions of other containers
+	self_time - total_time without child nodes
+	"""
+	def __init__(self, name, class_name):
+		self.name = name
+		self.class_name = class_name
+		self.n_calls = 0
+		self.total_time = 0.
+		self.self_time = 0.
+		self.n_parts_in = 0
+		self.n_parts_out = 0
+
+	def getLostParticles(self):
+		"""
+		Returns the number of particles lost in the node (and its children).
+		"""
+		return self.n_parts_in - self.n_parts_out
+
+	def getDict(self):
+		"""
+		Returns the dictionary for the JSON output.
+		"""
+		res_dict = {}
+		res_dict["name"] = self.name
+		res_dict["class"] = self.class_name
+		res_dict["n_calls"] = self.n_calls
+		res_dict["total_time"] = self.total_time
+		res_dict["self_time"] = self.self_time
+		res_dict["n_parts_in"] = self.n_parts_in
+		res_dict["n_parts_out"] = self.n_parts_out
+		return res_dict
+
+class ProfilingActionsContainer(AccActionsContainer):
+	"""
+	AccActionsContainer which measures the wall time (time.perf_counter()) of each
+	node tracking from its ENTRANCE to EXIT actions, the number of calls, and the
+	number of macro-particles at the entrance and exit. The own actions of this
+	container (the tracking action added by trackBunch) are performed for all places
+	and timed as the node time. The child nodes are included in the total time,
+	and excluded from the self time. If actionContainer is given, its actions are
+	called from this container and their time is accounted separately as "actions"
+	time, so it does not go to the nodes.
+	There are only two perf_counter() calls and two dictionary lookups per node
+	(plus two per call of other container), so the profiler can be always on.
+	Usage:
+	profiler = ProfilingActionsContainer(actionContainer)
+	accLattice.trackBunch(bunch, paramsDict = paramsDict, actionContainer = profiler)
+	profiler.printTable()
+	"""
+	def __init__(self, actionContainer = None, name = "Profiling Actions Container"):
+		AccActionsContainer.__init__(self,name)
+		self.actionContainer = actionContainer
+		self.clean()
+
+	def clean(self):
+		"""
+		Removes all statistics.
+		"""
+		#---- {node:NodeProfile}
+		self.node_profile_dict = {}
+		#---- the list of nodes in the order of the 1st call
+		self.nodes = []
+		#---- stack of [node, n particles, start time, actions time at start, time of children]
+		self.stack = []
+		self.actions_time = 0.
+		self.actions_calls = 0
+		self.tracking_time = 0.
+
+	def _performOtherActions(self, paramsDict, place):
+		if(self.actionContainer == None): return
+		time_start = time.perf_counter()
+		self.actionContainer.performActions(paramsDict,place)
+		self.actions_time += time.perf_counter() - time_start
+		self.actions_calls += 1
+
+	def performActions(self, paramsDict, place = AccActionsContainer.ENTRANCE):
+		if(place == AccActionsContainer.ENTRANCE):
+			self._performOtherActions(paramsDict,place)
+			node = paramsDict["node"]
+			n_parts = paramsDict["bunch"].getSize()
+			self.stack.append([node,n_parts,time.perf_counter(),self.actions_time,0.])
+			AccActionsContainer.performActions(self,paramsDict,place)
+			return
+		if(place == AccActionsContainer.BODY):
+			#---- the tracking action added by trackBunch(...)
+			AccActionsContainer.performActions(self,paramsDict,place)
+			self._performOtherActions(paramsDict,place)
+			return
+		AccActionsContainer.performActions(self,paramsDict,place)
+		if(len(self.stack) == 0):
+			self._performOtherActions(paramsDict,place)
+			return
+		time_end = time.perf_counter()
+		(node,n_parts_in,time_start,actions_time_start,time_children) = self.stack.pop()
+		node_profile = self.node_profile_dict.get(node)
+		if(node_profile == None):
+			node_profile = NodeProfile(node.getName(),node.__class__.__name__)
+			self.node_profile_dict[node] = node_profile
+			self.nodes.append(node)
+		#---- the actions of other container inside the node are excluded
+		total_time = time_end - time_start - (self.actions_time - actions_time_start)
+		node_profile.n_calls += 1
+		node_profile.total_time += total_time
+		node_profile.self_time += total_time - time_children
+		node_profile.n_parts_in += n_parts_in
+		node_profile.n_parts_out += paramsDict["bunch"].getSize()
+		if(len(self.stack) > 0):
+			#---- the parent node self time does not include this node
+			self.stack[-1][4] += total_time
+		else:
+			self.tracking_time += total_time
+		self._performOtherActions(paramsDict,place)
+
+	def getNodeProfiles(self, sort_key = "self_time"):
+		"""
+		Returns the list of NodeProfile for all nodes sorted by the sort_key
+		attribute in descending order. If sort_key is None the order is the tracking order.
+		"""
+		node_profiles = [self.node_profile_dict[node] for node in self.nodes]
+		if(sort_key != None):
+			node_profiles.sort(key = lambda node_profile: getattr(node_profile,sort_key),reverse = True)
+		return node_profiles
+
+	def getClassProfiles(self, sort_key = "self_time"):
+		"""
+		Returns the list of NodeProfile for node classes sorted by the sort_key attribute.
+		"""
+		class_profile_dict = {}
+		for node in self.nodes:
+			node_profile = self.node_profile_dict[node]
+			class_profile = class_profile_dict.get(node_profile.class_name)
+			if(class_profile == None):
+				class_profile = NodeProfile(node_profile.class_name,node_profile.class_name)
+				class_profile_dict[node_profile.class_name] = class_profile
+			class_profile.n_calls += node_profile.n_calls
+			class_profile.self_time += node_profile.self_time
+			class_profile.n_parts_in += node_profile.n_parts_in
+			class_profile.n_parts_out += node_profile.n_parts_out
+			#---- the nodes of the same class are not nested in the linac lattices
+			class_profile.total_time += node_profile.total_time
+		class_profiles = list(class_profile_dict.values())
+		class_profiles.sort(key = lambda class_profile: getattr(class_profile,sort_key),reverse = True)
+		return class_profiles
+
+	def getTrackingTime(self):
+		"""
+		Returns the total time of profiled tracking of 1st level nodes without actions of other container.
+		"""
+		return self.tracking_time
+
+	def getActionsTime(self):
+		"""
+		Returns the time spent in the actions of the wrapped actionContainer.
+		"""
+		return self.actions_time
+
+	def getTable(self, n_lines = 30, by_class = False):
+		"""
+		Returns the text table of profiles sorted by self time.
+		"""
+		if(by_class):
+			profiles = self.getClassProfiles()
+		else:
+			profiles = self.getNodeProfiles()
+		tracking_time = max(self.tracking_time,1.0e-30)
+		st = " %35s %25s %8s %10s %10s %6s %10s %10s \n"%("name","class","calls","self[s]","total[s]","self%","parts_in","lost")
+		for profile in profiles[:n_lines]:
+			st += " %35s %25s %8d %10.5f %10.5f %6.2f %10d %10d \n"%(profile.name,profile.class_name,profile.n_calls,
+				profile.self_time,profile.total_time,100.*profile.self_time/tracking_time,
+				profile.n_parts_in,profile.getLostParticles())
+		st += " tracking time[s] = %10.5f \n"%self.tracking_time
+		st += " actions  time[s] = %10.5f  n calls = %d "%(self.actions_time,self.actions_calls)
+		return st
+
+	def printTable(self, n_lines = 30, by_class = False):
+		"""
+		Prints the table of profiles sorted by self time.
+		"""
+		print (self.getTable(n_lines,by_class))
+
+	def writeJSON(self, file_name):
+		"""
+		Writes the nodes and classes profiles to the JSON file.
+		"""
+		res_dict = {}
+		res_dict["tracking_time"] = self.tracking_time
+		res_dict["actions_time"] = self.actions_time
+		res_dict["actions_calls"] = self.actions_calls
+		res_dict["nodes"] = [profile.getDict() for profile in self.getNodeProfiles(None)]
+		res_dict["classes"] = [profile.getDict() for profile in self.getClassProfiles()]
+		file_out = open(file_name,"w")
+		json.dump(res_dict,file_out,indent = 1)
+		file_out.close()
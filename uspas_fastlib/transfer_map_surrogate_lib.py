@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The surrogate linac model made from the 7x7 transport
+# matrices extracted once by LinacTrMatricesContrioller.
+# Centroids, sigma matrices and correctors kicks are then
+# propagated by matrix products only.
+#--------------------------------------------------------
+
+import numpy
+
+from orbit.core.bunch import Bunch
+from orbit.lattice import AccNode, AccActionsContainer
+from orbit.py_linac.lattice import LinacTrMatricesContrioller
+from orbit.py_linac.lattice import Quad
+from orbit.py_linac.lattice import DCorrectorH, DCorrectorV
+
+from uspas_fastlib.linear_tracker_lib import getQuadMap6x6
+from uspas_fastlib.checkpoint_tracking_lib import getTopLevelIndexDict
+
+#---- c/1e+9 to get the kick in rad from B[T]*L[m]/p[GeV/c]
+C_LIGHT_GEV = 0.299792458
+
+def getNumpyMatrix(matrix):
+	"""
+	Returns NumPy 2D array made from PyORBIT Matrix.
+	"""
+	(n_rows,n_cols) = matrix.size()
+	arr = numpy.zeros((n_rows,n_cols))
+	for i in range(n_rows):
+		for j in range(n_cols):
+			arr[i,j] = matrix.get(i,j)
+	return arr
+
+def getTwissFromSigma(sigma):
+	"""
+	Returns ((alpha,beta,emitt),...) for x,y,z planes from the 6x6 sigma matrix
+	or the array of sigma matrices (K,6,6). For array the result is (K,3,3) array.
+	"""
+	sigma = numpy.asarray(sigma)
+	res = numpy.zeros(sigma.shape[:-2] + (3,3))
+	for plane in range(3):
+		ind = 2*plane
+		s11 = sigma[...,ind,ind]
+		s12 = sigma[...,ind,ind + 1]
+		s22 = sigma[...,ind + 1,ind + 1]
+		emitt = numpy.sqrt(numpy.maximum(s11*s22 - s12**2,0.))
+		with numpy.errstate(divide = "ignore", invalid = "ignore"):
+			res[...,plane,0] = -s12/emitt
+			res[...,plane,1] = s11/emitt
+		res[...,plane,2] = emitt
+	if(res.ndim == 2):
+		return tuple([tuple([float(val) for val in twiss]) for twiss in res])
+	return res
+
+def getSigmaFromTwiss(twiss_arr):
+	"""
+	Returns the uncoupled 6x6 sigma matrix from ((alpha,beta,emitt),...) for x,y,z.
+	"""
+	sigma = numpy.zeros((6,6))
+	for plane, (alpha,beta,emitt) in enumerate(twiss_arr):
+		gamma = (1.0 + alpha**2)/beta
+		ind = 2*plane
+		sigma[ind,ind] = beta*emitt
+		sigma[ind,ind + 1] = -alpha*emitt
+		sigma[ind + 1,ind] = -alpha*emitt
+		sigma[ind + 1,ind + 1] = gamma*emitt
+	return sigma
+
+class _SyncParticleParamsRecorder(AccActionsContainer):
+	"""
+	Records (momentum,beta,gamma) of the synchronous particle at the entrances of nodes.
+	"""
+	def __init__(self, nodes):
+		AccActionsContainer.__init__(self,"Sync Particle Params Recorder")
+		self.index_dict = {}
+		for ind, node in enumerate(nodes):
+			self.index_dict[node] = ind
+		self.params = numpy.zeros((len(nodes),3))
+		#---- the tracking action is added to this container by trackBunch(...)
+		self.addAction(self.recordSyncParticleParams,AccActionsContainer.ENTRANCE)
+
+	def recordSyncParticleParams(self, paramsDict):
+		ind = self.index_dict.get(paramsDict["node"])
+		if(ind == None): return
+		sync_part = paramsDict["bunch"].getSyncParticle()
+		self.params[ind] = (sync_part.momentum(),sync_part.beta(),sync_part.gamma())
+
+class TransferMapSurrogate:
+	"""
+	The surrogate of the linac lattice made from the 7x7 affine transport matrices
+	of all 1st level nodes. The matrices are extracted from one bunch tracking with
+	LinacTrMatricesContrioller, so they include RF gaps, space charge, and
+	the present correctors kicks. After that:
+	1. correctors field changes add kicks at the exits of their 1st level nodes,
+	2. quads gradient changes replace the quad part of the node matrix by the
+	   analytic quad map: M_new = Q(G_new)*Q(G_old)^-1*M_old.
+	Only the cumulative matrices downstream of the changed element are
+	recalculated. The lattice nodes fields are changed too, so the PyORBIT
+	model and the surrogate stay in sync.
+	accLattice - linac lattice after trackDesignBunch(...)
+	bunch_in - bunch for the matrices extraction (like 10000 particles)
+	"""
+	def __init__(self, accLattice, bunch_in, use_twiss_weights = True):
+		self.accLattice = accLattice
+		self.nodes = accLattice.getNodes()
+		self.index_dict = getTopLevelIndexDict(accLattice)
+		self.mass = bunch_in.mass()
+		self.charge = bunch_in.charge()
+		#---- segment matrices: node entrance -> next node entrance (the last is the lattice exit)
+		self.segment_matrices = numpy.zeros((len(self.nodes),7,7))
+		#---- (momentum,beta,gamma) at the nodes entrances
+		self.sync_params = numpy.zeros((len(self.nodes),3))
+		#---- fields at the extraction {node:field} and present fields
+		self.extracted_fields = {}
+		self.fields = {}
+		#---- cumulative matrices from the lattice entrance to the node entrances and lattice exit
+		self.cumulative_matrices = numpy.zeros((len(self.nodes) + 1,7,7))
+		self.cumulative_matrices[0] = numpy.identity(7)
+		self.n_valid = 1
+		self.extractMatrices(bunch_in,use_twiss_weights)
+
+	def extractMatrices(self, bunch_in, use_twiss_weights = True):
+		"""
+		Tracks the copy of bunch_in with transport matrix nodes at the entrances
+		of all 1st level nodes and at the lattice exit. The matrix nodes are removed after that.
+		"""
+		controller = LinacTrMatricesContrioller()
+		tr_nodes = controller.addTrMatrxGenNodesAtEntrance(self.accLattice,self.nodes)
+		tr_node_exit = controller.addTrMatrxGenNodes(self.accLattice,[self.nodes[-1],],AccNode.EXIT)[0]
+		for tr_node in tr_nodes + [tr_node_exit,]:
+			tr_node.setTwissWeightUse(use_twiss_weights,use_twiss_weights,use_twiss_weights)
+		recorder = _SyncParticleParamsRecorder(self.nodes)
+		bunch = Bunch()
+		bunch_in.copyBunchTo(bunch)
+		try:
+			self.accLattice.trackBunch(bunch,actionContainer = recorder)
+			#---- matrices from the 1st node entrance
+			matrices = [getNumpyMatrix(tr_node.getTransportMatrix()) for tr_node in tr_nodes + [tr_node_exit,]]
+		finally:
+			for node, tr_node in zip(self.nodes,tr_nodes):
+				self._removeChildNode(node,tr_node,AccNode.ENTRANCE)
+			self._removeChildNode(self.nodes[-1],tr_node_exit,AccNode.EXIT)
+		for ind in range(len(self.nodes)):
+			self.segment_matrices[ind] = matrices[ind + 1].dot(numpy.linalg.inv(matrices[ind]))
+		self.sync_params = recorder.params
+		self.extracted_fields = {}
+		self.fields = {}
+		self.n_valid = 1
+
+	def _removeChildNode(self, node, child_node, place):
+		#---- getChildNodes(...) returns the list of children of the node itself
+		child_nodes = node.getChildNodes(place)
+		if(child_node in child_nodes):
+			child_nodes.remove(child_node)
+
+	def getNodes(self):
+		"""
+		Returns the list of 1st level nodes.
+		"""
+		return self.nodes
+
+	def getPositions(self):
+		"""
+		Returns NumPy array of the entrance positions of 1st level nodes and the lattice exit.
+		"""
+		node_pos_dict = self.accLattice.getNodePositionsDict()
+		return numpy.array([node_pos_dict[node][0] for node in self.nodes] + [node_pos_dict[self.nodes[-1]][1],])
+
+	def _invalidate(self, node):
+		index = self.index_dict[node]
+		#---- the cumulative matrices up to the node entrance are still valid
+		self.n_valid = min(self.n_valid,index + 1)
+
+	def _getKickMatrix(self, corr_node, delta_field):
+		index = self.index_dict[corr_node]
+		momentum = self.sync_params[index,0]
+		kick = self.charge*delta_field*corr_node.getParam("effLength")*C_LIGHT_GEV/momentum
+		kick_matrix = numpy.identity(7)
+		if(isinstance(corr_node,DCorrectorH)):
+			kick_matrix[1,6] = -kick
+		else:
+			kick_matrix[3,6] = kick
+		return kick_matrix
+
+	def _getQuadMatrix(self, quad_node, gradient):
+		index = self.index_dict[quad_node]
+		(momentum,beta,gamma) = self.sync_params[index]
+		matrix = numpy.identity(7)
+		matrix[:6,:6] = getQuadMap6x6(quad_node.getLength(),gradient,momentum,beta,gamma,self.mass,self.charge)
+		return matrix
+
+	def setCorrectorField(self, corr_node, field):
+		"""
+		Sets the field of DCH or DCV node in the surrogate and in the lattice.
+		"""
+		if(corr_node not in self.extracted_fields):
+			self.extracted_fields[corr_node] = corr_node.getField()
+		self.fields[corr_node] = field
+		corr_node.setField(field)
+		self._invalidate(corr_node)
+
+	def setQuadField(self, quad_node, gradient):
+		"""
+		Sets the gradient of the 1st level quad node in T/m in the surrogate and in the lattice.
+		"""
+		if(quad_node not in self.extracted_fields):
+			self.extracted_fields[quad_node] = quad_node.getParam("dB/dr")
+		self.fields[quad_node] = gradient
+		quad_node.setParam("dB/dr",gradient)
+		self._invalidate(quad_node)
+
+	def _getSegmentMatrix(self, index):
+		matrix = self.segment_matrices[index]
+		node = self.nodes[index]
+		if(node in self.fields and isinstance(node,Quad)):
+			quad_old = self._getQuadMatrix(node,self.extracted_fields[node])
+			quad_new = self._getQuadMatrix(node,self.fields[node])
+			matrix = quad_new.dot(numpy.linalg.inv(quad_old).dot(matrix))
+		for child_node in node.getAllChildren():
+			if(child_node in self.fields and isinstance(child_node,(DCorrectorH,DCorrectorV))):
+				delta_field = self.fields[child_node] - self.extracted_fields[child_node]
+				matrix = self._getKickMatrix(child_node,delta_field).dot(matrix)
+		if(node in self.fields and isinstance(node,(DCorrectorH,DCorrectorV))):
+			delta_field = self.fields[node] - self.extracted_fields[node]
+			matrix = self._getKickMatrix(node,delta_field).dot(matrix)
+		return matrix
+
+	def _updateCumulativeMatrices(self):
+		for index in range(self.n_valid - 1,len(self.nodes)):
+			self.cumulative_matrices[index + 1] = self._getSegmentMatrix(index).dot(self.cumulative_matrices[index])
+		self.n_valid = len(self.nodes) + 1
+
+	def getCumulativeMatrices(self):
+		"""
+		Returns (K+1,7,7) array of matrices from the lattice entrance to the entrances
+		of K 1st level nodes and the lattice exit.
+		"""
+		self._updateCumulativeMatrices()
+		return self.cumulative_matrices
+
+	def getTransportMatrix(self, node_from, node_to):
+		"""
+		Returns 7x7 matrix between entrances of two nodes (or their 1st level parents).
+		"""
+		matrices = self.getCumulativeMatrices()
+		matrix_from = matrices[self.index_dict[node_from]]
+		matrix_to = matrices[self.index_dict[node_to]]
+		return matrix_to.dot(numpy.linalg.inv(matrix_from))
+
+	def propagateCentroid(self, centroid):
+		"""
+		Returns (K+1,6) array of centroids at the entrances of 1st level nodes and
+		the lattice exit for the initial centroid (x,xp,y,yp,z,dE).
+		"""
+		vector = numpy.append(numpy.asarray(centroid,dtype = numpy.float64),1.0)
+		return numpy.einsum("kij,j->ki",self.getCumulativeMatrices(),vector)[:,:6]
+
+	def propagateSigma(self, sigma):
+		"""
+		Returns (K+1,6,6) array of sigma matrices (centered) at the entrances of 1st
+		level nodes and the lattice exit for the initial 6x6 sigma matrix.
+		"""
+		matrices = self.getCumulativeMatrices()[:,:6,:6]
+		return numpy.einsum("kij,jl,kml->kim",matrices,numpy.asarray(sigma),matrices)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The vectorized NumPy functions for the LSQ reconstruction
+# of transverse Twiss parameters from the quad scans with
+# wire scanners and analytic errors propagation
+#--------------------------------------------------------
+
+import numpy
+
+#---- coefficient to get the B*rho in T*m from momentum in GeV/c
+#---- (the same as in linear_tracker_lib, but this module does not need PyORBIT)
+B_RHO_COEFF = 3.335640952
+
+def getQuadMatrices2x2(gradient_arr, momentum, length, charge = +1.0, thin = False):
+	"""
+	Returns (...,2,2) NumPy array of quad transport matrices for the array of gradients.
+	If charge*G > 0 the quad is focusing, the same as getQuadMatrix2x2 in matrix_lib.
+	thin - if True the quad is drift-thin_quad-drift as in getThinQuadMatrix2x2.
+	momentum - in GeV/c, gradient - in T/m, length - in m, they can be broadcastable arrays
+	"""
+	kq = charge*numpy.asarray(gradient_arr,dtype = numpy.float64)/(B_RHO_COEFF*momentum)
+	length = numpy.broadcast_to(numpy.asarray(length,dtype = numpy.float64),kq.shape)
+	matrs = numpy.zeros(kq.shape + (2,2))
+	if(thin):
+		#---- D(L/2)*Q*D(L/2) with the kick -kq*L
+		kick = -kq*length
+		matrs[...,0,0] = 1.0 + kick*length/2
+		matrs[...,0,1] = length + kick*length**2/4
+		matrs[...,1,0] = kick
+		matrs[...,1,1] = 1.0 + kick*length/2
+		return matrs
+	sqrt_kq = numpy.sqrt(numpy.abs(kq))
+	phase = sqrt_kq*length
+	is_zero = (sqrt_kq == 0.)
+	sqrt_kq_safe = numpy.where(is_zero,1.0,sqrt_kq)
+	is_focus = (kq > 0.)
+	cs = numpy.where(is_focus,numpy.cos(phase),numpy.cosh(phase))
+	sn = numpy.where(is_focus,numpy.sin(phase),numpy.sinh(phase))
+	matrs[...,0,0] = cs
+	matrs[...,0,1] = numpy.where(is_zero,length,sn/sqrt_kq_safe)
+	matrs[...,1,0] = numpy.where(is_focus,-1.0,1.0)*sqrt_kq*sn
+	matrs[...,1,1] = cs
+	return matrs
+
+def getQuadDriftMatrices2x2(gradient_arr, momentum, length_quad, length_drift, charge = +1.0, thin = False):
+	"""
+	Returns (...,2,2) NumPy array of transport matrices for the "quad-drift" lattice:
+	M = D(length_drift)*Q(G). length_drift can be the array for many wire scanners,
+	e.g. with the shape (n_ws,1) for gradient_arr with the shape (n_grad,).
+	"""
+	matrs = getQuadMatrices2x2(gradient_arr,momentum,length_quad,charge,thin)
+	length_drift = numpy.asarray(length_drift,dtype = numpy.float64)
+	matrs = numpy.broadcast_to(matrs,numpy.broadcast_shapes(matrs.shape[:-2],length_drift.shape) + (2,2)).copy()
+	#---- D(L)*Q: the 1st row is Q[0] + L*Q[1]
+	matrs[...,0,:] += length_drift[...,numpy.newaxis]*matrs[...,1,:]
+	return matrs
+
+def getLSQ_Matrices(transport_matrices):
+	"""
+	Returns (...,K,3) LSQ matrices from (...,K,2,2) transport matrices:
+	RMS^2[k] = M[k,0]*<x^2> + M[k,1]*<x*x'> + M[k,2]*<x'^2>
+	"""
+	m1 = transport_matrices[...,0,0]
+	m2 = transport_matrices[...,0,1]
+	return numpy.stack((m1**2,2*m1*m2,m2**2),axis = -1)
+
+def getRelativeErrorWeights(rms2_arr, relative_error = 0.05):
+	"""
+	Returns the LSQ weights 1/sigma^2 for RMS^2 values with the relative error of RMS.
+	The error of RMS^2 is 2*relative_error*RMS^2.
+	"""
+	rms2_arr = numpy.asarray(rms2_arr,dtype = numpy.float64)
+	return 1.0/(2*relative_error*rms2_arr)**2
+
+def solveCorrelationsLSQ(lsq_matrices, rms2_arr, w_arr = None):
+	"""
+	Solves the batch of LSQ problems. Returns (corr,cov) NumPy arrays:
+	corr[...,3] - (<x^2>,<x*x'>,<x'^2>), cov[...,3,3] - variance-covariance matrices.
+	lsq_matrices - (...,K,3) arrays from getLSQ_Matrices(...)
+	rms2_arr - (...,K) array of RMS^2, NaN values are excluded
+	w_arr - (...,K) weights 1/sigma^2, then cov = (M^T*W*M)^-1. If None, the weights
+	        are equal and cov is scaled by the residual variance chi^2/(K-3).
+	"""
+	lsq_matrices = numpy.asarray(lsq_matrices,dtype = numpy.float64)
+	rms2_arr = numpy.asarray(rms2_arr,dtype = numpy.float64)
+	shape = numpy.broadcast_shapes(lsq_matrices.shape[:-1],rms2_arr.shape)
+	lsq_matrices = numpy.broadcast_to(lsq_matrices,shape + (3,))
+	rms2_arr = numpy.broadcast_to(rms2_arr,shape)
+	if(w_arr is None):
+		weights = numpy.ones(shape)
+	else:
+		weights = numpy.broadcast_to(numpy.asarray(w_arr,dtype = numpy.float64),shape).copy()
+	mask = numpy.isfinite(rms2_arr) & numpy.all(numpy.isfinite(lsq_matrices),axis = -1) & numpy.isfinite(weights)
+	weights = numpy.where(mask,weights,0.)
+	rms2_arr = numpy.where(mask,rms2_arr,0.)
+	lsq_matrices = numpy.where(mask[...,numpy.newaxis],lsq_matrices,0.)
+	#---- (M^T*W*M) and M^T*W*V for all problems
+	normal_matrices = numpy.einsum("...ki,...k,...kj->...ij",lsq_matrices,weights,lsq_matrices)
+	rhs = numpy.einsum("...ki,...k,...k->...i",lsq_matrices,weights,rms2_arr)
+	cov = numpy.linalg.pinv(normal_matrices)
+	corr = numpy.einsum("...ij,...j->...i",cov,rhs)
+	if(w_arr is None):
+		resid = rms2_arr - numpy.einsum("...ki,...i->...k",lsq_matrices,corr)
+		n_points = mask.sum(axis = -1)
+		chi2 = numpy.sum(weights*resid**2,axis = -1)
+		with numpy.errstate(divide = "ignore", invalid = "ignore"):
+			sigma2 = numpy.where(n_points > 3,chi2/(n_points - 3),numpy.nan)
+		cov = cov*sigma2[...,numpy.newaxis,numpy.newaxis]
+	return (corr,cov)
+
+def getTwissFromCorrelations(corr, cov = None):
+	"""
+	Returns (twiss,twiss_cov) NumPy arrays: twiss[...,3] - (alpha,beta,emitt) from
+	corr[...,3] = (<x^2>,<x*x'>,<x'^2>), twiss_cov[...,3,3] - the variance-covariance
+	matrices of Twiss propagated with analytic Jacobians (None if cov is None).
+	NaN is returned for the non-physical correlations with <x^2>*<x'^2> < <x*x'>^2.
+	"""
+	corr = numpy.asarray(corr,dtype = numpy.float64)
+	(s11,s12,s22) = (corr[...,0],corr[...,1],corr[...,2])
+	det = s11*s22 - s12**2
+	emitt = numpy.sqrt(numpy.where(det > 0.,det,numpy.nan))
+	twiss = numpy.stack((-s12/emitt,s11/emitt,emitt),axis = -1)
+	if(cov is None):
+		return (twiss,None)
+	emitt3 = emitt**3
+	jac = numpy.zeros(corr.shape[:-1] + (3,3))
+	#---- d(alpha)/d(s11,s12,s22), alpha = -s12/emitt
+	jac[...,0,0] = s12*s22/(2*emitt3)
+	jac[...,0,1] = -1.0/emitt - s12**2/emitt3
+	jac[...,0,2] = s12*s11/(2*emitt3)
+	#---- d(beta)/d(s11,s12,s22), beta = s11/emitt
+	jac[...,1,0] = 1.0/emitt - s11*s22/(2*emitt3)
+	jac[...,1,1] = s11*s12/emitt3
+	jac[...,1,2] = -s11**2/(2*emitt3)
+	#---- d(emitt)/d(s11,s12,s22)
+	jac[...,2,0] = s22/(2*emitt)
+	jac[...,2,1] = -s12/emitt
+	jac[...,2,2] = s11/(2*emitt)
+	twiss_cov = numpy.einsum("...ik,...kl,...jl->...ij",jac,numpy.asarray(cov),jac)
+	return (twiss,twiss_cov)
+
+def getErrors(cov):
+	"""
+	Returns (...,3) NumPy array of standard deviations from (...,3,3) variance-covariance matrices.
+	"""
+	return numpy.sqrt(numpy.diagonal(cov,axis1 = -2,axis2 = -1))
+
+def reconstructTwissXY(gradient_arr, rms_x_arr, rms_y_arr, momentum, length_quad, length_drift,
+		charge = +1.0, relative_error = None, thin = False):
+	"""
+	Returns (corr,corr_cov,twiss,twiss_cov) for X and Y planes in one batched call.
+	The leading axis of results is the plane (0 - X, 1 - Y), the quad gradient for Y is -G.
+	gradient_arr - (K,) quad gradients in T/m
+	rms_x_arr, rms_y_arr - (...,K) RMS sizes, e.g. (n_ws,K) for many wire scanners
+	length_drift - drift from the quad exit to WS, for many WS it should have shape (n_ws,1)
+	Results for many WS have the shapes (2,n_ws,3) and (2,n_ws,3,3).
+	relative_error - relative error of RMS for weights, if None the errors are from residuals
+	"""
+	gradient_arr = numpy.asarray(gradient_arr,dtype = numpy.float64)
+	rms2_arr = numpy.stack(numpy.broadcast_arrays(numpy.asarray(rms_x_arr,dtype = numpy.float64),
+		numpy.asarray(rms_y_arr,dtype = numpy.float64)))**2
+	#---- gradients (2,1,...,K) broadcast with WS axes of length_drift (n_ws,1) and RMS (n_ws,K)
+	n_ws_axes = max(rms2_arr.ndim - 2,numpy.ndim(length_drift) - 1,0)
+	gradients = numpy.stack((gradient_arr,-gradient_arr)).reshape((2,) + (1,)*n_ws_axes + (-1,))
+	matrs = getQuadDriftMatrices2x2(gradients,momentum,length_quad,length_drift,charge,thin)
+	w_arr = None
+	if(relative_error != None):
+		w_arr = getRelativeErrorWeights(rms2_arr,relative_error)
+	(corr,corr_cov) = solveCorrelationsLSQ(getLSQ_Matrices(matrs),rms2_arr,w_arr)
+	(twiss,twiss_cov) = getTwissFromCorrelations(corr,corr_cov)
+	return (corr,corr_cov,twiss,twiss_cov)
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The local high-rate stand-in for the Virtual Accelerator.
+# The pcaspy server has the same PV names as the VA, and
+# the readbacks are calculated by the envelope model of
+# the linac instead of the bunch tracking
+#--------------------------------------------------------
+
+import math
+import os
+import time
+import json
+import threading
+import argparse
+import xml.etree.ElementTree as ElementTree
+
+import numpy
+
+from orbit.core.bunch import Bunch
+from orbit.py_linac.lattice import MarkerLinacNode
+
+from uspas_fastlib.lattice_cache_lib import getLinacAccLattice
+from uspas_fastlib.bunch_file_lib import readBunch
+from uspas_fastlib.bunch_arrays_lib import getBunchMoments
+from uspas_fastlib.envelope_tracker_lib import EnvelopeTracker
+from uspas_fastlib.orbit_response_lib import getBPM_Nodes, getCorrectorNodes
+from uspas_fastlib.epics_group_lib import getMagnetPV_Names
+from uspas_fastlib.pcaspy_stand_in_lib import makePV_Database, StandInServer
+
+#---- speed of light in m/sec
+C_LIGHT = 2.99792458e+8
+
+def getBPM_Frequencies(xml_file_name):
+	"""
+	Returns {sequence_name:bpm_frequency} dictionary from the bpmFrequency
+	attributes of the sequences in the lattice XML file. Frequencies are in Hz.
+	"""
+	bpm_frequencies = {}
+	for seq_element in ElementTree.parse(xml_file_name).getroot():
+		if("bpmFrequency" in seq_element.attrib):
+			bpm_frequencies[seq_element.attrib["name"]] = float(seq_element.attrib["bpmFrequency"])
+	return bpm_frequencies
+
+def getWS_Nodes(accLattice, name_substring = ""):
+	"""
+	Returns the list of wire scanner markers (1st level and body children nodes)
+	with name_substring in the name, like "MEBT".
+	"""
+	ws_nodes = []
+	for node in accLattice.getNodes():
+		for ws_node in [node,] + node.getBodyChildren():
+			if(isinstance(ws_node,MarkerLinacNode) and ws_node.getName().find(":WS") >= 0):
+				if(ws_node.getName().find(name_substring) >= 0):
+					ws_nodes.append(ws_node)
+	return ws_nodes
+
+def getCavityLLRF_Name(cav_name):
+	"""
+	Returns the VA LLRF name for the PyORBIT lattice cavity name:
+	MEBT1 -> MEBT_LLRF:FCM1, DTL3 -> DTL_LLRF:FCM3, SCL:Cav01a -> SCL_LLRF:FCM01a
+	It is the inverse of cavity_calibration_lib.getModelCavityName(...).
+	"""
+	if(cav_name.find("SCL:Cav") == 0):
+		return "SCL_LLRF:FCM" + cav_name[len("SCL:Cav"):]
+	seq_name = cav_name.rstrip("0123456789")
+	return seq_name + "_LLRF:FCM" + cav_name[len(seq_name):]
+
+class FastLinacModel:
+	"""
+	The envelope model of the linac for the BPMs and wire scanners readbacks.
+	The sigma matrix and the centroid of the input bunch are tracked by
+	EnvelopeTracker, so the BPM positions, phases, amplitudes and WS sizes
+	are calculated in milliseconds. The results are cached for the quads,
+	correctors, and cavities settings, so repeated scans are not recalculated.
+	The lattice is design tracked with the synchronous particle of bunch_in.
+	accLattice - linac lattice (from lattice_cache_lib.getLinacAccLattice(...))
+	bunch_in - the bunch at the lattice entrance, only its moments are used
+	peak_current - in mA, for the space charge and BPM amplitudes
+	bpm_frequencies - {sequence_name:bpm_frequency}, default_bpm_frequency if missing
+	"""
+	def __init__(self, accLattice, bunch_in, peak_current = 38.0, space_charge = True, sc_step = 0.01,
+			bpm_frequencies = None, default_bpm_frequency = 805.0e+6, max_cache_size = 10000):
+		self.accLattice = accLattice
+		self.peak_current = peak_current
+		self.max_cache_size = max_cache_size
+		#---- design tracking with the synchronous particle only
+		bunch = Bunch()
+		bunch_in.copyEmptyBunchTo(bunch)
+		accLattice.trackDesignBunch(bunch)
+		(self.centroid_in,self.sigma_in) = getBunchMoments(bunch_in)
+		sync_part = bunch_in.getSyncParticle()
+		self.e_kin_in = sync_part.kinEnergy()
+		self.time_in = sync_part.time()
+		self.mass = bunch_in.mass()
+		self.charge = bunch_in.charge()
+		sc_current = 0.
+		if(space_charge): sc_current = peak_current
+		self.envelope_tracker = EnvelopeTracker(accLattice,sc_current,402.5e+6,sc_step = sc_step)
+		self.quads = accLattice.getQuads()
+		self.correctors = getCorrectorNodes(accLattice)
+		self.cavities = accLattice.getRF_Cavities()
+		self.bpm_nodes = getBPM_Nodes(accLattice)
+		self.ws_nodes = getWS_Nodes(accLattice)
+		#---- BPM frequencies from the sequences of BPMs
+		if(bpm_frequencies == None):
+			bpm_frequencies = {}
+		seq_name_dict = {}
+		for seq in accLattice.getSequences():
+			for node in seq.getNodes():
+				for child in [node,] + node.getBodyChildren():
+					seq_name_dict[child.getName()] = seq.getName()
+		self.bpm_frequencies = numpy.array([bpm_frequencies.get(seq_name_dict.get(bpm.getName()),default_bpm_frequency) for bpm in self.bpm_nodes])
+		#---- indexes of BPMs and WSs in the envelope tracker results
+		self.bpm_indexes = None
+		self.ws_indexes = None
+		self.cache = {}
+
+	def getSettingsKey(self):
+		"""
+		Returns the tuple of the quads, correctors, and cavities settings.
+		"""
+		key_arr = [quad.getParam("dB/dr") for quad in self.quads]
+		key_arr += [corr.getParam("B") for corr in self.correctors]
+		for rf_cav in self.cavities:
+			key_arr += [rf_cav.getAmp(),rf_cav.getPhase()]
+		return tuple(key_arr)
+
+	def _setReportIndexes(self):
+		index_dict = {}
+		for ind, name in enumerate(self.envelope_tracker.getNodeNames()):
+			index_dict[name] = ind
+		self.bpm_indexes = numpy.array([index_dict[bpm.getName()] for bpm in self.bpm_nodes],dtype = numpy.int64)
+		self.ws_indexes = numpy.array([index_dict[ws.getName()] for ws in self.ws_nodes],dtype = numpy.int64)
+
+	def calculate(self):
+		"""
+		Returns the dictionary with NumPy arrays of readbacks for the current lattice settings:
+		"bpm_x","bpm_y" - BPM positions in mm, "bpm_phase" - BPM phases in deg (-180,180],
+		"bpm_amp" - BPM amplitudes peak_current*exp(-phase_rms^2/2),
+		"ws_x","ws_y","ws_sigma_x","ws_sigma_y" - WS centroids and RMS sizes in mm.
+		"""
+		key = self.getSettingsKey()
+		if(key in self.cache):
+			return self.cache[key]
+		tracker = self.envelope_tracker
+		tracker.track(self.sigma_in,self.e_kin_in,self.time_in,self.mass,self.charge,self.centroid_in)
+		if(self.bpm_indexes is None):
+			self._setReportIndexes()
+		#---- BPMs
+		centroids = tracker.getCentroids()[self.bpm_indexes]
+		sigmas = tracker.getSigmas()[self.bpm_indexes]
+		gamma = 1.0 + tracker.getEnergies()[self.bpm_indexes]/self.mass
+		beta = numpy.sqrt(1.0 - 1.0/gamma**2)
+		#---- positive z is ahead of the synchronous particle
+		bpm_time = tracker.getTimes()[self.bpm_indexes] - centroids[:,4]/(beta*C_LIGHT)
+		bpm_phase = (bpm_time*360.0*self.bpm_frequencies) % 360.
+		bpm_phase = numpy.where(bpm_phase > 180.,bpm_phase - 360.,bpm_phase)
+		z_rms_rad = 2*math.pi*self.bpm_frequencies*numpy.sqrt(numpy.maximum(sigmas[:,4,4],0.))/(beta*C_LIGHT)
+		res_dict = {}
+		res_dict["bpm_x"] = centroids[:,0]*1000.
+		res_dict["bpm_y"] = centroids[:,2]*1000.
+		res_dict["bpm_phase"] = bpm_phase
+		res_dict["bpm_amp"] = self.peak_current*numpy.exp(-z_rms_rad**2/2)
+		#---- WSs
+		centroids = tracker.getCentroids()[self.ws_indexes]
+		sigmas = tracker.getSigmas()[self.ws_indexes]
+		res_dict["ws_x"] = centroids[:,0]*1000.
+		res_dict["ws_y"] = centroids[:,2]*1000.
+		res_dict["ws_sigma_x"] = numpy.sqrt(numpy.maximum(sigmas[:,0,0],0.))*1000.
+		res_dict["ws_sigma_y"] = numpy.sqrt(numpy.maximum(sigmas[:,2,2],0.))*1000.
+		if(len(self.cache) >= self.max_cache_size):
+			self.cache.clear()
+		self.cache[key] = res_dict
+		return res_dict
+
+class FastVirtualAccelerator:
+	"""
+	The pcaspy server with the Virtual Accelerator PV names and the readbacks
+	from FastLinacModel. The readbacks are updated in the separate thread with
+	refresh_rate in Hz. The model is recalculated only after setpoint changes.
+	The PVs:
+	magnets - MEBT_Mag:PS_QH03:B_Set (|gradient| in T/m, the polarity is
+	          from the design gradient), MEBT_Mag:PS_DCV04:B_Set (field in T)
+	cavities - MEBT_LLRF:FCM1:CtlPhaseSet (deg), MEBT_LLRF:FCM1:CtlAmpSet (relative amplitude)
+	BPMs - MEBT_Diag:BPM14:xAvg, :yAvg (mm), :phaseAvg (deg), :amplitudeAvg
+	WSs - MEBT_Diag:WS04a:Position_Set, :Speed_Set, :Position (mm, mm/sec), :Hor_Cont, :Ver_Cont
+	The wire moves to Position_Set with Speed_Set, and the signals are Gaussians of
+	the wire position projected by ws_fork_coeff (the fork is at 45 deg).
+	phase_offsets - {LLRF or BPM name:offset} in deg like in va_offsets.json:
+	VA phase = model phase + offset.
+	jitter - the relative RMS pulse-to-pulse noise of readbacks, it is small but non-zero,
+	so the PV monitors are posted every cycle as in VA (see BeamUpdateWaiter).
+	"""
+	def __init__(self, model, refresh_rate = 100., phase_offsets = None, jitter = 1.0e-6,
+			ws_fork_coeff = math.sqrt(2.0)/2, prefix = "", random_seed = None):
+		self.model = model
+		self.refresh_rate = refresh_rate
+		self.jitter = jitter
+		self.ws_fork_coeff = ws_fork_coeff
+		self.rng = numpy.random.default_rng(random_seed)
+		if(phase_offsets == None):
+			phase_offsets = {}
+		#---- setpoints
+		self.quad_pv_names = getMagnetPV_Names(model.quads)
+		self.quad_polarities = [math.copysign(1.0,quad.getParam("dB/dr")) for quad in model.quads]
+		self.corr_pv_names = getMagnetPV_Names(model.correctors)
+		llrf_names = [getCavityLLRF_Name(rf_cav.getName()) for rf_cav in model.cavities]
+		self.cav_phase_pv_names = [llrf_name + ":CtlPhaseSet" for llrf_name in llrf_names]
+		self.cav_amp_pv_names = [llrf_name + ":CtlAmpSet" for llrf_name in llrf_names]
+		self.cav_phase_offsets = [phase_offsets.get(llrf_name,0.) for llrf_name in llrf_names]
+		#---- readbacks
+		bpm_names = [bpm.getName() for bpm in model.bpm_nodes]
+		self.bpm_phase_offsets = numpy.array([phase_offsets.get(bpm_name,0.) for bpm_name in bpm_names])
+		self.bpm_pv_names_dict = {}
+		for (key,suffix) in (("bpm_x",":xAvg"),("bpm_y",":yAvg"),("bpm_phase",":phaseAvg"),("bpm_amp",":amplitudeAvg")):
+			self.bpm_pv_names_dict[key] = [bpm_name + suffix for bpm_name in bpm_names]
+		ws_names = [ws.getName() for ws in model.ws_nodes]
+		self.ws_pos_set_pv_names = [ws_name + ":Position_Set" for ws_name in ws_names]
+		self.ws_speed_pv_names = [ws_name + ":Speed_Set" for ws_name in ws_names]
+		self.ws_pos_pv_names = [ws_name + ":Position" for ws_name in ws_names]
+		self.ws_hor_pv_names = [ws_name + ":Hor_Cont" for ws_name in ws_names]
+		self.ws_ver_pv_names = [ws_name + ":Ver_Cont" for ws_name in ws_names]
+		self.ws_positions = numpy.zeros(len(ws_names))
+		pv_names = self.quad_pv_names + self.corr_pv_names + self.cav_phase_pv_names + self.cav_amp_pv_names
+		for key in ("bpm_x","bpm_y","bpm_phase","bpm_amp"):
+			pv_names += self.bpm_pv_names_dict[key]
+		pv_names += self.ws_pos_set_pv_names + self.ws_speed_pv_names + self.ws_pos_pv_names
+		pv_names += self.ws_hor_pv_names + self.ws_ver_pv_names
+		self.server = StandInServer(makePV_Database(pv_names),prefix,self._onWrite)
+		driver = self.server.driver
+		for (pv_name,quad,polarity) in zip(self.quad_pv_names,model.quads,self.quad_polarities):
+			driver.setParam(pv_name,polarity*quad.getParam("dB/dr"))
+		for (pv_name,corr) in zip(self.corr_pv_names,model.correctors):
+			driver.setParam(pv_name,corr.getParam("B"))
+		for ind, rf_cav in enumerate(model.cavities):
+			driver.setParam(self.cav_phase_pv_names[ind],rf_cav.getPhase()*180./math.pi + self.cav_phase_offsets[ind])
+			driver.setParam(self.cav_amp_pv_names[ind],rf_cav.getAmp())
+		for pv_name in self.ws_speed_pv_names:
+			driver.setParam(pv_name,1.0)
+		#---- the settings are applied to the model in the update thread only
+		self.settings_changed = True
+		self.n_cycles = 0
+		self.stop_event = threading.Event()
+		self.update_thread = None
+
+	def _onWrite(self, driver, reason, value):
+		self.settings_changed = True
+
+	def applySettings(self):
+		"""
+		Sets the model quads, correctors, and cavities parameters from the setpoint PVs.
+		"""
+		driver = self.server.driver
+		for (pv_name,quad,polarity) in zip(self.quad_pv_names,self.model.quads,self.quad_polarities):
+			quad.setParam("dB/dr",polarity*driver.getParam(pv_name))
+		for (pv_name,corr) in zip(self.corr_pv_names,self.model.correctors):
+			corr.setParam("B",driver.getParam(pv_name))
+		for ind, rf_cav in enumerate(self.model.cavities):
+			rf_cav.setPhase((driver.getParam(self.cav_phase_pv_names[ind]) - self.cav_phase_offsets[ind])*math.pi/180.)
+			rf_cav.setAmp(driver.getParam(self.cav_amp_pv_names[ind]))
+
+	def _addJitter(self, val_arr, scale):
+		if(self.jitter <= 0.):
+			return val_arr
+		return val_arr + self.jitter*scale*self.rng.standard_normal(len(val_arr))
+
+	def updateReadbacks(self, time_step):
+		"""
+		Moves the wires for time_step in sec and posts new values of all readbacks.
+		"""
+		if(self.settings_changed):
+			self.settings_changed = False
+			self.applySettings()
+		res_dict = self.model.calculate()
+		driver = self.server.driver
+		#---- BPMs
+		bpm_dict = {}
+		bpm_dict["bpm_x"] = self._addJitter(res_dict["bpm_x"],1.0)
+		bpm_dict["bpm_y"] = self._addJitter(res_dict["bpm_y"],1.0)
+		bpm_dict["bpm_phase"] = self._addJitter(res_dict["bpm_phase"] + self.bpm_phase_offsets,1.0)
+		bpm_dict["bpm_amp"] = self._addJitter(res_dict["bpm_amp"],res_dict["bpm_amp"])
+		for key in bpm_dict.keys():
+			for (pv_name,val) in zip(self.bpm_pv_names_dict[key],bpm_dict[key]):
+				driver.setParam(pv_name,float(val))
+		#---- WSs
+		for ind in range(len(self.ws_positions)):
+			pos_set = driver.getParam(self.ws_pos_set_pv_names[ind])
+			max_step = abs(driver.getParam(self.ws_speed_pv_names[ind]))*time_step
+			delta = pos_set - self.ws_positions[ind]
+			self.ws_positions[ind] += math.copysign(min(abs(delta),max_step),delta)
+		wire_arr = self.ws_fork_coeff*self.ws_positions
+		hor_arr = numpy.exp(-(wire_arr - res_dict["ws_x"])**2/(2*numpy.maximum(res_dict["ws_sigma_x"],1.0e-6)**2))
+		ver_arr = numpy.exp(-(wire_arr - res_dict["ws_y"])**2/(2*numpy.maximum(res_dict["ws_sigma_y"],1.0e-6)**2))
+		hor_arr = self._addJitter(hor_arr,1.0)
+		ver_arr = self._addJitter(ver_arr,1.0)
+		for ind in range(len(self.ws_positions)):
+			driver.setParam(self.ws_pos_pv_names[ind],float(self.ws_positions[ind]))
+			driver.setParam(self.ws_hor_pv_names[ind],float(hor_arr[ind]))
+			driver.setParam(self.ws_ver_pv_names[ind],float(ver_arr[ind]))
+		driver.updatePVs()
+		self.n_cycles += 1
+
+	def _run(self):
+		period = 1.0/self.refresh_rate
+		time_next = time.time()
+		while(not self.stop_event.is_set()):
+			self.updateReadbacks(period)
+			time_next += period
+			time_sleep = time_next - time.time()
+			if(time_sleep > 0.):
+				self.stop_event.wait(time_sleep)
+			else:
+				#---- the model calculation was longer than the period
+				time_next = time.time()
+
+	def start(self):
+		"""
+		Starts the pcaspy server and the readbacks update threads.
+		"""
+		self.server.start()
+		self.stop_event.clear()
+		self.update_thread = threading.Thread(target = self._run)
+		self.update_thread.daemon = True
+		self.update_thread.start()
+
+	def stop(self):
+		"""
+		Stops the update and the server threads.
+		"""
+		self.stop_event.set()
+		if(self.update_thread != None):
+			self.update_thread.join()
+			self.update_thread = None
+		self.server.stop()
+
+	def getCyclesCount(self):
+		"""
+		Returns the number of the readbacks updates after the start.
+		"""
+		return self.n_cycles
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
+
+def main():
+	repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	parser = argparse.ArgumentParser(description = "Local high-rate Virtual Accelerator stand-in with the envelope model.")
+	parser.add_argument("--sequences", nargs = "+", type = str, default = ["MEBT",], help = "Linac sequences, like MEBT DTL1")
+	parser.add_argument("--refresh_rate", type = float, default = 100., help = "Readbacks refresh rate in Hz")
+	parser.add_argument("--xml", type = str, default = os.path.join(repo_dir,"lattice","sns_linac.xml"), help = "Lattice XML file")
+	parser.add_argument("--bunch", type = str, default = os.path.join(repo_dir,"lattice","MEBT_in.dat"), help = "Bunch at the 1st sequence entrance")
+	parser.add_argument("--offsets", type = str, default = None, help = "JSON file with LLRF and BPM phase offsets like va_offsets.json")
+	parser.add_argument("--peak_current", type = float, default = 38.0, help = "Peak current in mA")
+	parser.add_argument("--sc_step", type = float, default = 0.01, help = "Space charge step in m, 0 to switch space charge off")
+	args = parser.parse_args()
+	accLattice = getLinacAccLattice(args.sequences,args.xml)
+	bin_file_name = os.path.join(os.path.dirname(os.path.abspath(args.bunch)),"lattice_cache",os.path.splitext(os.path.basename(args.bunch))[0] + ".bin")
+	bunch_in = readBunch(args.bunch,bin_file_name = bin_file_name)
+	time_start = time.time()
+	model = FastLinacModel(accLattice,bunch_in,args.peak_current,args.sc_step > 0.,max(args.sc_step,0.001),
+		bpm_frequencies = getBPM_Frequencies(args.xml))
+	model.calculate()
+	print ("Model calculation time[sec]= %8.4f"%(time.time() - time_start))
+	phase_offsets = None
+	if(args.offsets != None):
+		fl_in = open(args.offsets,"r")
+		phase_offsets = json.load(fl_in)
+		fl_in.close()
+	va = FastVirtualAccelerator(model,args.refresh_rate,phase_offsets)
+	va.start()
+	print ("Serving %d BPMs, %d WSs, %d quads, %d correctors, %d cavities at %g Hz. Press Ctrl-C to stop."%(
+		len(model.bpm_nodes),len(model.ws_nodes),len(model.quads),len(model.correctors),len(model.cavities),args.refresh_rate))
+	try:
+		while(True):
+			n_cycles = va.getCyclesCount()
+			time.sleep(10.)
+			print ("Refresh rate[Hz]= %6.1f"%((va.getCyclesCount() - n_cycles)/10.))
+	except KeyboardInterrupt:
+		va.stop()
+
+if __name__ == "__main__":
+	main()
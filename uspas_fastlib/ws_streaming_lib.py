@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+#--------------------------------------------------------
+# The classes for the streaming Wire Scanners acquisition
+# with on-the-fly RMS calculations
+#--------------------------------------------------------
+
+import math
+import time
+import threading
+
+from epics import pv as pv_channel
+
+from uspas_fastlib.epics_group_lib import PV_Group
+from uspas_fastlib.beam_settle_lib import BeamUpdateWaiter
+
+class WeightedMomentsAccumulator:
+	"""
+	Single pass, numerically stable accumulation of weighted mean and variance
+	(D.H.D. West's algorithm) for y = Function(x) where y is a weight.
+	"""
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.sum_w = 0.
+		self.mean = 0.
+		self.m2 = 0.
+		self.count = 0
+
+	def add(self, x, w):
+		"""
+		Adds the point x with the weight w.
+		"""
+		if(w == 0.): return
+		self.count += 1
+		sum_w_new = self.sum_w + w
+		if(sum_w_new == 0.):
+			#---- the negative noise cancelled the sum, start again with this point
+			self.sum_w = 0.
+			self.mean = 0.
+			self.m2 = 0.
+			return
+		delta = x - self.mean
+		self.mean += delta*w/sum_w_new
+		self.m2 += w*delta*(x - self.mean)
+		self.sum_w = sum_w_new
+
+	def getMean(self):
+		return self.mean
+
+	def getSigma(self):
+		"""
+		Returns the weighted RMS like calculateRMS(x_arr,y_arr).
+		"""
+		if(self.sum_w == 0.): return 0.
+		return math.sqrt(abs(self.m2/self.sum_w))
+
+class StreamingWireScanner:
+	"""
+	The Wire Scanner with on-the-fly moments accumulation during the wire motion.
+	The new wire position (camonitor) marks the new beam pulse, and for each pulse
+	the position and H,V signals are read together in one batched CA operation.
+	So the (pos,H,V) triple is from the same pulse, and the signals that did not change
+	(their monitors are not posted) are accumulated too. The sigmas are ready
+	the moment the wire reaches pos_end. The scan can go in both directions.
+	ws_name - like "MEBT_Diag:WS04a"
+	"""
+	def __init__(self, ws_name, timeout = 2.0, pulse_timeout = 2.0):
+		self.ws_name = ws_name
+		#----- Geometry of fork coeff
+		self.coeff_fork = math.sqrt(2.0)/2
+		self.lock = threading.Lock()
+		self.done_event = threading.Event()
+		self.hor_accumulator = WeightedMomentsAccumulator()
+		self.ver_accumulator = WeightedMomentsAccumulator()
+		self.pos_end = None
+		self.direction = 1.
+		self.delta_pos = 0.01
+		self.pulse_timeout = pulse_timeout
+		self.collecting = False
+		self.collect_thread = None
+		self.pos_name = ws_name + ":Position"
+		self.pos_set_pv = pv_channel.PV(ws_name + ":Position_Set")
+		self.speed_pv = pv_channel.PV(ws_name + ":Speed_Set")
+		for pv in (self.pos_set_pv,self.speed_pv):
+			pv.wait_for_connection(timeout = timeout)
+		self.read_group = PV_Group([self.pos_name,ws_name + ":Hor_Cont",ws_name + ":Ver_Cont"],timeout)
+		self.pulse_waiter = BeamUpdateWaiter([self.pos_name,],timeout)
+
+	def getPosition(self):
+		"""
+		Returns the last monitored wire position in mm.
+		"""
+		return self.pulse_waiter.getValue(self.pos_name)
+
+	def _collect(self):
+		self.pulse_waiter.mark()
+		while(self.collecting):
+			if(not self.pulse_waiter.wait(n_updates = 1,timeout = self.pulse_timeout)): continue
+			#---- the next pulse arriving during the reading will be counted
+			self.pulse_waiter.mark()
+			(pos,hor_signal,ver_signal) = self.read_group.get()
+			with self.lock:
+				if(not self.collecting): return
+				if(math.isnan(pos)): continue
+				if(not math.isnan(hor_signal)):
+					self.hor_accumulator.add(pos,hor_signal)
+				if(not math.isnan(ver_signal)):
+					self.ver_accumulator.add(pos,ver_signal)
+				if((pos - self.pos_end)*self.direction >= - self.delta_pos):
+					self.collecting = False
+					self.done_event.set()
+
+	def retract(self, pos_start, timeout = 10.0, wait = True):
+		"""
+		Moves the wire to the start position with the max speed and waits.
+		"""
+		self.speed_pv.put(100.)
+		self.pos_set_pv.put(pos_start)
+		if(not wait): return True
+		return self.waitPosition(pos_start,timeout)
+
+	def waitPosition(self, pos_target, timeout = 10.0):
+		"""
+		Waits until the wire is at the target position. Returns False if timeout happened.
+		"""
+		time_end = time.time() + timeout
+		while(time.time() < time_end):
+			pos = self.getPosition()
+			if(not math.isnan(pos) and abs(pos - pos_target) < self.delta_pos): return True
+			time.sleep(0.01)
+		return False
+
+	def start(self, pos_start, pos_end, ws_speed, retract = True):
+		"""
+		Retracts the wire and starts the scan. It does not wait for the scan end.
+		pos_start,pos_end - positions in mm
+		ws_speed - defines the position step 0.2, 0.3 or 0.5 mm
+		"""
+		if(retract):
+			self.retract(pos_start)
+		with self.lock:
+			self.hor_accumulator.reset()
+			self.ver_accumulator.reset()
+			self.pos_end = pos_end
+			self.direction = 1.
+			if(pos_end < pos_start):
+				self.direction = -1.
+			self.done_event.clear()
+			self.collecting = True
+		self.collect_thread = threading.Thread(target = self._collect,daemon = True)
+		self.collect_thread.start()
+		self.speed_pv.put(ws_speed)
+		self.pos_set_pv.put(pos_end)
+
+	def wait(self, timeout = 600.):
+		"""
+		Waits until the wire reaches the end position. Returns False if timeout happened.
+		"""
+		res = self.done_event.wait(timeout)
+		with self.lock:
+			self.collecting = False
+		if(self.collect_thread != None):
+			self.collect_thread.join()
+			self.collect_thread = None
+		return res
+
+	def getSigmas(self):
+		"""
+		Returns (hor_sigma,ver_sigma) in mm with the fork geometry coefficient.
+		"""
+		with self.lock:
+			return (self.hor_accumulator.getSigma()*self.coeff_fork,self.ver_accumulator.getSigma()*self.coeff_fork)
+
+	def getAverages(self):
+		"""
+		Returns (hor_avg,ver_avg) wire positions in mm.
+		"""
+		with self.lock:
+			return (self.hor_accumulator.getMean(),self.ver_accumulator.getMean())
+
+	def scan(self, pos_start, pos_end, ws_speed, timeout = 600.):
+		"""
+		Performs the scan and returns (hor_sigma,ver_sigma) in mm.
+		Returns None if the wire did not reach the end position before timeout.
+		"""
+		self.start(pos_start,pos_end,ws_speed)
+		done = self.wait(timeout)
+		self.retract(pos_start)
+		if(not done): return None
+		return self.getSigmas()
+
+def scanWireScanners(ws_names, pos_start, pos_end, ws_speed, timeout = 600.):
+	"""
+	Scans several Wire Scanners at once.
+	Returns the dictionary {ws_name:(hor_sigma,ver_sigma)} with sigmas in mm.
+	The value is None for the Wire Scanners that did not finish before timeout.
+	"""
+	scanners = [StreamingWireScanner(ws_name) for ws_name in ws_names]
+	#---- all forks are retracted at the same time
+	for scanner in scanners:
+		scanner.retract(pos_start,wait = False)
+	for scanner in scanners:
+		scanner.waitPosition(pos_start)
+	for scanner in scanners:
+		scanner.start(pos_start,pos_end,ws_speed,retract = False)
+	time_end = time.time() + timeout
+	done_arr = [scanner.wait(max(time_end - time.time(),0.001)) for scanner in scanners]
+	res_dict = {}
+	for scanner, done in zip(scanners,done_arr):
+		res_dict[scanner.ws_name] = None
+		if(done):
+			res_dict[scanner.ws_name] = scanner.getSigmas()
+		scanner.retract(pos_start,wait = False)
+	return res_dict